@@ -3,10 +3,16 @@ from discord.ext import commands
 import json
 import logging
 import asyncio
-from util import get_config, LeaderboardNotFoundException, GuildNotFoundException
+import time
+from util import get_config, compile_config, config_warnings, CONFIG_PATH, LeaderboardNotFoundException, GuildNotFoundException, LoungeUnavailableException, LoungeClient, MetricsServer, MemberResolver
+from util import Metrics as metrics
 from models import BotConfig, SquadQueueBot
 
-config: BotConfig = get_config('./config.json')
+started_at = time.perf_counter()
+
+config: BotConfig = get_config(CONFIG_PATH)
+for warning in config_warnings(config):
+    print(warning)
 
 logging.basicConfig(level=logging.INFO,
                     datefmt='%Y-%m-%d %H:%M:%S',
@@ -16,13 +22,34 @@ logging.basicConfig(level=logging.INFO,
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
-bot = SquadQueueBot(config=config, command_prefix=['!', '^'], case_insensitive=True, intents=intents)
+if config.sharding.enabled:
+    shard_options = {'shard_count': config.sharding.shard_count, 'shard_ids': config.sharding.shard_ids}
+else:
+    shard_options = {'shard_count': 1}
+if config.members.chunk_at_startup:
+    member_options = {}
+else:
+    # members are looked up by the member resolver when they're needed, instead of every member
+    # of every guild being loaded at startup and kept in discord.py's cache
+    member_options = {'chunk_guilds_at_startup': False, 'member_cache_flags': discord.MemberCacheFlags.none()}
+bot = SquadQueueBot(config=config, lounge_client=LoungeClient(config.lounge_api), metrics=MetricsServer(config.metrics),
+                    member_resolver=MemberResolver(config.members), guild_index=compile_config(config),
+                    command_prefix=['!', '^'], case_insensitive=True,
+                    intents=intents, **shard_options, **member_options)
 
 initial_extensions = ['cogs.SquadQueue']
 
 @bot.event
 async def on_ready():
     print("Logged in as {0.user}".format(bot))
+    # on_ready runs again after reconnects, but only the first time is the startup time
+    if metrics.startup_seconds.values:
+        return
+    startup_time = time.perf_counter() - started_at
+    metrics.startup_seconds.set(startup_time)
+    rss = metrics.resident_memory()
+    rss_str = f"{rss / 1024 / 1024:.1f} MiB" if rss is not None else "unknown"
+    print(f"Ready in {startup_time:.1f}s with {len(bot.guilds)} guilds; resident memory {rss_str}", flush=True)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -53,6 +80,9 @@ async def on_command_error(ctx, error):
         return
     if isinstance(error, LeaderboardNotFoundException):
         return
+    if isinstance(error, LoungeUnavailableException):
+        await(await ctx.send("The Lounge website isn't responding right now, so MMR couldn't be checked. Try again in a minute.")).delete(delay=10)
+        return
     if isinstance(error, GuildNotFoundException):
         await(await ctx.send("You cannot use this command in this server!")).delete(delay=10)
         return
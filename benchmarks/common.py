@@ -0,0 +1,10 @@
+"""Helpers shared by the benchmarks."""
+from models import LeaderboardConfig, WebsiteCredentials, TimeSettings
+
+def make_leaderboard(url: str = "http://localhost", game: str | None = "mk8dx", **kwargs):
+    """Makes a leaderboard config like the sample config's. Keyword arguments replace the defaults below."""
+    settings = dict(time_settings=TimeSettings(queue_open_time=40, joining_time=50, extension_time=5),
+                    valid_room_sizes=[12], valid_formats=[1, 2, 3, 4, 6], join_channel=0, list_channel=0,
+                    pinged_member_ids=[], queue_messages=False, sec_between_queue_msgs=2)
+    settings.update(kwargs)
+    return LeaderboardConfig(website_credentials=WebsiteCredentials(url, "", "", game), **settings)
@@ -0,0 +1,100 @@
+"""Compares rendering the mogi list with the old renderer, which rebuilt every line and page
+by string concatenation on each call, against the cog's renderer, which caches each team's
+line and memoizes the pages until the mogi changes. Run from the repository root with:
+
+    python -m benchmarks.list_render --teams 100 1000 5000
+
+The old renderer is kept here to check that both produce the same messages.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from models import Mogi, Team, Player
+from cogs.SquadQueue import SquadQueue
+
+class FakeChannel:
+    id = 1
+
+# the list renderer as it was before it was memoized
+def old_get_list_messages(mogi: Mogi):
+    mogi_list = mogi.confirmed_list()
+    sorted_mogi_list = mogi.mmr_list()
+    late_team_index = (len(mogi_list) // mogi.room_size) * mogi.room_size # index of first late team, if any
+    late_teams = mogi_list[late_team_index:]
+    msg = f""
+    for i, team in enumerate(sorted_mogi_list):
+        msg += f"`{i+1}.` "
+        msg += ", ".join([p.lounge_name for p in team.players])
+        late_str = " `*`" if team in late_teams else ""
+        msg += f" ({team.avg_mmr:.1f} MMR) {late_str}\n"
+    players_per_mogi = mogi.room_size
+    if(len(sorted_mogi_list) % (players_per_mogi/mogi.size) != 0):
+        num_next = int(len(sorted_mogi_list) % (players_per_mogi/mogi.size))
+        teams_per_room = int(players_per_mogi/mogi.size)
+        num_rooms = int(len(sorted_mogi_list) / (players_per_mogi/mogi.size))+1
+        msg += f"`[{num_next}/{teams_per_room}] teams for {num_rooms} rooms`"
+    lines = msg.split("\n")
+    messages = []
+    curr_msg = f"`SQ #{mogi.sq_id} Mogi List`\n"
+    for i, line in enumerate(lines):
+        if len(curr_msg + line + "\n\n") > 2000:
+            messages.append(curr_msg)
+            curr_msg = ""
+        curr_msg += f"{line}\n"
+        if (i+1) % (players_per_mogi/mogi.size) == 0:
+            curr_msg += "\n"
+    if len(curr_msg) > 0:
+        messages.append(curr_msg)
+    return messages
+
+def build_mogi(num_teams: int, size: int, room_size: int, rng: random.Random):
+    mogi = Mogi(1, size, room_size, FakeChannel(), None) # type: ignore
+    now = datetime.now(timezone.utc)
+    for t in range(num_teams):
+        players = [Player(t * size + i + 1, f"Player {t * size + i + 1}", rng.randint(0, 15000)) for i in range(size)]
+        for player in players:
+            player.confirmed = True
+        team = Team(players)
+        team.confirmed_at = now - timedelta(seconds=rng.randint(0, 3600))
+        mogi.add_team(team)
+    return mogi
+
+def timed(function, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats, result
+
+def main(args: argparse.Namespace):
+    cog = SquadQueue.__new__(SquadQueue)
+    print(f"{'teams':>6} {'old ms':>9} {'first ms':>9} {'cached ms':>10} {'1 change ms':>12} {'pages':>6}")
+    for num_teams in args.teams:
+        rng = random.Random(args.seed)
+        mogi = build_mogi(num_teams, args.size, args.room_size, rng)
+        cog.list_cache = {}
+        old_time, old_messages = timed(lambda: old_get_list_messages(mogi), args.repeats)
+        first_time, new_messages = timed(lambda: cog.render_list_messages(mogi), 1)
+        assert new_messages == old_messages, "the renderers disagree"
+        cog.get_list_messages(mogi)
+        cached_time, _ = timed(lambda: cog.get_list_messages(mogi), args.repeats)
+        # one player confirming again changes the mogi, so the list is rendered with the other teams' cached lines
+        def change_and_render():
+            team = mogi.teams[rng.randrange(len(mogi.teams))]
+            mogi.confirm_player(team, team.players[0])
+            return cog.get_list_messages(mogi)
+        change_time = 0.0
+        if mogi.teams:
+            change_time, changed_messages = timed(change_and_render, args.repeats)
+            assert changed_messages == old_get_list_messages(mogi), "the renderers disagree after a change"
+        print(f"{num_teams:>6} {old_time * 1000:>9.3f} {first_time * 1000:>9.3f} {cached_time * 1000:>10.4f} "
+              f"{change_time * 1000:>12.3f} {len(new_messages):>6}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the old and memoized mogi list renderers")
+    parser.add_argument("--teams", type=int, nargs="+", default=[100, 1000, 5000], help="numbers of registered teams to render")
+    parser.add_argument("--size", type=int, default=2, help="players per squad")
+    parser.add_argument("--room-size", type=int, default=12, help="players per room")
+    parser.add_argument("--repeats", type=int, default=20, help="renders timed for each measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
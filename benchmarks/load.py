@@ -0,0 +1,303 @@
+"""Drives the SquadQueue cog through a synthetic queue spike with in-process fakes for
+discord and a stub MMR source, then reports per-command latency percentiles, the discord
+calls the cog made and peak memory. Run from the repository root with:
+
+    python -m benchmarks.load --squads 1000
+
+Commands are run by calling their callbacks directly, so checks and cooldowns are skipped.
+The queue commands take their mogi's lock themselves, so they wait for each other as they do in the bot.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+import discord
+from models import BotConfig, ServerConfig, LeaderboardConfig, MemberCacheSettings, Mogi, Player
+from util import MemberResolver, compile_config
+from cogs.SquadQueue import SquadQueue
+from benchmarks.common import make_leaderboard
+
+GUILD_ID = 1
+JOIN_CHANNEL_ID = 2
+LIST_CHANNEL_ID = 3
+
+ids = itertools.count(1000)
+# number of discord API calls made by the cog, by method
+discord_calls: Counter[str] = Counter()
+DISCORD_LATENCY = 0.0
+
+async def discord_call(name: str):
+    discord_calls[name] += 1
+    await asyncio.sleep(DISCORD_LATENCY)
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.id = next(ids)
+        self.content = content
+
+    async def edit(self, content: str):
+        await discord_call("message.edit")
+        self.content = content
+
+    async def delete(self, delay: float | None = None):
+        await discord_call("message.delete")
+
+class FakeThread:
+    def __init__(self, name: str, parent_id: int):
+        self.id = next(ids)
+        self.name = name
+        self.parent_id = parent_id
+        self.jump_url = f"https://discord.com/channels/{GUILD_ID}/{self.id}"
+
+    async def send(self, content: str):
+        await discord_call("thread.send")
+        return FakeMessage(content)
+
+    async def edit(self, name: str, archived: bool = False):
+        await discord_call("thread.edit")
+        self.name = name
+        return self
+
+class FakeGuild:
+    def __init__(self):
+        self.id = GUILD_ID
+        self.default_role = discord.Object(GUILD_ID)
+        self.threads: dict[int, FakeThread] = {}
+
+    def get_member(self, member_id: int):
+        return None
+
+    def get_role(self, role_id: int):
+        return None
+
+    async def query_members(self, user_ids: list[int], **kwargs):
+        await discord_call("guild.query_members")
+        return []
+
+    def get_thread(self, thread_id: int):
+        return self.threads.get(thread_id, None)
+
+    def get_scheduled_event(self, event_id: int):
+        return None
+
+# the cog checks isinstance(channel, discord.TextChannel), so the fake subclasses it and
+# shadows the properties it needs with plain attributes
+class FakeTextChannel(discord.TextChannel):
+    mention = None
+    jump_url = None
+
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild # type: ignore
+        self.__dict__.update(mention=f"<#{channel_id}>", jump_url=f"https://discord.com/channels/{GUILD_ID}/{channel_id}")
+
+    async def send(self, content: str): # type: ignore
+        await discord_call("channel.send")
+        return FakeMessage(content)
+
+    async def create_thread(self, name: str, **kwargs): # type: ignore
+        await discord_call("channel.create_thread")
+        thread = FakeThread(name, self.id)
+        self.guild.threads[thread.id] = thread
+        return thread
+
+    def overwrites_for(self, obj): # type: ignore
+        return discord.PermissionOverwrite()
+
+    async def set_permissions(self, target, **kwargs): # type: ignore
+        await discord_call("channel.set_permissions")
+
+    async def delete_messages(self, messages, **kwargs): # type: ignore
+        if messages:
+            await discord_call("channel.delete_messages")
+
+class FakeMember(discord.Member):
+    id = None
+    mention = None
+    display_name = None
+
+    def __init__(self, member_id: int):
+        self.__dict__.update(id=member_id, mention=f"<@{member_id}>", display_name=f"Player {member_id}")
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return self.id
+
+class FakeContext:
+    def __init__(self, bot: 'FakeBot', channel: FakeTextChannel, author: FakeMember):
+        self.bot = bot
+        self.channel = channel
+        self.author = author
+        self.guild = channel.guild
+
+    async def send(self, content: str):
+        await discord_call("channel.send")
+        return FakeMessage(content)
+
+class StubLoungeClient:
+    """Returns a made up MMR for every member after a fixed delay"""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def fetch_player(self, lb: LeaderboardConfig, member: discord.Member):
+        await asyncio.sleep(self.latency)
+        return Player(member.id, f"Player {member.id}", random.Random(member.id).randint(0, 15000))
+
+    def invalidate(self, lb: LeaderboardConfig, discord_ids: list[int] | None = None):
+        pass
+
+class FakeBot:
+    shard_count = None
+
+    def __init__(self, config: BotConfig, mmr_latency: float):
+        self.config = config
+        self.guild_index = compile_config(config)
+        self.lounge_client = StubLoungeClient(mmr_latency)
+        self.member_resolver = MemberResolver(MemberCacheSettings())
+        guild = FakeGuild()
+        self.channels = {JOIN_CHANNEL_ID: FakeTextChannel(JOIN_CHANNEL_ID, guild),
+                         LIST_CHANNEL_ID: FakeTextChannel(LIST_CHANNEL_ID, guild)}
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id, None)
+
+    async def wait_until_ready(self):
+        pass
+
+def make_config(state_dir: str, queue_messages: bool):
+    lb = make_leaderboard(join_channel=JOIN_CHANNEL_ID, list_channel=LIST_CHANNEL_ID, queue_messages=queue_messages)
+    server = ServerConfig(admin_roles=[], staff_roles=[], leaderboards={"mk8dx": lb})
+    return BotConfig(token="", application_id=0, servers={GUILD_ID: server}, state_dir=state_dir)
+
+class LoadTest:
+    def __init__(self, cog: SquadQueue, bot: FakeBot, mogi: Mogi):
+        self.cog = cog
+        self.bot = bot
+        self.mogi = mogi
+        self.channel = bot.channels[JOIN_CHANNEL_ID]
+        # keys are command names, values are the latency of each call in seconds
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.spares = itertools.count(10_000_000)
+
+    async def run_command(self, name: str, command, author: FakeMember, *args):
+        ctx = FakeContext(self.bot, self.channel, author)
+        start = time.perf_counter()
+        await command.callback(self.cog, ctx, *args)
+        self.latencies[name].append(time.perf_counter() - start)
+
+    # one squad's commands, in the order its players would send them
+    async def run_squad(self, squad_num: int, rng: random.Random, think_time: float):
+        size = self.mogi.size
+        members = [FakeMember(squad_num * size + i + 1) for i in range(size)]
+        leader = members[0]
+        async def think():
+            if think_time > 0:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+        if size == 1:
+            await self.run_command("!c", SquadQueue.can, leader, [])
+        else:
+            # the last player is added with !ap afterwards, when the format allows it
+            invited = members[1:-1] if size > 2 else members[1:]
+            await self.run_command("!c @", SquadQueue.can, leader, invited)
+            if size > 2:
+                await think()
+                await self.run_command("!ap", SquadQueue.add_player_to_squad, leader, [members[-1]])
+            if rng.random() < 0.05:
+                sub_in = FakeMember(next(self.spares))
+                await think()
+                await self.run_command("!sub", SquadQueue.sub, leader, members[-1], sub_in)
+                members[-1] = sub_in
+            for member in members[1:]:
+                await think()
+                await self.run_command("!c", SquadQueue.can, member, [])
+        if rng.random() < 0.08:
+            await think()
+            await self.run_command("!d", SquadQueue.drop, leader)
+
+    async def run(self, num_squads: int, burst_size: int, think_time: float, seed: int):
+        rng = random.Random(seed)
+        for start in range(0, num_squads, burst_size):
+            burst = range(start, min(start + burst_size, num_squads))
+            await asyncio.gather(*[self.run_squad(n, random.Random(rng.random()), think_time) for n in burst])
+
+    async def timed(self, name: str, coro):
+        start = time.perf_counter()
+        await coro
+        self.latencies[name].append(time.perf_counter() - start)
+
+def percentile(values: list[float], p: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def print_report(test: LoadTest, elapsed: float, peak_memory: int | None):
+    print(f"{'command':<18} {'calls':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, values in test.latencies.items():
+        print(f"{name:<18} {len(values):>7} {percentile(values, 0.5)*1000:>9.3f} {percentile(values, 0.9)*1000:>9.3f} "
+              f"{percentile(values, 0.99)*1000:>9.3f} {max(values)*1000:>9.3f}")
+    print()
+    print(f"{'discord call':<26} {'count':>7}")
+    for name, count in sorted(discord_calls.items()):
+        print(f"{name:<26} {count:>7}")
+    print(f"{'total':<26} {sum(discord_calls.values()):>7}")
+    print()
+    print(f"registered teams: {test.mogi.count_registered()}, rooms: {len(test.mogi.rooms)}")
+    print(f"total time: {elapsed:.2f}s")
+    if peak_memory is not None:
+        print(f"peak traced memory: {peak_memory / 1024 / 1024:.1f} MiB")
+
+async def main(args: argparse.Namespace):
+    global DISCORD_LATENCY
+    DISCORD_LATENCY = args.discord_latency
+    random.seed(args.seed)
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as state_dir:
+        bot = FakeBot(make_config(state_dir, args.queue_messages), args.mmr_latency)
+        cog = SquadQueue(bot) # type: ignore
+        cog.list_task.cancel()
+        await cog._restore_task
+        channel = bot.channels[JOIN_CHANNEL_ID]
+        lb = bot.config.servers[GUILD_ID].leaderboards["mk8dx"]
+        mogi = Mogi(1, args.size, args.room_size, channel, lb)
+        mogi.started = True
+        mogi.gathering = True
+        cog.get_shard(channel.guild.id).ongoing_events[channel] = mogi
+        test = LoadTest(cog, bot, mogi)
+
+        start = time.perf_counter()
+        await test.run(args.squads, args.burst, args.think_time, args.seed)
+        # the first list update posts every page and the second only edits the pages that changed
+        await test.timed("list_task", SquadQueue.list_task.coro(cog))
+        await test.timed("list_task", SquadQueue.list_task.coro(cog))
+        await test.timed("add_teams_to_rooms", cog.add_teams_to_rooms(mogi, 10))
+        # wait for the queued messages to go out, when queue_messages is on
+        while cog.get_shard(channel.guild.id).message_scheduler.depth() > 0:
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        await cog.cog_unload()
+
+    peak_memory = None
+    if not args.no_tracemalloc:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print_report(test, elapsed, peak_memory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--squads", type=int, default=1000, help="number of squads that try to join")
+    parser.add_argument("--size", type=int, default=4, help="players per squad")
+    parser.add_argument("--room-size", type=int, default=12, help="players per room")
+    parser.add_argument("--burst", type=int, default=200, help="number of squads joining at the same time")
+    parser.add_argument("--think-time", type=float, default=0.0, help="average seconds between a squad's commands")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="seconds each fake discord call takes")
+    parser.add_argument("--mmr-latency", type=float, default=0.0, help="seconds each stub MMR lookup takes")
+    parser.add_argument("--queue-messages", action="store_true", help="send join messages through the message scheduler")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="don't trace memory, which slows every command down")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
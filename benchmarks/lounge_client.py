@@ -0,0 +1,105 @@
+"""Measures how util/mmr.py performs against the local Lounge API stand-in in
+benchmarks/lounge_server.py, at several levels of concurrent joins. Run from the
+repository root with:
+
+    python -m benchmarks.lounge_client --latency 0.1 --levels 1,8,32,128
+
+Each join looks up a whole squad with get_mmr, like !c does. Every level is run once with
+a cold cache and once more for the same players with a warm cache. The bulk endpoint is
+then timed on the same players for comparison.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter
+import aiohttp
+import discord
+from models import LeaderboardConfig, LoungeAPISettings
+from util.mmr import LoungeClient, get_mmr
+from benchmarks.common import make_leaderboard
+from benchmarks.lounge_server import LoungeServer, add_server_arguments, server_settings
+
+def percentile(values: list[float], p: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def run_joins(client: LoungeClient, lb: LeaderboardConfig, squads: list[list[discord.Object]], concurrency: int):
+    """Looks up every squad with at most concurrency joins in progress at once. Returns
+       the latency of each join and the number of players that weren't found."""
+    latencies: list[float] = []
+    missing = 0
+    remaining = iter(squads)
+    async def worker():
+        nonlocal missing
+        for squad in remaining:
+            start = time.perf_counter()
+            players = await get_mmr(client, lb, squad) # type: ignore
+            latencies.append(time.perf_counter() - start)
+            missing += sum(1 for p in players if p is None)
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, missing
+
+async def run_bulk(url: str, squads: list[list[discord.Object]], concurrency: int, batch_size: int):
+    ids = [m.id for squad in squads for m in squad]
+    batches = [ids[i:i+batch_size] for i in range(0, len(ids), batch_size)]
+    remaining = iter(batches)
+    latencies: list[float] = []
+    async with aiohttp.ClientSession() as session:
+        async def worker():
+            for batch in remaining:
+                start = time.perf_counter()
+                async with session.get(f"{url}/api/player/bulk", params={"discordIds": ",".join(str(i) for i in batch), "game": "mk8dx"}) as resp:
+                    await resp.read()
+                latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies
+
+def print_row(label: str, concurrency: int, num_players: int, elapsed: float, latencies: list[float], missing: int | str, responses: Counter[int]):
+    statuses = " ".join(f"{status}:{count}" for status, count in sorted(responses.items()))
+    print(f"{label:<6} {concurrency:>6} {num_players / elapsed:>11.0f} {percentile(latencies, 0.5)*1000:>9.1f} "
+          f"{percentile(latencies, 0.99)*1000:>9.1f} {missing:>8} {statuses}")
+
+async def main(args: argparse.Namespace):
+    server = LoungeServer(server_settings(args))
+    url = await server.start()
+    lb = make_leaderboard(url)
+    settings = LoungeAPISettings(max_concurrency=args.max_concurrency, pool_size=args.pool_size,
+                                 cache_ttl=args.cache_ttl, cache_max_size=args.joins * args.squad_size)
+    ids = itertools.count(1)
+    print(f"{'cache':<6} {'joins':>6} {'players/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'missing':>8} responses")
+    try:
+        for concurrency in args.levels:
+            squads = [[discord.Object(next(ids)) for _ in range(args.squad_size)] for _ in range(args.joins)]
+            num_players = args.joins * args.squad_size
+            client = LoungeClient(settings)
+            await client.start()
+            try:
+                for label in ("cold", "warm"):
+                    before = Counter(server.responses)
+                    start = time.perf_counter()
+                    latencies, missing = await run_joins(client, lb, squads, concurrency)
+                    elapsed = time.perf_counter() - start
+                    print_row(label, concurrency, num_players, elapsed, latencies, missing, server.responses - before)
+            finally:
+                await client.close()
+            before = Counter(server.responses)
+            start = time.perf_counter()
+            latencies = await run_bulk(url, squads, min(concurrency, settings.max_concurrency), args.bulk_size)
+            elapsed = time.perf_counter() - start
+            print_row("bulk", concurrency, num_players, elapsed, latencies, "-", server.responses - before)
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=lambda s: [int(i) for i in s.split(",")], default=[1, 8, 32, 128],
+                        help="comma separated numbers of concurrent joins to test")
+    parser.add_argument("--joins", type=int, default=500, help="number of squads that join at each level")
+    parser.add_argument("--squad-size", type=int, default=2, help="players looked up per join")
+    parser.add_argument("--max-concurrency", type=int, default=LoungeAPISettings.max_concurrency)
+    parser.add_argument("--pool-size", type=int, default=LoungeAPISettings.pool_size)
+    parser.add_argument("--cache-ttl", type=int, default=LoungeAPISettings.cache_ttl)
+    parser.add_argument("--bulk-size", type=int, default=100, help="players per bulk request")
+    add_server_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
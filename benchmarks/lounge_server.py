@@ -0,0 +1,145 @@
+"""A local stand-in for the Lounge API, for benchmarking util/mmr.py without the real site.
+Implements /api/player?discordId=&game= and a bulk variant,
+/api/player/bulk?discordIds=1,2,3&game=, with configurable latency, error rate, share of
+unknown players and rate limiting. Run it on its own from the repository root with:
+
+    python -m benchmarks.lounge_server --port 5000 --latency 0.05
+
+and point a leaderboard's website_credentials.url at http://localhost:5000.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from aiohttp import web
+
+@dataclass
+class ServerSettings:
+    latency: float = 0.0 # average seconds each request takes
+    jitter: float = 0.0 # each request takes latency +/- up to this many seconds
+    error_rate: float = 0.0 # share of requests that fail with a 500
+    not_found_ratio: float = 0.0 # share of players that don't exist and return a 404
+    rate_limit: float = 0.0 # requests per second allowed before returning 429s; 0 for no limit
+    rate_limit_burst: int = 20 # number of requests allowed at once before the rate limit applies
+
+class LoungeServer:
+    def __init__(self, settings: ServerSettings):
+        self.settings = settings
+        # number of responses sent, by status code
+        self.responses: Counter[int] = Counter()
+        self.tokens = float(settings.rate_limit_burst)
+        self.last_refill = time.monotonic()
+        self.app = web.Application()
+        self.app.add_routes([web.get('/api/player', self.get_player),
+                             web.get('/api/player/bulk', self.get_players)])
+        self.runner: web.AppRunner | None = None
+
+    def player_exists(self, discord_id: int):
+        # the same players always exist, so retries and cache hits see consistent data
+        return random.Random(discord_id).random() >= self.settings.not_found_ratio
+
+    def player_data(self, discord_id: int, game: str | None):
+        mmr = random.Random(discord_id).randint(0, 15000)
+        return {"name": f"Player {discord_id}", "discordId": str(discord_id), "mmr": mmr, "game": game}
+
+    # token bucket refilled at rate_limit tokens per second
+    def take_token(self):
+        if self.settings.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.settings.rate_limit_burst, self.tokens + (now - self.last_refill) * self.settings.rate_limit)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def before_response(self):
+        """Returns an error response if the request should fail, after waiting out the latency"""
+        if not self.take_token():
+            retry_after = (1 - self.tokens) / self.settings.rate_limit
+            return self.respond(web.json_response({"title": "Too Many Requests"}, status=429,
+                                                  headers={"Retry-After": f"{retry_after:.3f}"}))
+        delay = self.settings.latency + random.uniform(-self.settings.jitter, self.settings.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.settings.error_rate:
+            return self.respond(web.json_response({"title": "Internal Server Error"}, status=500))
+        return None
+
+    def respond(self, response: web.Response):
+        self.responses[response.status] += 1
+        return response
+
+    async def get_player(self, request: web.Request):
+        error = await self.before_response()
+        if error is not None:
+            return error
+        try:
+            discord_id = int(request.query['discordId'])
+        except (KeyError, ValueError):
+            return self.respond(web.json_response({"title": "Bad Request"}, status=400))
+        if not self.player_exists(discord_id):
+            return self.respond(web.json_response({"title": "Player not found"}, status=404))
+        return self.respond(web.json_response(self.player_data(discord_id, request.query.get('game', None))))
+
+    async def get_players(self, request: web.Request):
+        error = await self.before_response()
+        if error is not None:
+            return error
+        try:
+            discord_ids = [int(i) for i in request.query['discordIds'].split(',') if i]
+        except (KeyError, ValueError):
+            return self.respond(web.json_response({"title": "Bad Request"}, status=400))
+        game = request.query.get('game', None)
+        players = [self.player_data(i, game) for i in discord_ids if self.player_exists(i)]
+        return self.respond(web.json_response({"players": players}))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """Starts serving and returns the base URL; port 0 picks a free port"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        assert site._server is not None
+        bound_port = site._server.sockets[0].getsockname()[1] # type: ignore
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.0, help="average seconds each request takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="each request takes latency +/- up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail with a 500")
+    parser.add_argument("--not-found", type=float, default=0.0, help="share of players that don't exist")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before returning 429s; 0 for no limit")
+    parser.add_argument("--rate-limit-burst", type=int, default=20, help="requests allowed at once before the rate limit applies")
+
+def server_settings(args: argparse.Namespace):
+    return ServerSettings(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          not_found_ratio=args.not_found, rate_limit=args.rate_limit,
+                          rate_limit_burst=args.rate_limit_burst)
+
+async def serve(args: argparse.Namespace):
+    server = LoungeServer(server_settings(args))
+    url = await server.start(args.host, args.port)
+    print(f"Serving the Lounge API stand-in at {url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    add_server_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
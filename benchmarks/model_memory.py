@@ -0,0 +1,122 @@
+"""Compares the memory used by a queue's players, teams and rooms with the old models,
+which held discord.Member and discord.Thread objects in plain attribute dicts, and the
+slotted models that only keep IDs. Run from the repository root with:
+
+    python -m benchmarks.model_memory --players 1000 10000
+
+The discord objects are built from gateway payloads, and nothing else holds on to them,
+like when the member cache is off; with a full member cache the members would stay in
+memory either way, but each player would still pay for its attribute dict.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import discord
+from models import Player, Team, Room
+
+GUILD_ID = 1
+CHANNEL_ID = 2
+
+class FakeState:
+    """The parts of discord.py's connection state that Member and Thread need to be built"""
+    member_cache_flags = discord.MemberCacheFlags.none()
+
+    def store_user(self, data, *, cache=True):
+        return discord.User(state=self, data=data) # type: ignore
+
+    def _get_guild(self, guild_id):
+        return None
+
+state = FakeState()
+guild = discord.Object(GUILD_ID)
+
+def make_member(member_id: int):
+    data = {'user': {'id': str(member_id), 'username': f"player{member_id}", 'discriminator': '0',
+                     'avatar': None, 'global_name': f"Player {member_id}"},
+            'roles': [], 'joined_at': None, 'nick': None, 'deaf': False, 'mute': False, 'flags': 0}
+    return discord.Member(data=data, guild=guild, state=state) # type: ignore
+
+def make_thread(thread_id: int, name: str):
+    data = {'id': str(thread_id), 'name': name, 'type': 12, 'guild_id': str(GUILD_ID), 'parent_id': str(CHANNEL_ID),
+            'owner_id': '1', 'message_count': 0, 'member_count': 0, 'rate_limit_per_user': 0, 'flags': 0,
+            'thread_metadata': {'archived': False, 'auto_archive_duration': 60, 'locked': False,
+                                'archive_timestamp': '2024-01-01T00:00:00+00:00'}}
+    return discord.Thread(guild=guild, state=state, data=data) # type: ignore
+
+# the models as they were before they were slotted
+class OldPlayer:
+    def __init__ (self, member: discord.Member, lounge_name: str, mmr: int):
+        self.member = member
+        self.lounge_name = lounge_name
+        self.mmr = mmr
+        self.confirmed = False
+        self.score = 0
+
+class OldTeam:
+    def __init__ (self, players: list[OldPlayer]):
+        self.players = players
+        self.players_by_id = {p.member.id: p for p in players}
+        self.avg_mmr = sum([p.mmr for p in self.players]) / len(self.players)
+        self.created_at = datetime.now(timezone.utc)
+        self.confirmed_at: datetime | None = None
+        self.mogi = None
+
+class OldRoom:
+    def __init__(self, teams: list[OldTeam], room_num: int, thread: discord.Thread):
+        self.teams = teams
+        self.room_num = room_num
+        self.thread = thread
+        self.finished = False
+
+def build_old(num_players: int, squad_size: int, room_size: int):
+    teams = []
+    for start in range(0, num_players, squad_size):
+        players = [OldPlayer(make_member(start + i + 1), f"Player {start + i + 1}", random.randint(0, 15000))
+                   for i in range(squad_size)]
+        teams.append(OldTeam(players))
+    teams_per_room = room_size // squad_size
+    rooms = [OldRoom(teams[i:i+teams_per_room], i // teams_per_room + 1, make_thread(10**9 + i, f"SQ1 Room {i // teams_per_room + 1}"))
+             for i in range(0, len(teams), teams_per_room)]
+    return teams, rooms
+
+def build_new(num_players: int, squad_size: int, room_size: int):
+    teams = []
+    for start in range(0, num_players, squad_size):
+        players = [Player(start + i + 1, f"Player {start + i + 1}", random.randint(0, 15000)) for i in range(squad_size)]
+        teams.append(Team(players))
+    teams_per_room = room_size // squad_size
+    rooms = [Room(teams[i:i+teams_per_room], i // teams_per_room + 1, 10**9 + i)
+             for i in range(0, len(teams), teams_per_room)]
+    return teams, rooms
+
+def measure(build, num_players: int, squad_size: int, room_size: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = build(num_players, squad_size, room_size)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used, elapsed
+
+def main(args: argparse.Namespace):
+    print(f"{'players':>8} {'models':<7} {'memory KiB':>11} {'bytes/player':>13} {'build ms':>9}")
+    for num_players in args.players:
+        for name, build in (("old", build_old), ("new", build_new)):
+            random.seed(args.seed)
+            used, elapsed = measure(build, num_players, args.size, args.room_size)
+            print(f"{num_players:>8} {name:<7} {used / 1024:>11.1f} {used / num_players:>13.1f} {elapsed * 1000:>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory used by the old and new queue models")
+    parser.add_argument("--players", type=int, nargs="+", default=[1000, 10000], help="numbers of players to build queues of")
+    parser.add_argument("--size", type=int, default=2, help="players per squad")
+    parser.add_argument("--room-size", type=int, default=12, help="players per room")
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
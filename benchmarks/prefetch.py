@@ -0,0 +1,112 @@
+"""Measures the MMR lookups of the burst of joins when a queue opens, against a local fake
+Lounge API with a fixed latency, with a cold MMR cache, with the cache prefetched before the
+queue opens, with the prefetch starting when it opens, and with the bot's two prefetches:
+one --lead-time seconds before the queue opens and another when it opens. Run from the
+repository root with:
+
+    python -m benchmarks.prefetch --players 400 --latency 0.2
+
+The lead time, cache TTL and prefetch rate default to the bot's defaults, so a run takes
+several minutes; the lead prefetch shows whether prefetched players are still cached when
+the queue opens.
+
+Each joining player is a recent participant with probability --overlap; the others are new,
+so they're never prefetched and show whether a running prefetch slows real lookups down.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import discord
+from aiohttp import web
+from models import LoungeAPISettings, PrefetchSettings
+from util import LoungeClient, MMRPrefetcher
+from benchmarks.common import make_leaderboard
+
+async def start_fake_lounge(latency: float):
+    requests = [0]
+    async def handle_player(request: web.Request):
+        requests[0] += 1
+        await asyncio.sleep(latency)
+        discord_id = int(request.query["discordId"])
+        return web.json_response({"name": f"Player {discord_id}", "mmr": random.Random(discord_id).randint(0, 15000)})
+    app = web.Application()
+    app.router.add_get("/api/player", handle_player)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # type: ignore
+    return runner, port, requests
+
+def percentile(values: list[float], p: float):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+async def run(mode: str, args: argparse.Namespace, port: int, requests: list[int]):
+    lb = make_leaderboard(f"http://127.0.0.1:{port}")
+    client = LoungeClient(LoungeAPISettings(cache_ttl=args.cache_ttl))
+    await client.start()
+    prefetcher = MMRPrefetcher(client, PrefetchSettings(max_players=args.recent, batch_size=args.batch_size,
+                                                        requests_per_second=args.rate))
+    rng = random.Random(args.seed)
+    recent = list(range(1, args.recent + 1))
+    prefetcher.remember(lb, recent)
+    joiners = [rng.choice(recent) if rng.random() < args.overlap else 10**6 + i for i in range(args.players)]
+    guild = discord.Object(1)
+    if mode == "before":
+        # the prefetch started lead_time minutes before the queue opened and has finished
+        prefetcher.start(lb, prefetcher.candidates(lb, guild)) # type: ignore
+        await asyncio.gather(*prefetcher.tasks.values())
+    elif mode == "lead":
+        prefetcher.start(lb, prefetcher.candidates(lb, guild)) # type: ignore
+        await asyncio.sleep(args.lead_time)
+    requests[0] = 0
+    start = time.perf_counter()
+    if mode in ("at open", "lead"):
+        prefetcher.start(lb, prefetcher.candidates(lb, guild)) # type: ignore
+    recent_latencies: list[float] = []
+    new_latencies: list[float] = []
+    async def join(member_id: int, delay: float):
+        await asyncio.sleep(delay)
+        lookup_start = time.perf_counter()
+        await client.lookup(lb, member_id)
+        (recent_latencies if member_id <= args.recent else new_latencies).append(time.perf_counter() - lookup_start)
+    # the joins are spread over the first burst seconds after the queue opens
+    await asyncio.gather(*[join(member_id, rng.uniform(0, args.burst)) for member_id in joiners])
+    elapsed = time.perf_counter() - start
+    await prefetcher.close()
+    await client.close()
+    return recent_latencies, new_latencies, requests[0], elapsed
+
+def summary(latencies: list[float]):
+    if not latencies:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    return (f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+            f"{sum(l < 0.01 for l in latencies) / len(latencies):>8.0%}")
+
+async def main(args: argparse.Namespace):
+    runner, port, requests = await start_fake_lounge(args.latency)
+    print(f"{'prefetch':<9} {'joiners':<7} {'p50 ms':>8} {'p99 ms':>8} {'warm':>8}   burst requests")
+    try:
+        for mode in ("none", "before", "at open", "lead"):
+            recent_latencies, new_latencies, burst_requests, elapsed = await run(mode, args, port, requests)
+            print(f"{mode:<9} {'recent':<7} {summary(recent_latencies)}   {burst_requests} in {elapsed:.1f}s")
+            print(f"{'':<9} {'new':<7} {summary(new_latencies)}")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure MMR lookups when a queue opens, with and without prefetching")
+    parser.add_argument("--players", type=int, default=400, help="number of players joining when the queue opens")
+    parser.add_argument("--recent", type=int, default=500, help="number of recent participants remembered for the leaderboard")
+    parser.add_argument("--overlap", type=float, default=0.9, help="fraction of joining players who are recent participants")
+    parser.add_argument("--burst", type=float, default=10.0, help="seconds the joins are spread over")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds each fake Lounge API request takes")
+    parser.add_argument("--batch-size", type=int, default=2, help="prefetch lookups made at the same time")
+    parser.add_argument("--rate", type=float, default=4.0, help="maximum prefetch lookups per second")
+    parser.add_argument("--lead-time", type=float, default=120.0, help="seconds before the queue opens that the lead prefetch starts")
+    parser.add_argument("--cache-ttl", type=int, default=300, help="seconds a looked up MMR stays cached")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
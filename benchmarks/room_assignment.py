@@ -0,0 +1,40 @@
+"""Compares the room assignment engines in util/RoomAssignment.py on synthetic MMR
+distributions. Run from the repository root with:
+
+    python -m benchmarks.room_assignment
+"""
+import random
+import time
+from util.RoomAssignment import ROOM_ASSIGNMENT_ENGINES
+
+DISTRIBUTIONS = {
+    "normal": lambda: random.gauss(6000, 2500),
+    "uniform": lambda: random.uniform(0, 15000),
+    # a strong group and a casual group, like an event night with an invitational tier
+    "bimodal": lambda: random.gauss(11000, 1500) if random.random() < 0.3 else random.gauss(4000, 1500)
+}
+
+# (number of registered teams, teams per room); the leftover teams are the late teams
+CASES = [(124, 6), (1204, 6), (5003, 6), (1211, 12), (5011, 12), (2001, 2)]
+
+def summarize(mmrs: list[float], rooms: list[list[int]], num_teams: int):
+    spreads = [mmrs[room[0]] - mmrs[room[-1]] for room in rooms]
+    skipped_in_time = num_teams - sum(1 for room in rooms for i in room if i < num_teams)
+    return max(spreads), sum(spreads) / len(spreads), skipped_in_time
+
+def main():
+    random.seed(0)
+    print(f"{'distribution':<10} {'teams':>6} {'per room':>8} {'engine':<11} {'ms':>8} {'max spread':>11} {'avg spread':>11} {'on-time left out':>17}")
+    for name, sample in DISTRIBUTIONS.items():
+        for num_registered, teams_per_room in CASES:
+            mmrs = [max(0.0, sample()) for _ in range(num_registered)]
+            num_rooms = num_registered // teams_per_room
+            for engine, assignment in ROOM_ASSIGNMENT_ENGINES.items():
+                start = time.perf_counter()
+                rooms = assignment(mmrs, teams_per_room, num_rooms, 500)
+                elapsed = (time.perf_counter() - start) * 1000
+                max_spread, avg_spread, skipped = summarize(mmrs, rooms, num_rooms * teams_per_room)
+                print(f"{name:<10} {num_registered:>6} {teams_per_room:>8} {engine:<11} {elapsed:>8.2f} {max_spread:>11.0f} {avg_spread:>11.0f} {skipped:>17}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import discord
+import asyncio
+import dataclasses
 from discord.ext import commands, tasks
 from discord import app_commands
 from dateutil.parser import parse
@@ -8,27 +10,59 @@ import json
 from models.Mogi import Mogi, Team, Room, Player
 from models.Config import LeaderboardConfig
 from models import SquadQueueBot
-from util import get_server_config, leaderboard_autocomplete, get_leaderboard_slash, format_autocomplete, get_mmr, room_size_autocomplete
+from util import get_server_config, get_guild_index, get_config, compile_config, config_warnings, CONFIG_PATH, leaderboard_autocomplete, get_leaderboard_slash, format_autocomplete, get_mmr, room_size_autocomplete
+from util import PRIORITY_HIGH, PRIORITY_NORMAL, ThreadPlanner, PACING_INTERVAL, assign_rooms
+from util import DeadlineScheduler, ShardState, shard_for_guild
+from util import ScheduledEventWorker, EventBatch, parse_schedule, MAX_IMPORT_BYTES
+from util import room_error, build_table, table_str, MMRPrefetcher
+from util import Journal as jr
+from util import Metrics as metrics
+
+# maximum number of room threads that are created or announced in at the same time
+ROOM_ANNOUNCE_CONCURRENCY = 5
 
 class SquadQueue(commands.Cog):
-    def __init__(self, bot: commands.Bot):
+    def __init__(self, bot: SquadQueueBot):
         self.bot = bot
         
-        # keys are discord.Guild objects, values are list of Mogi instances
-        self.scheduled_events: dict[discord.Guild, list[Mogi]] = {}
-        # keys are discord.TextChannel objects, values are instances of Mogi
-        self.ongoing_events: dict[discord.TextChannel, Mogi] = {}
+        # keys are shard IDs, values are the scheduled and ongoing mogis, message queues and
+        # list messages of the guilds on that shard
+        self.shards: dict[int, ShardState] = {}
+        # keys are room thread IDs, values are the mogi and room using that thread
+        self.room_threads: dict[int, tuple[Mogi, Room]] = {}
+        # keeps each guild under discord's thread creation limit
+        self.thread_planner = ThreadPlanner()
+        # creates the discord events of imported schedules in the background
+        self.event_worker = ScheduledEventWorker()
+        # keys are ongoing mogis, values are the mogi's version and its list messages at that version
+        self.list_cache: dict[Mogi, tuple[int, list[str]]] = {}
+        # warms the MMR cache for likely players before a queue opens
+        self.prefetcher = MMRPrefetcher(bot.lounge_client, bot.config.prefetch)
         
-        self._scheduler_task = self.sqscheduler.start()
-        self._msgqueue_task = self.send_queued_messages.start()
+        # opens scheduled mogis and closes automated ones at their deadlines
+        self.deadlines = DeadlineScheduler()
+        self.deadlines.start()
         self._list_task = self.list_task.start()
 
-        self.msg_queue: dict[discord.TextChannel, list[str]] = {}
-        self.list_messages = {}
+        # every change to the queues is journaled, so they can be restored after a restart
+        self.journal = jr.StateJournal(bot.config.state_dir)
+        self.recovered_state = self.journal.recover()
+        # recovered state that couldn't be restored, like mogis whose channel isn't cached yet; it's
+        # kept in every new snapshot so it isn't lost, and restoring it is tried again after the next restart
+        self.unrestored = jr.Snapshot()
+        self.journal.open()
+        self._restore_task = asyncio.create_task(self.restore_state())
 
         with open('./timezones.json', 'r') as cjson:
             self.timezones = json.load(cjson)
 
+        # these gauges are only computed when the metrics are scraped
+        metrics.message_queue_depth.set_function(lambda: {(str(s.shard_id),): s.message_scheduler.depth() for s in self.shards.values()})
+        metrics.scheduled_events.set_function(lambda: {(str(s.shard_id),): len(s.scheduled_events) for s in self.shards.values()})
+        metrics.mogi_registered_teams.set_function(lambda: self.mogi_gauge(lambda mogi: mogi.count_registered()))
+        metrics.mogi_teams.set_function(lambda: self.mogi_gauge(lambda mogi: len(mogi.teams)))
+        metrics.mogi_rooms.set_function(lambda: self.mogi_gauge(lambda mogi: len(mogi.rooms)))
+
     async def lockdown(self, channel:discord.TextChannel):
         overwrite = channel.overwrites_for(channel.guild.default_role)
         overwrite.send_messages = False
@@ -41,45 +75,218 @@ class SquadQueue(commands.Cog):
         await channel.set_permissions(channel.guild.default_role, overwrite=overwrite)
         await channel.send("Unlocked " + channel.mention)
 
+    async def cog_unload(self):
+        for gauge in (metrics.message_queue_depth, metrics.scheduled_events, metrics.mogi_registered_teams,
+                      metrics.mogi_teams, metrics.mogi_rooms):
+            gauge.set_function(None)
+        for shard in self.shards.values():
+            shard.close()
+        self.deadlines.close()
+        self.event_worker.close()
+        await self.prefetcher.close()
+        self.snapshot_task.cancel()
+        if self._restore_task.done():
+            self.write_snapshot()
+        self.journal.close()
+
+    def get_shard(self, guild_id: int):
+        shard_id = shard_for_guild(guild_id, self.bot.shard_count)
+        if shard_id not in self.shards:
+            self.shards[shard_id] = ShardState(shard_id)
+        return self.shards[shard_id]
+
+    def ongoing_mogis(self):
+        return [mogi for shard in self.shards.values() for mogi in shard.ongoing_events.values()]
+
+    def mogi_gauge(self, value):
+        return {(str(mogi.mogi_channel.guild.id), str(mogi.mogi_channel.id), str(mogi.sq_id)): value(mogi)
+                for mogi in self.ongoing_mogis()}
+
+    def record(self, record: jr.Record):
+        try:
+            self.journal.append(record)
+        except Exception as e:
+            print(e)
+
+    def record_status(self, mogi: Mogi):
+        self.record(jr.MogiStatus(mogi.mogi_channel.id, mogi.gathering, mogi.is_automated, mogi.making_rooms_run))
+
+    def get_leaderboard_name(self, mogi: Mogi):
+        index = self.bot.guild_index.get(mogi.mogi_channel.guild.id, None)
+        if index is None:
+            return ""
+        for name, lb in index.leaderboards.items():
+            if lb is mogi.leaderboard:
+                return name
+        # mogis made before the config was reloaded still have the old LeaderboardConfig
+        return index.join_channels.get(mogi.mogi_channel.id, "")
+
+    def get_mogi_state(self, mogi: Mogi):
+        return jr.mogi_state(mogi, self.get_leaderboard_name(mogi))
+
+    def write_snapshot(self):
+        shards = self.shards.values()
+        scheduled = [self.get_mogi_state(m) for shard in shards for m in shard.scheduled_events.all()]
+        ongoing = [self.get_mogi_state(m) for m in self.ongoing_mogis()]
+        list_messages = {channel.id: [m.id for m, _ in messages] for shard in shards
+                         for channel, messages in shard.list_messages.items()}
+        # unrestored state is only kept while nothing newer has replaced it
+        scheduled_ids = {(m.guild_id, m.sq_id) for m in scheduled}
+        ongoing_channels = {m.channel_id for m in ongoing}
+        scheduled += [m for m in self.unrestored.scheduled if (m.guild_id, m.sq_id) not in scheduled_ids]
+        ongoing += [m for m in self.unrestored.ongoing if m.channel_id not in ongoing_channels]
+        list_messages = {**self.unrestored.list_messages, **list_messages}
+        spare_threads = [jr.SpareThread(*spare) for spare in self.thread_planner.all_spares()]
+        spare_ids = {t.thread_id for t in spare_threads}
+        spare_threads += [t for t in self.unrestored.spare_threads if t.thread_id not in spare_ids]
+        snapshot = jr.Snapshot(scheduled=scheduled, ongoing=ongoing, list_messages=list_messages, spare_threads=spare_threads)
+        try:
+            self.journal.write_snapshot(snapshot)
+        except Exception as e:
+            print(e)
+
+    # the journal is compacted into a new snapshot once a minute, if anything changed
+    @tasks.loop(seconds=60)
+    async def snapshot_task(self):
+        if self.journal.pending > 0:
+            self.write_snapshot()
+
+    # rebuilds the queues from the recovered snapshot once the bot's cache is ready; members,
+    # threads and messages are only referenced by ID, so nothing has to be fetched from discord
+    async def restore_state(self):
+        await self.bot.wait_until_ready()
+        snapshot = self.recovered_state
+        self.journal.paused = True
+        try:
+            for state in snapshot.scheduled:
+                mogi = self.restore_mogi(state)
+                if mogi is None:
+                    self.unrestored.scheduled.append(state)
+                    continue
+                self.get_shard(mogi.mogi_channel.guild.id).scheduled_events.add(mogi.mogi_channel.guild.id, mogi)
+                self.schedule_queue_open(mogi)
+            for state in snapshot.ongoing:
+                mogi = self.restore_mogi(state)
+                if mogi is None:
+                    self.unrestored.ongoing.append(state)
+                    continue
+                self.get_shard(mogi.mogi_channel.guild.id).ongoing_events[mogi.mogi_channel] = mogi
+                for room in mogi.rooms:
+                    self.room_threads[room.thread_id] = (mogi, room)
+                self.schedule_mogi_deadlines(mogi)
+            for channel_id, message_ids in snapshot.list_messages.items():
+                channel = self.bot.get_channel(channel_id)
+                if not isinstance(channel, discord.TextChannel):
+                    print(f"Couldn't restore the list messages in channel {channel_id}: the channel wasn't found", flush=True)
+                    self.unrestored.list_messages[channel_id] = message_ids
+                    continue
+                # the content of each message isn't saved, so each one is edited on the next list update
+                self.get_shard(channel.guild.id).list_messages[channel] = [(channel.get_partial_message(m), None) for m in message_ids] # type: ignore
+            for spare in snapshot.spare_threads:
+                self.thread_planner.release(spare.guild_id, spare.channel_id, [spare.thread_id])
+        except Exception as e:
+            print(e)
+            # everything recovered that isn't running now is kept, since it's unknown what was skipped
+            self.unrestored = snapshot
+        finally:
+            self.journal.paused = False
+        self.recovered_state = jr.Snapshot()
+        # imported events whose discord events weren't all created before the restart
+        for shard in self.shards.values():
+            missing_events: dict[int, list[Mogi]] = {}
+            for mogi in shard.scheduled_events.all():
+                if mogi.discord_event_id is None:
+                    missing_events.setdefault(mogi.mogi_channel.guild.id, []).append(mogi)
+            for guild_id, mogis in missing_events.items():
+                guild = self.bot.get_guild(guild_id)
+                if guild is not None:
+                    self.submit_discord_events(guild, mogis)
+        num_scheduled = sum(len(shard.scheduled_events) for shard in self.shards.values())
+        print(f"Restored {len(self.ongoing_mogis())} ongoing and {num_scheduled} scheduled mogis", flush=True)
+        if self.unrestored.ongoing or self.unrestored.scheduled:
+            print(f"Kept {len(self.unrestored.ongoing)} ongoing and {len(self.unrestored.scheduled)} scheduled mogis "
+                  "that couldn't be restored, to try again after the next restart", flush=True)
+        self.write_snapshot()
+        self.snapshot_task.start()
+
+    # returns None if the mogi can't be restored, after logging why
+    def restore_mogi(self, state: jr.MogiState):
+        try:
+            return self.build_mogi(state)
+        except Exception as e:
+            print(f"Couldn't restore SQ #{state.sq_id} in channel {state.channel_id}: {e}", flush=True)
+            return None
+
+    def build_mogi(self, state: jr.MogiState):
+        channel = self.bot.get_channel(state.channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            raise ValueError("the channel wasn't found")
+        index = self.bot.guild_index.get(state.guild_id, None)
+        if index is None:
+            raise ValueError(f"guild {state.guild_id} isn't in the config")
+        lb = index.leaderboards.get(state.leaderboard, None)
+        if lb is None:
+            raise ValueError(f"the leaderboard {state.leaderboard} isn't in the config")
+        mogi = Mogi(state.sq_id, state.size, state.room_size, channel, lb, state.is_automated, state.start_time, state.discord_event_id)
+        mogi.started = state.started
+        mogi.gathering = state.gathering
+        mogi.making_rooms_run = state.making_rooms_run
+        for team_state in state.teams:
+            mogi.add_team(jr.restore_team(team_state))
+        for room_state in state.rooms:
+            teams = [mogi.teams[i] for i in room_state.team_indexes]
+            room = Room(teams, room_state.room_num, room_state.thread_id)
+            room.table_id = room_state.table_id
+            room.finished = room.table_id is not None
+            mogi.rooms.append(room)
+        return mogi
+
     #either adds a message to the message queue or sends it, depending on
     #server settings
-    async def queue_or_send(self, ctx: commands.Context, leaderboard: LeaderboardConfig, msg:str, delay=0):
+    async def queue_or_send(self, ctx: commands.Context, leaderboard: LeaderboardConfig, msg:str, delay=0, priority=PRIORITY_NORMAL):
         assert isinstance(ctx.channel, discord.TextChannel)
         if leaderboard.queue_messages:
-            if ctx.channel not in self.msg_queue.keys():
-                self.msg_queue[ctx.channel] = []
-            self.msg_queue[ctx.channel].append(msg)
+            message_scheduler = self.get_shard(ctx.channel.guild.id).message_scheduler
+            message_scheduler.enqueue(ctx.channel, msg, leaderboard.sec_between_queue_msgs, priority)
         else:
             sendmsg = await ctx.send(msg)
             if delay > 0:
                 await sendmsg.delete(delay=delay)
 
-    #goes thru the msg queue for each channel and combines them
-    #into as few messsages as possible, then sends them
-    @tasks.loop(seconds=2)
-    async def send_queued_messages(self):
-        try:
-            for channel in self.msg_queue.keys():
-                channel_queue = self.msg_queue[channel]
-                sentmsgs = []
-                msg = ""
-                for i in range(len(channel_queue)-1, -1, -1):
-                    msg = channel_queue.pop(i) + "\n" + msg
-                    if len(msg) > 1500:
-                        sentmsgs.append(msg)
-                        msg = ""
-                if len(msg) > 0:
-                    sentmsgs.append(msg)
-                for i in range(len(sentmsgs)-1, -1, -1):
-                    await channel.send(sentmsgs[i])
-        except Exception as e:
-            print(e)
+    #sends an announcement about a mogi ahead of any queued join messages
+    async def announce(self, channel: discord.TextChannel, leaderboard: LeaderboardConfig, msg: str):
+        if leaderboard.queue_messages:
+            message_scheduler = self.get_shard(channel.guild.id).message_scheduler
+            message_scheduler.enqueue(channel, msg, leaderboard.sec_between_queue_msgs, PRIORITY_HIGH)
+        else:
+            await channel.send(msg)
 
     def get_mogi(self, ctx: commands.Context):
         assert isinstance(ctx.channel, discord.TextChannel)
-        if ctx.channel in self.ongoing_events:
-            return self.ongoing_events[ctx.channel]
-        return None
+        return self.get_shard(ctx.channel.guild.id).ongoing_events.get(ctx.channel, None)
+
+    # rooms only keep their thread's ID, so the thread is looked up when it's needed.
+    # threads that aren't in the cache can still be sent to
+    def get_room_thread(self, mogi: Mogi, room: Room):
+        thread = mogi.mogi_channel.guild.get_thread(room.thread_id)
+        if thread is None:
+            return self.bot.get_partial_messageable(room.thread_id, guild_id=mogi.mogi_channel.guild.id,
+                                                    type=discord.ChannelType.private_thread)
+        return thread
+
+    def add_room(self, mogi: Mogi, room: Room):
+        mogi.rooms.append(room)
+        self.room_threads[room.thread_id] = (mogi, room)
+        self.record(jr.RoomAdded(mogi.mogi_channel.id, jr.room_state(room, mogi.team_positions)))
+
+    # removes rooms that never got any teams from the mogi, so their threads can be reused by a later mogi
+    def release_unused_rooms(self, mogi: Mogi, rooms: list[Room]):
+        for room in rooms:
+            mogi.rooms.remove(room)
+            self.room_threads.pop(room.thread_id, None)
+        self.thread_planner.release(mogi.mogi_channel.guild.id, mogi.mogi_channel.id, [room.thread_id for room in rooms])
+        if rooms:
+            self.record(jr.RoomsReleased(mogi.mogi_channel.id, [room.thread_id for room in rooms]))
 
     async def is_started(self, ctx: commands.Context, mogi: Mogi):
         if not mogi.started:
@@ -93,10 +300,30 @@ class SquadQueue(commands.Cog):
             return False
         return True
     
-    async def check_members(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
+    def get_lock(self, locks: dict[discord.TextChannel, asyncio.Lock], mogi: Mogi):
+        if mogi.mogi_channel not in locks:
+            locks[mogi.mogi_channel] = asyncio.Lock()
+        return locks[mogi.mogi_channel]
+
+    # queue commands for a mogi run one at a time, while mogis in other channels carry on.
+    # nothing is awaited while it's held, so replies are sent once it's released
+    def mogi_lock(self, mogi: Mogi):
+        return self.get_lock(self.get_shard(mogi.mogi_channel.guild.id).mogi_locks, mogi)
+
+    # room threads are created under their own lock, so joins don't wait while discord creates threads
+    def room_lock(self, mogi: Mogi):
+        return self.get_lock(self.get_shard(mogi.mogi_channel.guild.id).room_locks, mogi)
+
+    def mogi_error(self, mogi: Mogi):
+        if not mogi.started:
+            return "Mogi has not been started yet... type !start"
+        if not mogi.gathering:
+            return "Mogi is closed; players cannot join or drop from the event"
+        return None
+
+    def members_error(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
         if len(members) != len(set(members)):
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, duplicate players are not allowed for a squad, please try again")
-            return None
+            return f"{ctx.author.mention}, duplicate players are not allowed for a squad, please try again"
         for member in members:
             player_team = mogi.check_player(member)
             if player_team is not None:
@@ -105,10 +332,20 @@ class SquadQueue(commands.Cog):
                 msg = f"{p.lounge_name} is already in a squad for this event `("
                 msg += ", ".join([pl.lounge_name for pl in player_team.players])
                 msg += ")` They should type `!d` if this is an error."
-                await self.queue_or_send(ctx, mogi.leaderboard, msg)
-                return None
+                return msg
+        return None
+
+    def squad_size_error(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
+        if mogi.size == 1 and len(members):
+            return f"{ctx.author.display_name} didn't tag the correct number of players for this format (0), please try again"
+        if mogi.size > 1 and (len(members) == 0 or len(members) >= mogi.size):
+            return f"{ctx.author.display_name} didn't tag the correct number of people for this format (1-{mogi.size-1}), please try again"
+        return None
+
+    # called without holding the mogi's lock, since the Lounge API can be slow
+    async def fetch_players(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
         # checking players' mmr
-        players = await get_mmr(mogi.leaderboard, members)
+        players = await get_mmr(self.bot.lounge_client, mogi.leaderboard, members)
         not_found = []
         found_players: list[Player] = []
         for i, player in enumerate(players):
@@ -124,8 +361,61 @@ class SquadQueue(commands.Cog):
             return None
         return found_players
 
+    def confirm_player(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, player_team: Team, members:list[discord.Member]):
+        """Confirms the author for the squad they're in. Returns the reply and whether the squad was registered"""
+        p = player_team.get_player(ctx.author)
+        assert p is not None
+        # if player is in a squad already but tries to make a new one
+        if len(members) > 0:
+            # if everyone the message author has mentioned is also in their current squad,
+            # we should just treat it as if they are doing the !c command with no arguments
+            # (QOL feature)
+            for member in members:
+                if not player_team.get_player(member):
+                    msg = f"{p.lounge_name} is already in a squad for this event `("
+                    msg += ", ".join([pl.lounge_name for pl in player_team.players])
+                    msg += f")`, so you cannot create a new squad. Please type `!d` if this is an error."
+                    return msg, False
+        # if player already said !c, give error msg
+        if p.confirmed:
+            return f"{p.lounge_name} has already confirmed for this event; type `!d` to drop", False
+        mogi.confirm_player(player_team, p)
+        self.record(jr.PlayerConfirmed(mogi.mogi_channel.id, mogi.team_positions[player_team],
+                                       player_team.players.index(p), player_team.confirmed_at))
+        confirm_count = player_team.num_confirmed()
+        msg = f"{p.lounge_name} has confirmed for their squad [{confirm_count}/{mogi.size}]\n"
+        # if squad isn't full
+        if confirm_count != len(player_team.players):
+            msg += "Unconfirmed players: "
+            msg += ", ".join([pl.lounge_name for pl in player_team.get_unconfirmed()])
+            msg += "\n"
+        if len(player_team.players) < mogi.size:
+            msg += f"Squad requires {mogi.size-len(player_team.players)} more players to join the mogi list\n"
+        # if squad is full
+        if confirm_count == mogi.size:
+            msg += f"`Squad successfully added to mogi list [{mogi.count_registered()} teams]`:\n"
+            for i, pl in enumerate(player_team.players):
+                msg += f"`{i+1}.` {pl.mention} {pl.lounge_name} ({pl.mmr} MMR)\n"
+        return msg, True
+
+    def add_squad(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, found_players: list[Player], members:list[discord.Member]):
+        """Adds a new squad for the author. Returns the reply and whether the squad was registered"""
+        # the tagged players may have joined another squad while their MMR was looked up
+        error = self.members_error(ctx, mogi, members)
+        if error is not None:
+            return error, False
+        found_players[0].confirmed = True
+        squad = Team(found_players)
+        mogi.add_team(squad)
+        self.record(jr.TeamAdded(mogi.mogi_channel.id, jr.team_state(squad)))
+        if len(found_players) > 1:
+            msg = f"{found_players[0].lounge_name} has created a squad with "
+            msg += ", ".join([p.lounge_name for p in found_players[1:]])
+            msg += f"; each player must type `!c` to join the queue `[1/{mogi.size}]`\n"
+            return msg, False
+        return f"{found_players[0].lounge_name} has joined the mogi `[{mogi.count_registered()} players]`", True
+
     @commands.command(aliases=['c'])
-    @commands.max_concurrency(number=1, wait=True)
     @commands.guild_only()
     async def can(self, ctx: commands.Context[SquadQueueBot], members:commands.Greedy[discord.Member]):
         """Tag your partners to invite them to a mogi or accept a invitation to join a mogi"""
@@ -137,221 +427,212 @@ class SquadQueue(commands.Cog):
             return
 
         assert isinstance(ctx.author, discord.Member)
-        # logic when player is already in squad
-        player_team = mogi.check_player(ctx.author)
-        if player_team is not None:
-            p = player_team.get_player(ctx.author)
-            assert p is not None
-            # if player is in a squad already but tries to make a new one
-            if len(members) > 0:
-                # if everyone the message author has mentioned is also in their current squad,
-                # we should just treat it as if they are doing the !c command with no arguments
-                # (QOL feature)
-                for member in members:
-                    if not player_team.get_player(member):
-                        msg = f"{p.lounge_name} is already in a squad for this event `("
-                        msg += ", ".join([pl.lounge_name for pl in player_team.players])
-                        msg += f")`, so you cannot create a new squad. Please type `!d` if this is an error."
-                        await self.queue_or_send(ctx, mogi.leaderboard, msg)
-                        return
-            # if player already said !c, give error msg
-            if p.confirmed:
-                await self.queue_or_send(ctx, mogi.leaderboard, f"{p.lounge_name} has already confirmed for this event; type `!d` to drop")
-                return
-            p.confirmed = True
-            confirm_count = player_team.num_confirmed()
-            msg = f"{p.lounge_name} has confirmed for their squad [{confirm_count}/{mogi.size}]\n"
-            # if squad isn't full
-            if confirm_count != len(player_team.players):
-                msg += "Unconfirmed players: "
-                msg += ", ".join([pl.lounge_name for pl in player_team.get_unconfirmed()])
-                msg += "\n"
-            if len(player_team.players) < mogi.size:
-                msg += f"Squad requires {mogi.size-len(player_team.players)} more players to join the mogi list\n"
-            # if squad is full
-            if confirm_count == mogi.size:
-                player_team.confirmed_at = datetime.now(timezone.utc)
-                msg += f"`Squad successfully added to mogi list [{mogi.count_registered()} teams]`:\n"
-                for i, pl in enumerate(player_team.players):
-                    msg += f"`{i+1}.` {pl.member.mention} {pl.lounge_name} ({pl.mmr} MMR)\n"
-            await self.queue_or_send(ctx, mogi.leaderboard, msg)
-            await self.check_room_channels(mogi)
-            await self.check_num_teams(mogi)
-            return
-
-        # logic when player is not already in a squad
-        if mogi.size == 1 and len(members):
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.display_name} didn't tag the correct number of players for this format (0), please try again")
-            return
-        if mogi.size > 1 and (len(members) == 0 or len(members) >= mogi.size):
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.display_name} didn't tag the correct number of people for this format (1-{mogi.size-1}), please try again")
-            return
-        
         member_list = [ctx.author]
         member_list.extend(members)
-        found_players = await self.check_members(ctx, mogi, member_list)
-        if found_players is None:
-            return
-        
-        found_players[0].confirmed = True
-        squad = Team(found_players)
-        mogi.teams.append(squad)
-        if len(found_players) > 1:
-            msg = f"{found_players[0].lounge_name} has created a squad with "
-            msg += ", ".join([p.lounge_name for p in found_players[1:]])
-            msg += f"; each player must type `!c` to join the queue `[1/{mogi.size}]`\n"
-            await self.queue_or_send(ctx, mogi.leaderboard, msg)
-        else:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{found_players[0].lounge_name} has joined the mogi `[{mogi.count_registered()} players]`")
+        # a new squad's MMR is looked up before taking the mogi's lock
+        found_players = None
+        if mogi.check_player(ctx.author) is None:
+            error = self.squad_size_error(ctx, mogi, members) or self.members_error(ctx, mogi, member_list)
+            if error is not None:
+                await self.queue_or_send(ctx, mogi.leaderboard, error)
+                return
+            found_players = await self.fetch_players(ctx, mogi, member_list)
+            if found_players is None:
+                return
+
+        registered = False
+        async with self.mogi_lock(mogi):
+            # the mogi may have ended or closed while the MMR was looked up
+            if self.get_mogi(ctx) is not mogi:
+                return
+            msg = self.mogi_error(mogi)
+            if msg is None:
+                player_team = mogi.check_player(ctx.author)
+                if player_team is not None:
+                    msg, registered = self.confirm_player(ctx, mogi, player_team, members)
+                elif found_players is None:
+                    # their squad was dropped while they were waiting for the lock
+                    msg = f"{ctx.author.display_name} is not currently in a squad for this event; type `!c @partnerNames`"
+                else:
+                    msg, registered = self.add_squad(ctx, mogi, found_players, member_list)
+        await self.queue_or_send(ctx, mogi.leaderboard, msg)
+        if registered:
             await self.check_room_channels(mogi)
             await self.check_num_teams(mogi)
 
     @commands.command(aliases=['d'])
-    @commands.max_concurrency(number=1,wait=True)
     @commands.guild_only()
     async def drop(self, ctx: commands.Context[SquadQueueBot]):
         """Remove your squad from a mogi"""
         mogi = self.get_mogi(ctx)
         if mogi is None:
             return
-        if (not await self.is_started(ctx, mogi)
-                or not await self.is_gathering(ctx, mogi)):
-            return
         assert isinstance(ctx.author, discord.Member)
-        squad = mogi.check_player(ctx.author)
-        if squad is None:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.display_name} is not currently in a squad for this event; type `!c @partnerNames`")
-            return
-        mogi.teams.remove(squad)
-        msg = "Removed team "
-        msg += ", ".join([p.lounge_name for p in squad.players])
-        if len(squad.get_unconfirmed()) == 0:
-            msg += " from mogi list"
-        else:
-            msg += " from unfilled squads"
-        await self.queue_or_send(ctx, mogi.leaderboard, msg, delay=5)
+        delay = 0
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi:
+                return
+            msg = self.mogi_error(mogi)
+            squad = mogi.check_player(ctx.author)
+            if msg is not None:
+                pass
+            elif squad is None:
+                msg = f"{ctx.author.display_name} is not currently in a squad for this event; type `!c @partnerNames`"
+            else:
+                self.record(jr.TeamRemoved(mogi.mogi_channel.id, mogi.team_positions[squad]))
+                mogi.remove_team(squad)
+                msg = "Removed team "
+                msg += ", ".join([p.lounge_name for p in squad.players])
+                if len(squad.get_unconfirmed()) == 0:
+                    msg += " from mogi list"
+                else:
+                    msg += " from unfilled squads"
+                delay = 5
+        await self.queue_or_send(ctx, mogi.leaderboard, msg, delay=delay)
 
-    @commands.command()
-    @commands.max_concurrency(number=1, wait=True)
-    @commands.guild_only()
-    async def sub(self, ctx: commands.Context[SquadQueueBot], sub_out:discord.Member, sub_in:discord.Member):
-        """Replace a player on your team"""
-        mogi = self.get_mogi(ctx)
-        if mogi is None:
-            return
-        if (not await self.is_started(ctx, mogi)
-                or not await self.is_gathering(ctx, mogi)):
-            return
+    def find_sub(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, sub_out:discord.Member, sub_in:discord.Member):
+        """Returns the author's squad and the player being subbed out, or an error message"""
         if mogi.size == 1:
-            await self.queue_or_send(ctx, mogi.leaderboard, "You cannot use the `!sub` command in FFA!")
-            return
+            return "You cannot use the `!sub` command in FFA!"
         assert isinstance(ctx.author, discord.Member)
         squad = mogi.check_player(ctx.author)
         if squad is None:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.display_name} is not currently in a squad for this event; type `!c @partnerNames`")
-            return
+            return f"{ctx.author.display_name} is not currently in a squad for this event; type `!c @partnerNames`"
         if ctx.author.id == sub_out.id:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, you cannot sub yourself out")
-            return
+            return f"{ctx.author.mention}, you cannot sub yourself out"
         sub_out_player = squad.get_player(sub_out)
         if not sub_out_player:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{sub_out.display_name} is not in the squad `{str(squad)}`, so they can't be subbed out")
-            return
-        in_squad = mogi.check_player(sub_in) 
+            return f"{sub_out.display_name} is not in the squad `{str(squad)}`, so they can't be subbed out"
+        in_squad = mogi.check_player(sub_in)
         if in_squad is not None:
             in_squad_player = in_squad.get_player(sub_in)
             assert in_squad_player is not None
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{in_squad_player.lounge_name} is already in a squad for this event `{str(in_squad)}`, they should type `!d` if this is an error.")
-            return
-        sub_in_player = await get_mmr(mogi.leaderboard, [sub_in])
-        if sub_in_player[0] is None:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"MMR for player {sub_in.display_name} could not be found! Please contact a staff member for help")
-            return
-        squad.sub_player(sub_out_player, sub_in_player[0])
-        squad.confirmed_at = None # subbed in player always needs to confirm, so make sure the confirmed date is set to None
-        await self.queue_or_send(ctx, mogi.leaderboard, f"{sub_out_player.lounge_name} has been replaced with {sub_in_player[0].lounge_name} in the squad `{str(squad)}`; they must type `!c` to confirm")
+            return f"{in_squad_player.lounge_name} is already in a squad for this event `{str(in_squad)}`, they should type `!d` if this is an error."
+        return squad, sub_out_player
 
-    @commands.command(name="addplayer", aliases=['ap'])
-    @commands.max_concurrency(number=1, wait=True)
+    @commands.command()
     @commands.guild_only()
-    async def add_player_to_squad(self, ctx: commands.Context[SquadQueueBot], members:commands.Greedy[discord.Member]):
-        """Tag players to invite them to your squad for a mogi"""
+    async def sub(self, ctx: commands.Context[SquadQueueBot], sub_out:discord.Member, sub_in:discord.Member):
+        """Replace a player on your team"""
         mogi = self.get_mogi(ctx)
         if mogi is None:
             return
         if (not await self.is_started(ctx, mogi)
                 or not await self.is_gathering(ctx, mogi)):
             return
+        found = self.find_sub(ctx, mogi, sub_out, sub_in)
+        if isinstance(found, str):
+            await self.queue_or_send(ctx, mogi.leaderboard, found)
+            return
+        sub_in_player = await get_mmr(self.bot.lounge_client, mogi.leaderboard, [sub_in])
+        if sub_in_player[0] is None:
+            await self.queue_or_send(ctx, mogi.leaderboard, f"MMR for player {sub_in.display_name} could not be found! Please contact a staff member for help")
+            return
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi:
+                return
+            # the squad may have changed while the sub's MMR was looked up
+            found = self.mogi_error(mogi) or self.find_sub(ctx, mogi, sub_out, sub_in)
+            if isinstance(found, str):
+                msg = found
+            else:
+                squad, sub_out_player = found
+                self.record(jr.PlayerSubbed(mogi.mogi_channel.id, mogi.team_positions[squad], squad.players.index(sub_out_player),
+                                            jr.player_state(sub_in_player[0])))
+                squad.sub_player(sub_out_player, sub_in_player[0])
+                squad.confirmed_at = None # subbed in player always needs to confirm, so make sure the confirmed date is set to None
+                msg = f"{sub_out_player.lounge_name} has been replaced with {sub_in_player[0].lounge_name} in the squad `{str(squad)}`; they must type `!c` to confirm"
+        await self.queue_or_send(ctx, mogi.leaderboard, msg)
 
+    def find_squad_to_add(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
+        """Returns the author's squad if the players can be added to it, or an error message"""
         assert isinstance(ctx.author, discord.Member)
         # logic when player is already in squad
         player_team = mogi.check_player(ctx.author)
         if player_team is None:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention} is not currently in a squad for this event; type `!c @partnerNames`")
-            return
+            return f"{ctx.author.mention} is not currently in a squad for this event; type `!c @partnerNames`"
         if mogi.size == 1:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, this command cannot be used in FFA")
-            return
+            return f"{ctx.author.mention}, this command cannot be used in FFA"
         if len(player_team.players) == mogi.size:
-            await self.queue_or_send(ctx, mogi.leaderboard, 
-                                     f"{ctx.author.mention}'s squad already has the maximum number of players for this format ({mogi.size})")
-            return 
+            return f"{ctx.author.mention}'s squad already has the maximum number of players for this format ({mogi.size})"
         if len(player_team.players) + len(members) > mogi.size:
-            await self.queue_or_send(ctx, mogi.leaderboard, 
-                                     f"{ctx.author.mention}, your squad currently has {len(player_team.players)} players and this event is {mogi.size}v{mogi.size}, so you can only add {mogi.size-len(player_team.players)} more players.")
-            return
-        
-        found_players = await self.check_members(ctx, mogi, members)
-        if found_players is None:
-            return
-        player_team.add_players(found_players)
-        found_player_str = ", ".join([p.lounge_name for p in found_players])
-        existing_player_str = ", ".join([p.lounge_name for p in player_team.players])
-        num_confirmed = player_team.num_confirmed()
-        await self.queue_or_send(ctx, mogi.leaderboard, 
-                                 f"The players {found_player_str} have been added to the squad {existing_player_str}; each player must type `!c` to join the queue `[{num_confirmed}/{mogi.size}]`\n")
+            return f"{ctx.author.mention}, your squad currently has {len(player_team.players)} players and this event is {mogi.size}v{mogi.size}, so you can only add {mogi.size-len(player_team.players)} more players."
+        return self.members_error(ctx, mogi, members) or player_team
 
-    @commands.command(name="removeplayer", aliases=['rp'])
-    @commands.max_concurrency(number=1, wait=True)
+    @commands.command(name="addplayer", aliases=['ap'])
     @commands.guild_only()
-    async def remove_player_from_squad(self, ctx: commands.Context[SquadQueueBot], members:commands.Greedy[discord.Member]):
-        """Tag players to remove them from your squad for a mogi"""
+    async def add_player_to_squad(self, ctx: commands.Context[SquadQueueBot], members:commands.Greedy[discord.Member]):
+        """Tag players to invite them to your squad for a mogi"""
         mogi = self.get_mogi(ctx)
         if mogi is None:
             return
         if (not await self.is_started(ctx, mogi)
                 or not await self.is_gathering(ctx, mogi)):
             return
+        found = self.find_squad_to_add(ctx, mogi, members)
+        if isinstance(found, str):
+            await self.queue_or_send(ctx, mogi.leaderboard, found)
+            return
+        found_players = await self.fetch_players(ctx, mogi, members)
+        if found_players is None:
+            return
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi:
+                return
+            # the squad may have changed while the players' MMR was looked up
+            found = self.mogi_error(mogi) or self.find_squad_to_add(ctx, mogi, members)
+            if isinstance(found, str):
+                msg = found
+            else:
+                player_team = found
+                player_team.add_players(found_players)
+                self.record(jr.PlayersAdded(mogi.mogi_channel.id, mogi.team_positions[player_team], [jr.player_state(p) for p in found_players]))
+                found_player_str = ", ".join([p.lounge_name for p in found_players])
+                existing_player_str = ", ".join([p.lounge_name for p in player_team.players])
+                num_confirmed = player_team.num_confirmed()
+                msg = f"The players {found_player_str} have been added to the squad {existing_player_str}; each player must type `!c` to join the queue `[{num_confirmed}/{mogi.size}]`\n"
+        await self.queue_or_send(ctx, mogi.leaderboard, msg)
 
+    def remove_players(self, ctx: commands.Context[SquadQueueBot], mogi: Mogi, members:list[discord.Member]):
+        """Removes the tagged players from the author's squad and returns the reply"""
         assert isinstance(ctx.author, discord.Member)
         # logic when player is already in squad
         player_team = mogi.check_player(ctx.author)
         if player_team is None:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention} is not currently in a squad for this event; type `!c @partnerNames`\n")
-            return
+            return f"{ctx.author.mention} is not currently in a squad for this event; type `!c @partnerNames`\n"
         if len(player_team.players) < 3:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, your squad must have at least 3 players to use this command\n")
-            return
+            return f"{ctx.author.mention}, your squad must have at least 3 players to use this command\n"
         if len(set(members)) != len(members):
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, you cannot ping the same player more than once for this command; try again\n")
-            return None
+            return f"{ctx.author.mention}, you cannot ping the same player more than once for this command; try again\n"
         remove_player_list: list[Player] = []
         for member in members:
             if member == ctx.author:
-                await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, you cannot remove yourself from a squad; use `!d` to drop your entire squad\n")
-                return
+                return f"{ctx.author.mention}, you cannot remove yourself from a squad; use `!d` to drop your entire squad\n"
             p = player_team.get_player(member)
             if not p:
-                await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention}, {member.display_name} is not in your squad for this event; please try again\n")
-                return
+                return f"{ctx.author.mention}, {member.display_name} is not in your squad for this event; please try again\n"
             remove_player_list.append(p)
+        self.record(jr.PlayersRemoved(mogi.mogi_channel.id, mogi.team_positions[player_team],
+                                      [player_team.players.index(p) for p in remove_player_list]))
         player_team.remove_players(remove_player_list)
         player_str = ", ".join([p.lounge_name for p in remove_player_list])
         remaining_str = ", ".join([p.lounge_name for p in player_team.players])
-        await self.queue_or_send(ctx, mogi.leaderboard, f"The players {player_str} have been removed from the squad {remaining_str}; squad now needs {mogi.size-len(player_team.players)} more players to join the mogi list\n")
-    
+        return f"The players {player_str} have been removed from the squad {remaining_str}; squad now needs {mogi.size-len(player_team.players)} more players to join the mogi list\n"
+
+    @commands.command(name="removeplayer", aliases=['rp'])
+    @commands.guild_only()
+    async def remove_player_from_squad(self, ctx: commands.Context[SquadQueueBot], members:commands.Greedy[discord.Member]):
+        """Tag players to remove them from your squad for a mogi"""
+        mogi = self.get_mogi(ctx)
+        if mogi is None:
+            return
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi:
+                return
+            msg = self.mogi_error(mogi) or self.remove_players(ctx, mogi, members)
+        await self.queue_or_send(ctx, mogi.leaderboard, msg)
+
     @commands.command(name="removesquad", aliases=['rs'])
-    @commands.max_concurrency(number=1,wait=True)
     @commands.guild_only()
     async def remove_squad_with_member(self, ctx: commands.Context, member: discord.Member):
         """Removes the mentioned player's squad from the mogi list"""
@@ -360,15 +641,21 @@ class SquadQueue(commands.Cog):
         mogi = self.get_mogi(ctx)
         if mogi is None:
             return
-        if (not await self.is_started(ctx, mogi)
-                or not await self.is_gathering(ctx, mogi)):
-            return
-        squad = mogi.check_player(member)
-        if not squad:
-            await self.queue_or_send(ctx, mogi.leaderboard, f"{ctx.author.mention} this member could not be found in the mogi")
-            return
-        mogi.teams.remove(squad)
-        await self.queue_or_send(ctx, mogi.leaderboard, f"Removed squad {str(squad)} from mogi list")
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi:
+                return
+            msg = self.mogi_error(mogi)
+            squad = mogi.check_player(member)
+            if msg is not None:
+                pass
+            elif not squad:
+                msg = f"{ctx.author.mention} this member could not be found in the mogi"
+            else:
+                self.record(jr.TeamRemoved(mogi.mogi_channel.id, mogi.team_positions[squad]))
+                mogi.remove_team(squad)
+                msg = f"Removed squad {str(squad)} from mogi list"
+        await self.queue_or_send(ctx, mogi.leaderboard, msg)
+
 
     @commands.command()
     @commands.cooldown(1, 30, commands.BucketType.member)
@@ -400,37 +687,89 @@ class SquadQueue(commands.Cog):
                 msg += "`✘ Unconfirmed`\n"
         await self.queue_or_send(ctx, mogi.leaderboard, msg, delay=30)
 
+    # the list is only rendered again once the mogi's version changes
     def get_list_messages(self, mogi: Mogi):
+        cached = self.list_cache.get(mogi, None)
+        if cached is not None and cached[0] == mogi.version:
+            return cached[1]
+        messages = self.render_list_messages(mogi)
+        self.list_cache[mogi] = (mogi.version, messages)
+        return messages
+
+    def render_list_messages(self, mogi: Mogi):
         mogi_list = mogi.confirmed_list()
-        sorted_mogi_list = sorted(mogi_list, reverse=True)
+        sorted_mogi_list = mogi.mmr_list()
         late_team_index = (len(mogi_list) // mogi.room_size) * mogi.room_size # index of first late team, if any
-        late_teams = mogi_list[late_team_index:]
-        msg = f""
-        for i, team in enumerate(sorted_mogi_list):
-            msg += f"`{i+1}.` "
-            msg += ", ".join([p.lounge_name for p in team.players])
-            late_str = " `*`" if team in late_teams else ""
-            msg += f" ({team.avg_mmr:.1f} MMR) {late_str}\n"
-        players_per_mogi = mogi.room_size
-        if(len(sorted_mogi_list) % (players_per_mogi/mogi.size) != 0):
-            num_next = int(len(sorted_mogi_list) % (players_per_mogi/mogi.size))
-            teams_per_room = int(players_per_mogi/mogi.size)
-            num_rooms = int(len(sorted_mogi_list) / (players_per_mogi/mogi.size))+1
-            msg += f"`[{num_next}/{teams_per_room}] teams for {num_rooms} rooms`"
-        lines = msg.split("\n")
+        late_teams = set(mogi_list[late_team_index:])
+        lines = [f"`{i+1}.` {team.list_line()} {' `*`' if team in late_teams else ''}"
+                 for i, team in enumerate(sorted_mogi_list)]
+        teams_per_room = mogi.room_size // mogi.size
+        num_next = len(sorted_mogi_list) % teams_per_room
+        if num_next != 0:
+            num_rooms = len(sorted_mogi_list) // teams_per_room + 1
+            lines.append(f"`[{num_next}/{teams_per_room}] teams for {num_rooms} rooms`")
+        else:
+            lines.append("")
+        # pages are built in one pass, keeping each page's length instead of measuring the joined text
         messages = []
-        curr_msg = f"`SQ #{mogi.sq_id} Mogi List`\n"
+        curr_msg = [f"`SQ #{mogi.sq_id} Mogi List`\n"]
+        curr_len = len(curr_msg[0])
         for i, line in enumerate(lines):
-            if len(curr_msg + line + "\n\n") > 2000:
-                messages.append(curr_msg)
-                curr_msg = ""
-            curr_msg += f"{line}\n"
-            if (i+1) % (players_per_mogi/mogi.size) == 0:
-                curr_msg += "\n"
-        if len(curr_msg) > 0:
-            messages.append(curr_msg)
+            if curr_len + len(line) + 2 > 2000:
+                messages.append("".join(curr_msg))
+                curr_msg = []
+                curr_len = 0
+            curr_msg.append(f"{line}\n")
+            curr_len += len(line) + 1
+            if (i+1) % teams_per_room == 0:
+                curr_msg.append("\n")
+                curr_len += 1
+        if curr_len > 0:
+            messages.append("".join(curr_msg))
         return messages
 
+    # only edits the list messages whose content changed; pages are only ever added or removed at the end
+    async def update_list_messages(self, channel: discord.TextChannel, new_messages: list[str]):
+        await self.delete_list_messages(channel, len(new_messages))
+        list_messages = self.get_shard(channel.guild.id).list_messages[channel]
+        for i, content in enumerate(new_messages):
+            if i >= len(list_messages):
+                try:
+                    new_message = await channel.send(content)
+                except Exception as e:
+                    print(e, flush=True)
+                    metrics.list_messages.inc("failed")
+                    return
+                metrics.list_messages.inc("sent")
+                list_messages.append((new_message, content))
+                continue
+            old_message, old_content = list_messages[i]
+            if old_content == content:
+                metrics.list_messages.inc("unchanged")
+                continue
+            try:
+                await self.edit_list_message(old_message, content)
+                metrics.list_messages.inc("edited")
+                list_messages[i] = (old_message, content)
+            except discord.NotFound:
+                # someone deleted this page, so repost it and every page after it to keep them in order
+                await self.delete_list_messages(channel, i)
+                await self.update_list_messages(channel, new_messages)
+                return
+            except Exception as e:
+                print(e, flush=True)
+                metrics.list_messages.inc("failed")
+                # leave the rest of the list alone; this page gets retried on the next update
+                list_messages[i] = (old_message, None)
+
+    async def edit_list_message(self, message: discord.Message, content: str):
+        try:
+            await message.edit(content=content)
+        except discord.NotFound:
+            raise
+        except discord.HTTPException:
+            await message.edit(content=content)
+
     @commands.command(aliases=['l'])
     @commands.cooldown(1, 60)
     @commands.guild_only()
@@ -454,9 +793,16 @@ class SquadQueue(commands.Cog):
     
     @tasks.loop(seconds=60)
     async def list_task(self):
-        if len(self.ongoing_events) == 0:
+        shards = [shard for shard in self.shards.values() if len(shard.ongoing_events) > 0]
+        if len(shards) == 0:
             return
-        for mogi in self.ongoing_events.values():
+        start = time.perf_counter()
+        # the shards' lists are updated concurrently
+        await asyncio.gather(*[self.update_shard_lists(shard) for shard in shards])
+        metrics.list_task_seconds.observe(time.perf_counter() - start)
+
+    async def update_shard_lists(self, shard: ShardState):
+        for mogi in list(shard.ongoing_events.values()):
             list_channel_id = mogi.leaderboard.list_channel
             list_channel = self.bot.get_channel(list_channel_id)
             if not list_channel:
@@ -467,40 +813,35 @@ class SquadQueue(commands.Cog):
                 continue
 
             new_messages = self.get_list_messages(mogi)
-            await self.delete_list_messages(list_channel, len(new_messages))
+            await self.update_list_messages(list_channel, new_messages)
 
-            list_messages = self.list_messages[list_channel]
-            try:
-                for i, message in enumerate(new_messages):
-                    if i < len(list_messages):
-                        old_message = list_messages[i]
-                        await old_message.edit(content=message)
-                    else:
-                        new_message = await list_channel.send(message)
-                        list_messages.append(new_message)
-            except Exception as e:
-               print(e, flush=True)
-               await self.delete_list_messages(list_channel, 0)
-            
     async def delete_list_messages(self, channel: discord.TextChannel, new_list_size: int):
         try:
             messages_to_delete = []
-            if channel not in self.list_messages.keys():
-                self.list_messages[channel] = []
-            list_messages = self.list_messages[channel]
+            shard_list_messages = self.get_shard(channel.guild.id).list_messages
+            if channel not in shard_list_messages.keys():
+                shard_list_messages[channel] = []
+            list_messages = shard_list_messages[channel]
             while len(list_messages) > new_list_size:
-                messages_to_delete.append(list_messages.pop())
+                messages_to_delete.append(list_messages.pop()[0])
+            if messages_to_delete:
+                metrics.list_messages.inc("deleted", amount=len(messages_to_delete))
             await channel.delete_messages(messages_to_delete)
         except Exception as e:
             print(e, flush=True)
         
     #check if user has roles defined in config.json
-    async def has_roles(self, ctx: commands.Context):
-        assert isinstance(ctx.author, discord.Member)
-        server_config = get_server_config(ctx)
-        check_roles = server_config.admin_roles + server_config.staff_roles
-        for role_id in check_roles:
-            if ctx.author.get_role(role_id):
+    async def has_roles(self, ctx: commands.Context[SquadQueueBot]):
+        assert ctx.guild is not None
+        author = ctx.author
+        # commands normally come with the author's roles, but the author is only a User
+        # when discord didn't send their member data
+        if not isinstance(author, discord.Member):
+            author = await self.bot.member_resolver.resolve_one(ctx.guild, author.id)
+            if author is None:
+                return False
+        for role_id in get_guild_index(ctx).role_ids:
+            if author.get_role(role_id):
                 return True
         return False
         
@@ -518,14 +859,24 @@ class SquadQueue(commands.Cog):
             return
         mogi.gathering = False
         mogi.is_automated = False
+        self.record_status(mogi)
+        self.cancel_mogi_deadlines(mogi)
         assert isinstance(ctx.channel, discord.TextChannel)
         await self.lockdown(ctx.channel)
         await ctx.send("Mogi is now closed; players can no longer join or drop from the event")
 
     async def endMogi(self, mogi_channel):
-        mogi = self.ongoing_events[mogi_channel]
+        ongoing_events = self.get_shard(mogi_channel.guild.id).ongoing_events
+        mogi = ongoing_events[mogi_channel]
         if mogi:
-            del self.ongoing_events[mogi_channel]
+            self.release_unused_rooms(mogi, [room for room in mogi.rooms if len(room.teams) == 0])
+            for room in mogi.rooms:
+                self.room_threads.pop(room.thread_id, None)
+            del ongoing_events[mogi_channel]
+            self.list_cache.pop(mogi, None)
+            self.cancel_mogi_deadlines(mogi)
+            self.prefetcher.remember(mogi.leaderboard, [p.member_id for team in mogi.teams for p in team.players])
+            self.record(jr.MogiEnded(mogi_channel.id))
 
     @commands.command()
     @commands.guild_only()
@@ -555,6 +906,8 @@ class SquadQueue(commands.Cog):
             return
         mogi.gathering = True
         mogi.is_automated = False
+        self.record_status(mogi)
+        self.cancel_mogi_deadlines(mogi)
         assert isinstance(ctx.channel, discord.TextChannel)
         await self.unlockdown(ctx.channel)
         await ctx.send("Mogi is now open; players can join and drop from the event")
@@ -567,12 +920,7 @@ class SquadQueue(commands.Cog):
     async def staff(self, ctx: commands.Context):
         """Calls staff to the current channel. Only works in thread channels for SQ rooms."""
         assert ctx.guild is not None
-        mogi = None
-        for m in self.ongoing_events.values():
-            if m.is_room_thread(ctx.channel.id):
-                mogi = m
-                break
-        if mogi is None:
+        if ctx.channel.id not in self.room_threads:
             return
         server_config = get_server_config(ctx)
         lounge_staff_roles = server_config.staff_roles
@@ -582,13 +930,10 @@ class SquadQueue(commands.Cog):
     @commands.command()
     async def scoreboard(self, ctx: commands.Context):
         """Displays the scoreboard of the room. Only works in thread channels for SQ rooms."""
-        room = None
-        for mogi in self.ongoing_events.values():
-            if mogi.is_room_thread(ctx.channel.id):
-                room = mogi.get_room_from_thread(ctx.channel.id)
-                break
-        if not room:
+        room_info = self.room_threads.get(ctx.channel.id, None)
+        if room_info is None:
             return
+        mogi, room = room_info
         msg = f"`!submit {mogi.size} sq #RESULTS\n"
         for i, team in enumerate(room.teams):
             msg += f"Team {i+1} - {chr(ord('A')+i)}\n"
@@ -598,28 +943,101 @@ class SquadQueue(commands.Cog):
         msg += f"`Fill out the scores for each player and then use the `!submit` command to submit the table."
         await ctx.send(msg)
 
+    @commands.command()
+    @commands.guild_only()
+    async def submit_results(self, ctx: commands.Context, dry_run=""):
+        """Submits the scores of every room to the Lounge website. Use !submit_results dry to only check them"""
+        if not await self.has_roles(ctx):
+            return
+        mogi = self.get_mogi(ctx)
+        if mogi is None:
+            return
+        if not mogi.making_rooms_run:
+            await ctx.send("The rooms for this mogi haven't been made yet.")
+            return
+        lb = mogi.leaderboard
+        rooms = [room for room in mogi.rooms if room.teams and room.table_id is None]
+        if not rooms:
+            await ctx.send("Every room's results have already been submitted.")
+            return
+        errors = {room: error for room in rooms if (error := room_error(lb, room)) is not None}
+        tables = [(room, build_table(mogi, room)) for room in rooms if room not in errors]
+        error_lines = [f"Room {room.room_num}: {error}" for room, error in errors.items()]
+        if dry_run == "dry":
+            lines = [f"{len(tables)}/{len(rooms)} rooms are ready to submit."]
+            for room, table in tables:
+                lines.append(f"Room {room.room_num}:\n{table_str(table)}")
+            lines.extend(error_lines)
+            for part in discord.utils.as_chunks(lines, 10):
+                await ctx.send("\n".join(part)[:2000])
+            return
+        start = time.perf_counter()
+        submitted = 0
+        # the room lock keeps two submissions of the same mogi from creating a room's table twice
+        async with self.room_lock(mogi):
+            # another submission may have finished while this one was waiting
+            tables = [(room, table) for room, table in tables if room.table_id is None]
+            # the rooms are submitted at the same time; the lounge client limits how many requests are in flight
+            results = await asyncio.gather(*[self.bot.lounge_client.submit_table(lb, table) for _, table in tables],
+                                           return_exceptions=True)
+            for (room, _), result in zip(tables, results):
+                if isinstance(result, BaseException):
+                    error_lines.append(f"Room {room.room_num}: {result}")
+                    continue
+                room.table_id = result
+                room.finished = True
+                self.record(jr.RoomSubmitted(mogi.mogi_channel.id, room.thread_id, result))
+                submitted += 1
+        msg = f"Submitted {submitted}/{len(rooms)} rooms in {time.perf_counter() - start:.1f}s."
+        if error_lines:
+            msg += " These rooms weren't submitted:\n" + "\n".join(error_lines)
+        await ctx.send(msg[:2000])
+
     # make thread channels while the event is gathering instead of at the end,
     # since discord only allows 50 thread channels to be created per 5 minutes.
     async def check_room_channels(self, mogi: Mogi):
-        num_teams = mogi.count_registered()
-        players_per_mogi = mogi.room_size
-        num_rooms = int(num_teams / (players_per_mogi/mogi.size))
+        async with self.room_lock(mogi):
+            # a join that was waiting for the lock can get here after the rooms were made
+            if mogi.making_rooms_run:
+                return
+            await self.create_room_channels(mogi)
+
+    async def create_room_channels(self, mogi: Mogi):
+        ongoing_events = self.get_shard(mogi.mogi_channel.guild.id).ongoing_events
+        guild_mogis = [m for m in ongoing_events.values() if m.mogi_channel.guild == mogi.mogi_channel.guild]
+        num_new_rooms = self.thread_planner.rooms_to_create(mogi, guild_mogis)
         num_created_rooms = len(mogi.rooms)
-        if num_created_rooms >= num_rooms:
-            return
-        for i in range(num_created_rooms, num_rooms):
+        for i in range(num_created_rooms, num_created_rooms + num_new_rooms):
             room_name = f"SQ{mogi.sq_id} Room {i+1}"
             try: 
-                room_channel = await mogi.mogi_channel.create_thread(name=room_name,
-                                                                    auto_archive_duration=60,
-                                                                    invitable=False)
+                room_channel = await self.create_room_thread(mogi, room_name)
                 await room_channel.send(room_name)
             except Exception as e:
                 print(e)
                 err_msg = f"\nAn error has occurred while creating a room channel:\n{e}"
                 await mogi.mogi_channel.send(err_msg)
                 return
-            mogi.rooms.append(Room([], i+1, room_channel))
+            self.add_room(mogi, Room([], i+1, room_channel.id))
+
+    # renaming a thread doesn't count towards the thread creation limit, so unused room
+    # threads from earlier mogis in the channel are reused before creating a new one
+    async def create_room_thread(self, mogi: Mogi, room_name: str):
+        guild = mogi.mogi_channel.guild
+        spare_id = self.thread_planner.take_spare(mogi.mogi_channel)
+        while spare_id is not None:
+            try:
+                # spare threads are usually archived by now, so they're fetched if they aren't cached
+                spare_thread = guild.get_thread(spare_id) or await guild.fetch_channel(spare_id)
+                if isinstance(spare_thread, discord.Thread):
+                    return await spare_thread.edit(name=room_name, archived=False)
+            except discord.HTTPException as e:
+                print(e)
+            spare_id = self.thread_planner.take_spare(mogi.mogi_channel)
+        room_channel = await mogi.mogi_channel.create_thread(name=room_name,
+                                                            auto_archive_duration=60,
+                                                            invitable=False)
+        self.thread_planner.record_creation(mogi.mogi_channel.guild.id)
+        return room_channel
     
     # add teams to the room threads that we have already created
     async def add_teams_to_rooms(self, mogi: Mogi, open_time:int, started_automatically=False):
@@ -635,8 +1053,10 @@ class SquadQueue(commands.Cog):
             return
         await self.lockdown(mogi.mogi_channel)
         mogi.making_rooms_run = True
-        if mogi.gathering:
-            mogi.gathering = False
+        was_gathering = mogi.gathering
+        mogi.gathering = False
+        self.record_status(mogi)
+        if was_gathering:
             await mogi.mogi_channel.send("Mogi is now closed; players can no longer join or drop from the event")
         
         pen_time = open_time + 6
@@ -648,15 +1068,25 @@ class SquadQueue(commands.Cog):
         players_per_mogi = mogi.room_size
         teams_per_room = int(players_per_mogi/mogi.size)
         num_teams = int(num_rooms * teams_per_room)
-        final_list = mogi.confirmed_list()[0:num_teams]
-        sorted_list = sorted(final_list, reverse=True)
+        # everyone's MMR changes once this mogi is played, so the next queue shouldn't reuse the cached values
+        self.bot.lounge_client.invalidate(mogi.leaderboard, [p.member_id for team in mogi.teams for p in team.players])
+        registered_teams = mogi.confirmed_list()
+        # the optimized engines take up to a couple hundred milliseconds with thousands of teams,
+        # so they run in a thread instead of holding up the gateway heartbeats of every shard
+        room_indexes = await asyncio.get_running_loop().run_in_executor(
+            None, assign_rooms, mogi.leaderboard.room_assignment, [t.avg_mmr for t in registered_teams],
+            teams_per_room, num_rooms, mogi.leaderboard.late_penalty)
+        sorted_list = [registered_teams[i] for room in room_indexes for i in room]
 
-        extra_members = []
-        for m in mogi.leaderboard.pinged_member_ids:
-            extra_members.append(mogi.mogi_channel.guild.get_member(m))
+        # looked up together, since they might not be cached when guilds aren't chunked at startup
+        extra_members = await self.bot.member_resolver.resolve(mogi.mogi_channel.guild, mogi.leaderboard.pinged_member_ids)
 
-        rooms = mogi.rooms
-        for i in range(num_rooms):
+        existing_rooms = list(mogi.rooms)
+        extra_mentions = " ".join([m.mention for m in extra_members if m is not None])
+        # threads are separate rate limit buckets, so rooms can be announced at the same time;
+        # the semaphore keeps a big queue from bursting past the global rate limit
+        room_semaphore = asyncio.Semaphore(ROOM_ANNOUNCE_CONCURRENCY)
+        async def announce_room(i: int):
             room_name = f"SQ{mogi.sq_id} Room {i+1}"
             msg = f"`Room {i+1}`\n"
             scoreboard = f"Table: `!scoreboard`"
@@ -667,56 +1097,81 @@ class SquadQueue(commands.Cog):
                 team = sorted_list[start_index+j]
                 msg += ", ".join([p.lounge_name for p in team.players])
                 msg += f" ({int(team.avg_mmr)} MMR)\n"
-                mentions += " ".join([p.member.mention for p in team.players])
+                mentions += " ".join([p.mention for p in team.players])
                 mentions += " "
             room_msg = msg
-            mentions += " ".join([m.mention for m in extra_members if m is not None])
+            mentions += extra_mentions
             room_msg += f"{scoreboard}\n"
             room_msg += ("\nDecide a host amongst yourselves; room open at :%02d, penalty at :%02d, start by :%02d. Good luck!\n\n"
                         % (open_time, pen_time, start_time))
             room_msg += "\nIf you need staff's assistance, use the `!staff` command in this channel.\n"
             room_msg += mentions
+            curr_room = None
             try:
-                if i >= len(rooms):
-                    room_channel = await mogi.mogi_channel.create_thread(name=room_name,
-                                                                    auto_archive_duration=60,
-                                                                    invitable=False)
-                    rooms.append(Room([], i+1, room_channel))
-                curr_room = rooms[i]
-                room_channel = curr_room.thread
-                curr_room.teams = sorted_list[start_index:start_index+teams_per_room]
-                await room_channel.send(room_msg)
+                async with room_semaphore:
+                    if i < len(existing_rooms):
+                        curr_room = existing_rooms[i]
+                        room_thread = self.get_room_thread(mogi, curr_room)
+                    else:
+                        room_thread = await self.create_room_thread(mogi, room_name)
+                        curr_room = Room([], i+1, room_thread.id)
+                    curr_room.teams = sorted_list[start_index:start_index+teams_per_room]
+                    await room_thread.send(room_msg)
             except Exception as e:
                 print(e)
                 err_msg = f"\nAn error has occurred while creating the room channel; please contact your opponents in DM or another channel\n"
                 err_msg += mentions
                 msg += err_msg
-                room_channel = None
+            return msg, curr_room
+
+        results = await asyncio.gather(*[announce_room(i) for i in range(num_rooms)])
+        # rooms created for teams that dropped or never registered
+        self.release_unused_rooms(mogi, existing_rooms[num_rooms:])
+        rooms: list[Room] = []
+        for i, (msg, room) in enumerate(results):
+            if room is not None:
+                rooms.append(room)
+                if i >= len(existing_rooms):
+                    self.add_room(mogi, room)
+            # sent straight away rather than through the message scheduler, so the rooms aren't held
+            # back by queue_messages or packed together with join messages
             await mogi.mogi_channel.send(msg)
+        self.record(jr.RoomsMade(mogi.mogi_channel.id, [jr.room_state(room, mogi.team_positions) for room in mogi.rooms]))
         if num_teams < mogi.count_registered():
-            missed_teams = mogi.confirmed_list()[num_teams:mogi.count_registered()]
-            msg = "`Late teams:`\n"
-            for i in range(len(missed_teams)):
-                msg += f"`{i+1}.` "
-                msg += ", ".join([p.lounge_name for p in missed_teams[i].players])
-                msg += f" ({int(missed_teams[i].avg_mmr)} MMR)\n"
+            placed_teams = set(sorted_list)
+            # the first num_teams teams to confirm were on time, but the optimized room assignments
+            # can still leave some of them out to keep the rooms' MMR close together
+            left_out = [team for team in registered_teams[:num_teams] if team not in placed_teams]
+            missed_teams = [team for team in registered_teams[num_teams:] if team not in placed_teams]
+            msg = ""
+            if left_out:
+                msg += "`Teams left out to balance the rooms:`\n"
+                for i, team in enumerate(left_out):
+                    msg += f"`{i+1}.` {', '.join([p.lounge_name for p in team.players])} ({int(team.avg_mmr)} MMR)\n"
+            if missed_teams:
+                msg += "`Late teams:`\n"
+                for i, team in enumerate(missed_teams):
+                    msg += f"`{i+1}.` {', '.join([p.lounge_name for p in team.players])} ({int(team.avg_mmr)} MMR)\n"
             await mogi.mogi_channel.send(msg)
-        mogi_guild = mogi.mogi_channel.guild
         list_channel_id = mogi.leaderboard.list_channel
         list_channel = self.bot.get_channel(list_channel_id)
         if not list_channel:
             return
         assert isinstance(list_channel, discord.TextChannel)
-        for i in range(num_rooms):
-            room = rooms[i]
-            msg = f"`SQ #{mogi.sq_id} Room {i+1} -` {room.thread.jump_url}\n"
+        for room in rooms:
+            msg = f"`SQ #{mogi.sq_id} Room {room.room_num} -` {self.get_room_thread(mogi, room).jump_url}\n"
             for i, team in enumerate(room.teams):
                 msg += f"`{i+1}.` {', '.join([p.lounge_name for p in team.players])} ({int(team.avg_mmr)} MMR)\n"
             await list_channel.send(msg)
 
+    # the teams can't change while they're being put in rooms
+    async def make_rooms(self, mogi: Mogi, open_time: int, started_automatically=False):
+        async with self.mogi_lock(mogi), self.room_lock(mogi):
+            await self.add_teams_to_rooms(mogi, open_time, started_automatically)
+
     @commands.command()
     @commands.guild_only()
-    @commands.max_concurrency(number=1, wait=False)
+    @commands.max_concurrency(number=1, per=commands.BucketType.channel, wait=False)
     async def makeRooms(self, ctx, openTime:int):
         """Makes thread channels for SQ rooms."""
         if not await self.has_roles(ctx):
@@ -726,90 +1181,116 @@ class SquadQueue(commands.Cog):
             return
         if (not await self.is_started(ctx, mogi)):
             return
-        await self.add_teams_to_rooms(mogi, openTime)
+        await self.make_rooms(mogi, openTime)
         
-    async def scheduler_mogi_start(self):
-        cur_time = datetime.now()
-        for guild in self.scheduled_events.values():
-            to_remove = [] #Keep a list of indexes to remove - can't remove while iterating
-            for i, mogi in enumerate(guild):
-                ts = mogi.leaderboard.time_settings
-                assert mogi.start_time is not None
-                if(mogi.start_time - timedelta(minutes=ts.queue_open_time)) < cur_time:
-                    if mogi.mogi_channel in self.ongoing_events.keys() and self.ongoing_events[mogi.mogi_channel].gathering:
-                        to_remove.append(i)
-                        await mogi.mogi_channel.send(f"Because there is an ongoing event right now, the following event has been removed:\n{self.get_event_str(mogi)}\n")
-                    else:
-                        if mogi.mogi_channel in self.ongoing_events.keys():
-                            if self.ongoing_events[mogi.mogi_channel].started:
-                                await self.endMogi(mogi.mogi_channel)
-                        to_remove.append(i)
-                        self.ongoing_events[mogi.mogi_channel] = mogi
-                        mogi.started = True
-                        mogi.gathering = True
-                        await self.unlockdown(mogi.mogi_channel)
-                        await mogi.mogi_channel.send(f"A {mogi.size}v{mogi.size} mogi has been started - Type `!c`, `!d`, or `!list`")
-            for ind in reversed(to_remove):
-                del guild[ind]
+    # the time players can start joining a scheduled mogi
+    def queue_open_time(self, mogi: Mogi):
+        assert mogi.start_time is not None
+        # compared with aware times, like the discord event times; a naive start time is in local time
+        return mogi.start_time.astimezone(timezone.utc) - timedelta(minutes=mogi.leaderboard.time_settings.queue_open_time)
+
+    # the time joining ends, after which the mogi starts as soon as the number of teams fills every room
+    def joining_end_time(self, mogi: Mogi):
+        return self.queue_open_time(mogi) + timedelta(minutes=mogi.leaderboard.time_settings.joining_time)
+
+    # the time the rooms are made regardless of the number of teams
+    def extension_end_time(self, mogi: Mogi):
+        return self.joining_end_time(mogi) + timedelta(minutes=mogi.leaderboard.time_settings.extension_time)
+
+    def schedule_queue_open(self, mogi: Mogi):
+        self.deadlines.schedule((mogi, "open"), self.queue_open_time(mogi), lambda: self.start_scheduled_mogi(mogi))
+        lead_time = self.bot.config.prefetch.lead_time
+        if lead_time > 0:
+            self.deadlines.schedule((mogi, "prefetch"), self.queue_open_time(mogi) - timedelta(minutes=lead_time),
+                                    lambda: self.prefetch_mmr(mogi))
+
+    # looks up the MMR of the players likely to join the mogi in the background, so their
+    # joins are served from the cache
+    async def prefetch_mmr(self, mogi: Mogi):
+        self.prefetcher.start(mogi.leaderboard, self.prefetcher.candidates(mogi.leaderboard, mogi.mogi_channel.guild))
+
+    # schedules the deadlines of an automated mogi that has started gathering
+    def schedule_mogi_deadlines(self, mogi: Mogi):
+        if not mogi.is_automated or not mogi.started or mogi.making_rooms_run:
+            return
+        self.deadlines.schedule((mogi, "teams"), self.joining_end_time(mogi), lambda: self.check_mogi_deadline(mogi))
+        # forecast rooms are created gradually, even while nobody is joining
+        self.deadlines.schedule((mogi, "rooms"), datetime.now(timezone.utc), lambda: self.pace_room_channels(mogi))
+
+    def cancel_mogi_deadlines(self, mogi: Mogi):
+        for kind in ("open", "prefetch", "teams", "rooms"):
+            self.deadlines.cancel((mogi, kind))
+
+    def is_automated_mogi(self, mogi: Mogi):
+        #If it's not automated, not started, we've already started making the rooms, or it has ended, don't run this
+        return (mogi.is_automated and mogi.started and not mogi.making_rooms_run
+                and self.get_shard(mogi.mogi_channel.guild.id).ongoing_events.get(mogi.mogi_channel, None) is mogi)
+
+    async def start_scheduled_mogi(self, mogi: Mogi):
+        shard = self.get_shard(mogi.mogi_channel.guild.id)
+        if not shard.scheduled_events.remove(mogi):
+            return
+        self.record(jr.EventRemoved(mogi.mogi_channel.guild.id, mogi.sq_id, mogi.start_time))
+        ongoing_events = shard.ongoing_events
+        if mogi.mogi_channel in ongoing_events.keys() and ongoing_events[mogi.mogi_channel].gathering:
+            await mogi.mogi_channel.send(f"Because there is an ongoing event right now, the following event has been removed:\n{self.get_event_str(mogi)}\n")
+            return
+        if mogi.mogi_channel in ongoing_events.keys():
+            if ongoing_events[mogi.mogi_channel].started:
+                await self.endMogi(mogi.mogi_channel)
+        ongoing_events[mogi.mogi_channel] = mogi
+        mogi.started = True
+        mogi.gathering = True
+        self.record(jr.MogiStarted(self.get_mogi_state(mogi)))
+        self.schedule_mogi_deadlines(mogi)
+        # players who weren't cached by the earlier prefetch, or whose MMR expired since, are looked up again
+        await self.prefetch_mmr(mogi)
+        await self.unlockdown(mogi.mogi_channel)
+        await mogi.mogi_channel.send(f"A {mogi.size}v{mogi.size} mogi has been started - Type `!c`, `!d`, or `!list`")
 
     async def check_num_teams(self, mogi: Mogi):
         if not mogi.gathering or not mogi.is_automated:
             return
-        cur_time = datetime.now()
-        ts = mogi.leaderboard.time_settings
-        queue_open_time = timedelta(minutes=ts.queue_open_time)
-        joining_time = timedelta(minutes=ts.joining_time)
-        assert mogi.start_time is not None
-        if mogi.start_time - queue_open_time + joining_time <= cur_time:
+        cur_time = datetime.now(timezone.utc)
+        if self.joining_end_time(mogi) <= cur_time:
             players_per_mogi = mogi.room_size
             numLeftoverTeams = mogi.count_registered() % int((players_per_mogi/mogi.size))
             if numLeftoverTeams == 0:
                 mogi.gathering = False
+                self.record_status(mogi)
+                # make the rooms right away instead of waiting for the next reminder
+                self.deadlines.schedule((mogi, "teams"), cur_time, lambda: self.check_mogi_deadline(mogi))
                 await self.lockdown(mogi.mogi_channel)
-                await mogi.mogi_channel.send("A sufficient number of teams has been reached, so the mogi has been closed to extra teams. Rooms will be made within the next minute.")
+                await self.announce(mogi.mogi_channel, mogi.leaderboard, "A sufficient number of teams has been reached, so the mogi has been closed to extra teams. Rooms will be made within the next minute.")
 
-    async def ongoing_mogi_checks(self):
-        for mogi in self.ongoing_events.values():
-            #If it's not automated, not started, we've already started making the rooms, don't run this
-            if not mogi.is_automated or not mogi.started or mogi.making_rooms_run:
-                continue
-            assert mogi.start_time is not None
-            cur_time = datetime.now()
-            ts = mogi.leaderboard.time_settings
-            queue_open_time = timedelta(minutes=ts.queue_open_time)
-            joining_time = timedelta(minutes=ts.joining_time)
-            extension_time = timedelta(minutes=ts.extension_time)
-            if (mogi.start_time - queue_open_time + joining_time + extension_time) <= cur_time:
-                await self.add_teams_to_rooms(mogi, (mogi.start_time.minute)%60, True)
-                continue
-            if mogi.start_time - queue_open_time + joining_time <= cur_time:
-                #check if there are an even amount of teams since we are past the queue time
-                players_per_mogi = mogi.room_size
-                numLeftoverTeams = mogi.count_registered() % int((players_per_mogi/mogi.size))
-                if numLeftoverTeams == 0:
-                    await self.add_teams_to_rooms(mogi, (mogi.start_time.minute)%60, True)
-                    continue
-                else:
-                    if int(cur_time.second / 20) == 0:
-                        force_time = mogi.start_time - queue_open_time + joining_time + extension_time
-                        minutes_left = int((force_time - cur_time).seconds/60)
-                        x_teams = int(int(players_per_mogi/mogi.size) - numLeftoverTeams)
-                        await mogi.mogi_channel.send(f"Need {x_teams} more team(s) to start immediately. Starting in {minutes_left} minute(s) regardless.")
-
-    @tasks.loop(seconds=20.0)
-    async def sqscheduler(self):
-        """Scheduler that checks if it should start mogis and close them"""
-        #It may seem silly to do try/except Exception, but this coroutine **cannot** fail
-        #This coroutine *silently* fails and stops if exceptions aren't caught - an annoying abtraction of asyncio
-        #This is unacceptable considering people are relying on these mogis to run, so we will not allow this routine to stop
-        try:
-            await self.scheduler_mogi_start()
-        except Exception as e:
-            print(e)
-        try:
-            await self.ongoing_mogi_checks()
-        except Exception as e:
-            print(e)
+    # runs once joining ends, and then every minute until the rooms are made
+    async def check_mogi_deadline(self, mogi: Mogi):
+        if not self.is_automated_mogi(mogi):
+            return
+        assert mogi.start_time is not None
+        cur_time = datetime.now(timezone.utc)
+        force_time = self.extension_end_time(mogi)
+        if force_time <= cur_time:
+            await self.make_rooms(mogi, (mogi.start_time.minute)%60, True)
+            return
+        #check if there are an even amount of teams since we are past the queue time
+        players_per_mogi = mogi.room_size
+        numLeftoverTeams = mogi.count_registered() % int((players_per_mogi/mogi.size))
+        if numLeftoverTeams == 0:
+            await self.make_rooms(mogi, (mogi.start_time.minute)%60, True)
+            return
+        minutes_left = int((force_time - cur_time).seconds/60)
+        x_teams = int(int(players_per_mogi/mogi.size) - numLeftoverTeams)
+        await self.announce(mogi.mogi_channel, mogi.leaderboard, f"Need {x_teams} more team(s) to start immediately. Starting in {minutes_left} minute(s) regardless.")
+        next_check = min(cur_time + timedelta(minutes=1), force_time)
+        self.deadlines.schedule((mogi, "teams"), next_check, lambda: self.check_mogi_deadline(mogi))
+
+    async def pace_room_channels(self, mogi: Mogi):
+        if not self.is_automated_mogi(mogi) or not mogi.gathering:
+            return
+        await self.check_room_channels(mogi)
+        self.deadlines.schedule((mogi, "rooms"), datetime.now(timezone.utc) + timedelta(seconds=PACING_INTERVAL),
+                                lambda: self.pace_room_channels(mogi))
 
     def getTime(self, schedule_time:str, timezone:str):
         """Returns a DateTime object representing the UTC equivalent of the given time."""
@@ -838,6 +1319,51 @@ class SquadQueue(commands.Cog):
             event_str = "none"
         await interaction.response.send_message(f"`{event_str}`", ephemeral=True)
 
+    def get_event_times(self, lb: LeaderboardConfig, actual_time: datetime):
+        """Returns the start and end of the discord event for a mogi, which cover its joining period"""
+        queue_open_time = timedelta(minutes=lb.time_settings.queue_open_time)
+        joining_time = timedelta(minutes=lb.time_settings.joining_time)
+        event_start_time = actual_time.astimezone() - queue_open_time
+        event_end_time = event_start_time + joining_time
+        return event_start_time, event_end_time
+
+    def schedule_error(self, lb: LeaderboardConfig, room_size: int, size: int, actual_time: datetime):
+        """Returns why an event can't be scheduled, or None if it can"""
+        if actual_time < datetime.now():
+            bad_time = discord.utils.format_dt(actual_time, style="F")
+            return (f"That time is in the past! ({bad_time})"
+            "Make sure your timezone is correct (with daylight savings taken into account, "
+            "ex. EDT instead of EST if it's summer), and that you've entered the date if it's not today")
+        event_end_time = self.get_event_times(lb, actual_time)[1]
+        if event_end_time < discord.utils.utcnow():
+            bad_time = discord.utils.format_dt(event_end_time, style="F")
+            return ("The queue for this event would end in the past! "
+            f"({bad_time}) "
+            "Make sure your timezone is correct (with daylight savings taken into account, "
+            "ex. EDT instead of EST if it's summer), and that you've entered the date if it's not today")
+        size_name = f"{size}v{size}" if size > 1 else "FFA"
+        if room_size not in lb.valid_room_sizes:
+            return f"Invalid room size. Valid room sizes for this server are: {lb.valid_room_sizes}"
+        if size not in lb.valid_formats:
+            return f"Invalid format. Valid formats for this server are: {lb.valid_formats}"
+        if room_size % size != 0:
+            return f"The entered format ({size_name}) is not divisible by the specified room size ({room_size})."
+        return None
+
+    async def create_discord_event(self, guild: discord.Guild, mogi: Mogi):
+        assert mogi.start_time is not None
+        event_start_time, event_end_time = self.get_event_times(mogi.leaderboard, mogi.start_time)
+        if event_start_time < discord.utils.utcnow():
+            #have to add 1 minute here, because utcnow() will technically be the past when the API request is sent
+            event_start_time = discord.utils.utcnow() + timedelta(minutes=1)
+        size_name = f"{mogi.size}v{mogi.size}" if mogi.size > 1 else "FFA"
+        return await guild.create_scheduled_event(name=f"SQ #{mogi.sq_id}: {mogi.room_size}p {size_name} gathering players",
+                                                  start_time = event_start_time,
+                                                  end_time = event_end_time,
+                                                  privacy_level = discord.PrivacyLevel.guild_only,
+                                                  entity_type = discord.EntityType.external,
+                                                  location=mogi.mogi_channel.mention)
+
     @app_commands.command(name="schedule_event")
     @app_commands.autocomplete(size=format_autocomplete)
     @app_commands.autocomplete(leaderboard=leaderboard_autocomplete)
@@ -858,55 +1384,111 @@ class SquadQueue(commands.Cog):
             await interaction.response.send_message(f"I couldn't understand your time, so I couldn't schedule the event.",
             ephemeral=True)
             return
-        if actual_time < datetime.now():
-            bad_time = discord.utils.format_dt(actual_time, style="F")
-            await interaction.response.send_message(f"That time is in the past! ({bad_time})"
-            "Make sure your timezone is correct (with daylight savings taken into account, "
-            "ex. EDT instead of EST if it's summer), and that you've entered the date if it's not today")
-            return
-        
-        queue_open_time = timedelta(minutes=lb.time_settings.queue_open_time)
-        joining_time = timedelta(minutes=lb.time_settings.joining_time)
-        event_start_time = actual_time.astimezone() - queue_open_time
-        event_end_time = event_start_time + joining_time
-        if event_end_time < discord.utils.utcnow():
-            bad_time = discord.utils.format_dt(event_end_time, style="F")
-            await interaction.response.send_message("The queue for this event would end in the past! "
-            f"({bad_time}) "
-            "Make sure your timezone is correct (with daylight savings taken into account, "
-            "ex. EDT instead of EST if it's summer), and that you've entered the date if it's not today")
-            return
-        size_name = f"{size}v{size}" if size > 1 else "FFA"
-        if room_size not in lb.valid_room_sizes:
-            await interaction.response.send_message(f"Invalid room size. Valid room sizes for this server are: {lb.valid_room_sizes}")
-            return
-        if size not in lb.valid_formats:
-            await interaction.response.send_message(f"Invalid format. Valid formats for this server are: {lb.valid_formats}")
-            return
-        if room_size % size != 0:
-            await interaction.response.send_message(f"The entered format ({size_name}) is not divisible by the specified room size ({room_size}).")
+        error = self.schedule_error(lb, room_size, size, actual_time)
+        if error is not None:
+            await interaction.response.send_message(error)
             return
         channel = ctx.bot.get_channel(lb.join_channel)
 
         await interaction.response.defer(thinking=True)
 
-        if event_start_time < discord.utils.utcnow():
-            #have to add 1 minute here, because utcnow() will technically be the past when the API request is sent
-            event_start_time = discord.utils.utcnow() + timedelta(minutes=1)
-        discord_event = await interaction.guild.create_scheduled_event(name=f"SQ #{sq_id}: {room_size}p {size_name} gathering players",
-                                                       start_time = event_start_time,
-                                                       end_time = event_end_time,
-                                                       privacy_level = discord.PrivacyLevel.guild_only,
-                                                       entity_type = discord.EntityType.external,
-                                                       location=channel.mention)
-        mogi = Mogi(sq_id, size, room_size, channel, lb, is_automated=True, start_time=actual_time, discord_event=discord_event)
-        if interaction.guild not in self.scheduled_events.keys():
-            self.scheduled_events[interaction.guild] = []
-        self.scheduled_events[interaction.guild].append(mogi)
+        mogi = Mogi(sq_id, size, room_size, channel, lb, is_automated=True, start_time=actual_time)
+        discord_event = await self.create_discord_event(interaction.guild, mogi)
+        mogi.discord_event_id = discord_event.id
+        self.get_shard(interaction.guild.id).scheduled_events.add(interaction.guild.id, mogi)
+        self.record(jr.EventScheduled(self.get_mogi_state(mogi)))
+        self.schedule_queue_open(mogi)
         event_str = self.get_event_str(mogi)
         #await interaction.response.send_message(f"Scheduled the following event:\n{event_str}")
         await interaction.followup.send(f"Scheduled the following event:\n{event_str}")
 
+    @app_commands.command(name="schedule_import")
+    @app_commands.guild_only()
+    async def schedule_import(self, interaction:discord.Interaction[SquadQueueBot], schedule: discord.Attachment):
+        """Schedules every SQ event in a .csv or .json file with the columns sq_id, room_size, format, time, timezone and leaderboard."""
+        assert interaction.guild is not None
+        guild = interaction.guild
+        ctx = await commands.Context.from_interaction(interaction)
+        if not await self.has_roles(ctx):
+            await interaction.response.send_message("You do not have permissions to use this command",ephemeral=True)
+            return
+        if schedule.size > MAX_IMPORT_BYTES:
+            await interaction.response.send_message(f"That file is too big; the limit is {MAX_IMPORT_BYTES // 1024} KB.", ephemeral=True)
+            return
+        await interaction.response.defer(thinking=True)
+        rows, errors = parse_schedule(schedule.filename, await schedule.read())
+
+        # every row is checked before anything is scheduled, so a bad file schedules nothing
+        index = get_guild_index(ctx)
+        scheduled_events = self.get_shard(guild.id).scheduled_events
+        sq_ids: set[int] = set()
+        mogis: list[Mogi] = []
+        for i, row in enumerate(rows, start=1):
+            lb = index.get_leaderboard(row.leaderboard)
+            actual_time = self.getTime(row.time, row.timezone)
+            channel = guild.get_channel(lb.join_channel) if lb is not None else None
+            if lb is None:
+                error = f"Unknown leaderboard `{row.leaderboard}`" if row.leaderboard else "The leaderboard column is needed in this server"
+            elif not isinstance(channel, discord.TextChannel):
+                error = "I couldn't find the join channel of this leaderboard"
+            elif actual_time is None:
+                error = f"I couldn't understand the time `{row.time}`"
+            elif row.sq_id in sq_ids or scheduled_events.find(guild.id, row.sq_id) is not None:
+                error = f"SQ #{row.sq_id} is already scheduled"
+            else:
+                error = self.schedule_error(lb, row.room_size, row.format, actual_time)
+            if error is not None:
+                errors.append(f"Row {i}: {error}")
+                continue
+            sq_ids.add(row.sq_id)
+            mogis.append(Mogi(row.sq_id, row.format, row.room_size, channel, lb, is_automated=True, start_time=actual_time))
+        if errors:
+            error_msg = "\n".join(errors[:10])
+            if len(errors) > 10:
+                error_msg += f"\n...and {len(errors) - 10} more"
+            await interaction.followup.send(f"Nothing was scheduled, because of these problems:\n{error_msg}")
+            return
+        if not mogis:
+            await interaction.followup.send("There are no events in that file.")
+            return
+
+        for mogi in mogis:
+            scheduled_events.add(guild.id, mogi)
+            self.schedule_queue_open(mogi)
+        self.record(jr.EventsScheduled([self.get_mogi_state(mogi) for mogi in mogis]))
+        self.submit_discord_events(guild, mogis, interaction)
+        eta = int(self.event_worker.eta())
+        await interaction.followup.send(f"Scheduled {len(mogis)} events. Their discord events will be created over the next {eta} seconds.")
+
+    def submit_discord_events(self, guild: discord.Guild, mogis: 'list[Mogi]', interaction: discord.Interaction | None = None):
+        """Has the background worker create the discord events of mogis that were scheduled without one"""
+        scheduled_events = self.get_shard(guild.id).scheduled_events
+        def job(mogi: Mogi):
+            async def create():
+                # the event was removed or its queue already opened while it was waiting
+                if mogi not in scheduled_events or mogi.discord_event_id is not None:
+                    return False
+                if mogi.start_time is None or self.get_event_times(mogi.leaderboard, mogi.start_time)[1] < discord.utils.utcnow():
+                    return False
+                discord_event = await self.create_discord_event(guild, mogi)
+                mogi.discord_event_id = discord_event.id
+                self.record(jr.DiscordEventCreated(guild.id, mogi.sq_id, mogi.start_time, discord_event.id))
+                return True
+            return create
+        on_progress = None
+        if interaction is not None:
+            async def on_progress(batch: EventBatch):
+                # the reply is edited every few events rather than after each one
+                if batch.finished % 5 != 0 and not batch.done():
+                    return
+                msg = f"Created {batch.created}/{len(batch.jobs)} discord events"
+                if batch.skipped:
+                    msg += f", skipped {batch.skipped}"
+                if batch.failed:
+                    msg += f", {batch.failed} failed"
+                await interaction.edit_original_response(content=msg + ("." if batch.done() else "..."))
+        self.event_worker.submit(EventBatch([job(mogi) for mogi in mogis], on_progress))
+
     def get_event_str(self, mogi: Mogi):
         assert mogi.start_time is not None
         mogi_time = discord.utils.format_dt(mogi.start_time, style="F")
@@ -922,29 +1504,27 @@ class SquadQueue(commands.Cog):
         if not await self.has_roles(ctx):
             await interaction.response.send_message("You do not have permissions to use this command",ephemeral=True)
             return
-        if interaction.guild not in self.scheduled_events.keys():
+        scheduled_events = self.get_shard(interaction.guild.id).scheduled_events
+        event = scheduled_events.find(interaction.guild.id, event_id)
+        if event is None:
             await interaction.response.send_message("This event number isn't in the schedule. Do `!view_schedule` to see the scheduled events.",
                                                     ephemeral=True)
             return
-        for event in self.scheduled_events[interaction.guild]:
-            if event.sq_id == event_id:
-                self.scheduled_events[interaction.guild].remove(event)
-                if event.discord_event:
-                    await event.discord_event.cancel()
-                await interaction.response.send_message(f"Removed the following event:\n{self.get_event_str(event)}")
-                return
-        await interaction.response.send_message("This event number isn't in the schedule. Do `!view_schedule` to see the scheduled events.")
+        scheduled_events.remove(event)
+        self.deadlines.cancel((event, "open"))
+        self.deadlines.cancel((event, "prefetch"))
+        self.record(jr.EventRemoved(interaction.guild.id, event.sq_id, event.start_time))
+        discord_event = interaction.guild.get_scheduled_event(event.discord_event_id) if event.discord_event_id else None
+        if discord_event:
+            await discord_event.cancel()
+        await interaction.response.send_message(f"Removed the following event:\n{self.get_event_str(event)}")
 
     @commands.command()
     @commands.guild_only()
     async def view_schedule(self, ctx: commands.Context, copy_paste=""):
         """View the SQ schedule. Use !view_schedule cp to get a copy/pastable version"""
         assert ctx.guild is not None
-        server_events = self.scheduled_events.get(ctx.guild, None)
-        if server_events is None:
-            await ctx.send("There are no SQ events scheduled in this server yet. Use /schedule_event to schedule one.")
-            return
-        server_schedule = sorted(server_events, key = lambda event: event.sq_id)
+        server_schedule = self.get_shard(ctx.guild.id).scheduled_events.get_guild(ctx.guild.id)
         if len(server_schedule) == 0:
             await ctx.send("There are no SQ events scheduled in this server yet. Use /schedule_event to schedule one.")
             return
@@ -969,10 +1549,7 @@ class SquadQueue(commands.Cog):
     @commands.guild_only()
     async def view_timestamps(self, ctx: commands.Context, no4or6=False):
         assert ctx.guild is not None
-        if ctx.guild not in self.scheduled_events.keys():
-            await ctx.send("There are no SQ events scheduled in this server yet. Use /schedule_event to schedule one.")
-            return
-        server_schedule = sorted(self.scheduled_events[ctx.guild], key = lambda event: event.sq_id)
+        server_schedule = self.get_shard(ctx.guild.id).scheduled_events.get_guild(ctx.guild.id)
         if len(server_schedule) == 0:
             await ctx.send("There are no SQ events scheduled in this server yet. Use /schedule_event to schedule one.")
             return
@@ -1005,6 +1582,26 @@ class SquadQueue(commands.Cog):
         await self.bot.tree.sync(guild=ctx.guild)
         await ctx.send("synced")
 
+    @commands.command(name="reload_config")
+    @commands.is_owner()
+    async def reload_config(self, ctx: commands.Context[SquadQueueBot]):
+        """Reloads the servers and leaderboards in config.json. Mogis that are already scheduled
+           or running keep the leaderboard settings they were made with."""
+        try:
+            config = get_config(CONFIG_PATH)
+            guild_index = compile_config(config)
+        except Exception as e:
+            await ctx.send(f"Couldn't reload the config: {e}")
+            return
+        # the other settings are only read at startup, so only the servers are swapped in
+        new_config = dataclasses.replace(self.bot.config, servers=config.servers)
+        self.bot.set_config(new_config, guild_index)
+        msg = f"Reloaded the config for {len(guild_index)} servers"
+        warnings = config_warnings(new_config)
+        if warnings:
+            msg += "\n" + "\n".join(warnings)
+        await ctx.send(msg[:2000])
+
     #@commands.command()
     #@commands.is_owner()
     async def reload(self, ctx: commands.Context):
@@ -1024,40 +1621,44 @@ class SquadQueue(commands.Cog):
             return
         # checking players' mmr
         check_players = [ctx.author]
-        players = await get_mmr(mogi.leaderboard, check_players)
+        players = await get_mmr(self.bot.lounge_client, mogi.leaderboard, check_players)
         if players[0] is None:
             return
         players[0].confirmed = True
-        for i in range(100):
-            # edit the lounge names a bit to make testing easier
-            new_player = Player(players[0].member, players[0].lounge_name+f"{i}", players[0].mmr)
-            new_player.confirmed = True
-            squad = Team([new_player]*mogi.size)
-            # this should put the teams in reverse confirmation order
-            squad.confirmed_at = datetime.now(timezone.utc)-timedelta(minutes=i)
-            mogi.teams.append(squad)
+        async with self.mogi_lock(mogi):
+            if self.get_mogi(ctx) is not mogi or self.mogi_error(mogi) is not None:
+                return
+            for i in range(100):
+                # edit the lounge names a bit to make testing easier
+                new_player = Player(players[0].member_id, players[0].lounge_name+f"{i}", players[0].mmr)
+                new_player.confirmed = True
+                squad = Team([new_player]*mogi.size)
+                # this should put the teams in reverse confirmation order
+                squad.confirmed_at = datetime.now(timezone.utc)-timedelta(minutes=i)
+                mogi.add_team(squad)
+                self.record(jr.TeamAdded(mogi.mogi_channel.id, jr.team_state(squad)))
         await ctx.send(f"Added {ctx.author.display_name} 100 times")
         await self.check_room_channels(mogi)
     
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
+        # most messages the bot sees aren't in a room thread, so drop those before looking at the content
+        room_info = self.room_threads.get(message.channel.id, None)
+        if room_info is None:
+            return
         if not isinstance(message.author, discord.Member):
             return
         if message.author.bot or not (
             message.content.isdecimal() and 12 <= int(
                 message.content) <= 180):
             return
-        room = None
-        
-        for mogi in self.ongoing_events.values():
-            room = mogi.get_room_from_thread(message.channel.id)
-            if room:
-                break
-        if not room:
-            return
+        mogi, room = room_info
         player = room.get_player(message.author)
         if player:
             player.score = int(message.content)
+            team = mogi.check_player(message.author)
+            if team is not None and team in mogi.teams:
+                self.record(jr.ScoreRecorded(mogi.mogi_channel.id, mogi.team_positions[team], team.players.index(player), player.score))
 
 async def setup(bot: SquadQueueBot):
     await bot.add_cog(SquadQueue(bot))
@@ -1,7 +1,62 @@
 from discord.ext import commands
 from models.Config import BotConfig
+from typing import TYPE_CHECKING
 
-class SquadQueueBot(commands.Bot):
-    def __init__(self, config: BotConfig, *args, **kwargs):
+if TYPE_CHECKING:
+    from util.mmr import LoungeClient
+    from util.Metrics import MetricsServer
+    from util.Members import MemberResolver
+    from util.Config import GuildIndex
+
+# AutoShardedBot runs a single shard unless given a shard count or discord recommends more than one
+class SquadQueueBot(commands.AutoShardedBot):
+    def __init__(self, config: BotConfig, lounge_client: 'LoungeClient', metrics: 'MetricsServer',
+                 member_resolver: 'MemberResolver', guild_index: dict[int, 'GuildIndex'], *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.config = config
\ No newline at end of file
+        self.config = config
+        # keys are guild IDs, values are the lookups compiled from that guild's config
+        self.guild_index = guild_index
+        self.lounge_client = lounge_client
+        self.metrics = metrics
+        self.member_resolver = member_resolver
+
+    def set_config(self, config: BotConfig, guild_index: dict[int, 'GuildIndex']):
+        # nothing is awaited here, so no command sees the new config with the old index
+        self.config = config
+        self.guild_index = guild_index
+
+    async def setup_hook(self):
+        await self.lounge_client.start()
+        self.metrics.instrument(self)
+        await self.metrics.start()
+
+    # timed here rather than in a before_invoke hook, so checks and argument parsing are included
+    async def invoke(self, ctx: commands.Context):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        self.metrics.command_started(ctx, self.shard_for(ctx))
+        try:
+            await super().invoke(ctx)
+        finally:
+            self.metrics.command_finished(ctx)
+
+    def shard_for(self, ctx: commands.Context):
+        return ctx.guild.shard_id if ctx.guild is not None else 0
+
+    async def on_shard_connect(self, shard_id: int):
+        self.metrics.shard_event(shard_id, "connect")
+
+    async def on_shard_disconnect(self, shard_id: int):
+        self.metrics.shard_event(shard_id, "disconnect")
+
+    async def on_shard_resumed(self, shard_id: int):
+        self.metrics.shard_event(shard_id, "resume")
+
+    async def on_shard_ready(self, shard_id: int):
+        self.metrics.shard_event(shard_id, "ready")
+
+    async def close(self):
+        # closing the bot unloads the cogs first, which stops the prefetches making lookups
+        await super().close()
+        await self.lounge_client.close()
+        await self.metrics.close()
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 @dataclass
 class WebsiteCredentials:
@@ -24,6 +24,11 @@ class LeaderboardConfig:
     pinged_member_ids: list[int] # discord IDs of members that get pinged into every room thread
     queue_messages: bool
     sec_between_queue_msgs: int
+    room_assignment: str = "contiguous" # contiguous, min_spread or penalized; see util/RoomAssignment.py
+    late_penalty: int = 500 # MMR cost of leaving out a team that confirmed in time, used by the optimized room assignments
+    prefetch_role_ids: list[int] = field(default_factory=list) # members with any of these roles have their MMR prefetched when a queue opens
+    points_per_race: int | dict[int, int] = 82 # points handed out in each race, used to check that a room's scores add up; a number for rooms of 12 players, or the points keyed by the number of players in the room
+    races_per_mogi: int = 12 # number of races played in each room
 
 @dataclass
 class ServerConfig:
@@ -31,8 +36,59 @@ class ServerConfig:
     staff_roles: list[int]
     leaderboards: dict[str, LeaderboardConfig]
 
+@dataclass
+class LoungeAPISettings:
+    max_concurrency: int = 8 # maximum number of Lounge API requests the bot has in flight at once
+    pool_size: int = 20 # maximum number of pooled connections kept open to the Lounge API
+    keepalive_timeout: int = 60 # number of seconds an idle pooled connection is kept alive
+    cache_ttl: int = 300 # number of seconds a player's MMR is reused before it is fetched again
+    cache_max_size: int = 5000 # maximum number of players kept in the MMR cache for each leaderboard
+    request_timeout: float = 5.0 # seconds before a single Lounge API request is given up on
+    total_timeout: float = 15.0 # seconds before a player lookup, including its retries, is given up on
+    retries: int = 2 # number of times a player lookup is retried after a server error or a timeout
+    retry_delay: float = 0.5 # seconds before the first retry of a player lookup; doubled for each retry after it, with jitter
+    breaker_window: int = 60 # number of seconds of requests the circuit breaker looks at
+    breaker_min_requests: int = 10 # minimum number of requests in the window before the circuit breaker can open
+    breaker_error_rate: float = 0.5 # fraction of failed requests in the window that opens the circuit breaker
+    breaker_cooldown: int = 30 # number of seconds the circuit breaker stays open before a request is let through to check the site
+    stale_ttl: int = 86400 # number of seconds a player's last known MMR is used for while the Lounge API is unavailable
+    submit_retries: int = 3 # number of times a table submission is retried after a server error or a dropped connection
+    submit_retry_delay: float = 1.0 # seconds before the first retry of a table submission; doubled for each retry after it
+
+@dataclass
+class MetricsSettings:
+    enabled: bool = False # serve Prometheus metrics over HTTP
+    host: str = "127.0.0.1"
+    port: int = 9108
+
+@dataclass
+class ShardingSettings:
+    enabled: bool = False # connect to the gateway with more than one shard
+    shard_count: int | None = None # total number of shards; discord's recommended count is used if not set
+    shard_ids: list[int] | None = None # shards this process runs, for splitting shards across processes; all shards if not set
+
+@dataclass
+class MemberCacheSettings:
+    chunk_at_startup: bool = True # load every member of every guild at startup; turn off in large servers to look members up when they're needed
+    max_size: int = 5000 # maximum number of looked up members kept in memory when guilds aren't loaded at startup
+
+@dataclass
+class PrefetchSettings:
+    enabled: bool = True # look up the MMR of players likely to join a queue before they do
+    lead_time: int = 2 # number of minutes before a queue opens that the first prefetch starts; 0 to only prefetch when it opens. Keep lead_time plus the time a prefetch takes under lounge_api.cache_ttl, or the first players prefetched expire before the queue opens
+    max_players: int = 500 # maximum number of players prefetched for each queue
+    recent_players: int = 2000 # number of recent participants remembered for each leaderboard
+    batch_size: int = 2 # number of lookups a prefetch makes at the same time; keep it well under lounge_api.max_concurrency
+    requests_per_second: float = 4.0 # maximum rate of prefetch lookups
+
 @dataclass
 class BotConfig:
     token: str
     application_id: int
-    servers: dict[int, ServerConfig]
\ No newline at end of file
+    servers: dict[int, ServerConfig]
+    lounge_api: LoungeAPISettings = field(default_factory=LoungeAPISettings)
+    metrics: MetricsSettings = field(default_factory=MetricsSettings)
+    sharding: ShardingSettings = field(default_factory=ShardingSettings)
+    members: MemberCacheSettings = field(default_factory=MemberCacheSettings)
+    prefetch: PrefetchSettings = field(default_factory=PrefetchSettings)
+    state_dir: str = "./state" # directory the queue journal and snapshots are saved to, so queues survive restarts
@@ -1,52 +1,85 @@
 import discord
+import bisect
+import itertools
 from .Config import LeaderboardConfig
 from datetime import datetime, timezone
             
+# the models keep discord IDs rather than discord objects, and use __slots__
 class Player:
-    def __init__ (self, member:discord.Member, lounge_name: str, mmr: int):
-        self.member = member
+    __slots__ = ("member_id", "lounge_name", "mmr", "confirmed", "score")
+
+    def __init__ (self, member_id: int, lounge_name: str, mmr: int):
+        self.member_id = member_id
         self.lounge_name = lounge_name
         self.mmr = mmr
         self.confirmed = False
         self.score = 0
 
+    @property
+    def mention(self):
+        return f"<@{self.member_id}>"
+
 class Team:
+    __slots__ = ("players", "players_by_id", "avg_mmr", "created_at", "confirmed_at", "mogi", "line")
+
     def __init__ (self, players: list[Player]):
         self.players = players
+        # keys are discord member IDs, values are the player in this team with that ID
+        self.players_by_id: dict[int, Player] = {p.member_id: p for p in players}
         self.avg_mmr = sum([p.mmr for p in self.players]) / len(self.players)
         self.created_at = datetime.now(timezone.utc)
         self.confirmed_at: datetime | None = None
+        # the mogi this team has been added to, which is notified when the team's players change
+        self.mogi: Mogi | None = None
+        # the team's line in the mogi list, cached until its players change
+        self.line: str | None = None
 
     def recalc_avg(self):
         self.avg_mmr = sum([p.mmr for p in self.players]) / len(self.players)
+        self.line = None
 
-    def has_player(self, member: discord.Member):
-        for player in self.players:
-            if player.member.id == member.id:
-                return True
-        return False
+    # the team's line in the mogi list, without its position
+    def list_line(self):
+        if self.line is None:
+            self.line = f"{', '.join([p.lounge_name for p in self.players])} ({self.avg_mmr:.1f} MMR)"
+        return self.line
 
-    def get_player(self, member: discord.Member):
-        for player in self.players:
-            if player.member.id == member.id:
-                return player
-        return None
+    def has_player(self, member: discord.abc.Snowflake):
+        return member.id in self.players_by_id
+
+    def get_player(self, member: discord.abc.Snowflake):
+        return self.players_by_id.get(member.id, None)
 
     def add_players(self, players: list[Player]):
         self.players.extend(players)
+        for player in players:
+            self.players_by_id[player.member_id] = player
         self.recalc_avg()
+        if self.mogi is not None:
+            self.mogi.index_players(self, players)
+            self.mogi.update_registration(self)
 
     def remove_players(self, players: list[Player]):
         for player in players:
             self.players.remove(player)
+            self.players_by_id.pop(player.member_id, None)
         self.confirmed_at = None
         self.recalc_avg()
+        if self.mogi is not None:
+            self.mogi.unindex_players(self, players)
+            self.mogi.update_registration(self)
 
     def sub_player(self, sub_out: Player, sub_in: Player):
         for i, player in enumerate(self.players):
             if player == sub_out:
                 self.players[i] = sub_in
+                self.players_by_id.pop(sub_out.member_id, None)
+                self.players_by_id[sub_in.member_id] = sub_in
                 self.recalc_avg()
+                if self.mogi is not None:
+                    self.mogi.unindex_players(self, [sub_out])
+                    self.mogi.index_players(self, [sub_in])
+                    self.mogi.update_registration(self)
                 return   
 
     def num_confirmed(self):
@@ -64,10 +97,7 @@ class Team:
         return unconfirmed
 
     def __lt__(self, other):
-        if self.avg_mmr < other.avg_mmr:
-            return True
-        if self.avg_mmr > other.avg_mmr:
-            return False
+        return self.avg_mmr < other.avg_mmr
 
     def __gt__(self, other):
         return other.__lt__(self)
@@ -76,21 +106,30 @@ class Team:
         return ", ".join([p.lounge_name for p in self.players])
 
 class Room:
-    def __init__(self, teams: list[Team], room_num:int, thread:discord.Thread):
+    __slots__ = ("teams", "room_num", "thread_id", "finished", "table_id")
+
+    def __init__(self, teams: list[Team], room_num:int, thread_id:int):
         self.teams = teams
         self.room_num = room_num
-        self.thread = thread
+        self.thread_id = thread_id
         self.finished = False
+        # ID of the room's table on the Lounge website, once its results are submitted
+        self.table_id: int | None = None
 
-    def get_player(self, member: discord.Member):
+    def get_player(self, member: discord.abc.Snowflake):
         for team in self.teams:
             player = team.get_player(member)
             if player:
                 return player
             
 class Mogi:
+    __slots__ = ("started", "gathering", "making_rooms_run", "sq_id", "room_size", "size", "mogi_channel", "leaderboard",
+                 "teams", "team_positions", "team_index", "registered_by_time", "registered_by_mmr", "registration_keys",
+                 "registration_counter", "rooms", "is_automated", "discord_event_id", "start_time", "version")
+
+    # the mogi keeps its channel, which discord.py caches anyway, since nearly everything the cog does with a mogi sends to it
     def __init__ (self, sq_id:int, size:int, room_size: int, mogi_channel:discord.TextChannel, leaderboard: LeaderboardConfig,
-                  is_automated = False, start_time: datetime | None = None, discord_event: discord.ScheduledEvent | None = None):
+                  is_automated = False, start_time: datetime | None = None, discord_event_id: int | None = None):
         self.started = False
         self.gathering = False
         self.making_rooms_run = False
@@ -100,19 +139,90 @@ class Mogi:
         self.mogi_channel = mogi_channel
         self.leaderboard = leaderboard
         self.teams: list[Team] = []
+        # keys are the teams in self.teams, values are their position in it, which the journal records teams by
+        self.team_positions: dict[Team, int] = {}
+        # keys are discord member IDs, values are the team that member is in
+        self.team_index: dict[int, Team] = {}
+        # registered teams, kept sorted by confirmation time and by average MMR (highest first)
+        self.registered_by_time: list[Team] = []
+        self.registered_by_mmr: list[Team] = []
+        # keys are registered teams, values are the sort keys they were inserted into the lists above with
+        self.registration_keys: dict[Team, tuple[tuple[datetime, int], tuple[float, int]]] = {}
+        self.registration_counter = itertools.count()
         self.rooms: list[Room] = []
+        # bumped whenever the registered teams or their players change, so the list is only rendered again after a change
+        self.version = 0
         self.is_automated = is_automated
-        self.discord_event = discord_event
+        self.discord_event_id = discord_event_id
         if not is_automated:
             self.start_time = None
         else:
             self.start_time = start_time
 
-    def check_player(self, member:discord.Member):
-        for team in self.teams:
-            if team.has_player(member):
-                return team
-        return None
+    def add_team(self, team: Team):
+        self.team_positions[team] = len(self.teams)
+        self.teams.append(team)
+        team.mogi = self
+        self.index_players(team, team.players)
+        self.update_registration(team)
+
+    def remove_team(self, team: Team):
+        position = self.team_positions.pop(team)
+        del self.teams[position]
+        for later_team in self.teams[position:]:
+            self.team_positions[later_team] -= 1
+        team.mogi = None
+        self.unindex_players(team, team.players)
+        self.unregister(team)
+
+    def confirm_player(self, team: Team, player: Player):
+        player.confirmed = True
+        self.update_registration(team)
+
+    # adds the team to or removes it from the registered lists after its players have changed
+    def update_registration(self, team: Team):
+        self.version += 1
+        is_registered = self.check_team_is_registered(team)
+        if is_registered and team not in self.registration_keys:
+            self.register(team)
+        elif not is_registered and team in self.registration_keys:
+            self.unregister(team)
+            # a team that drops out of the list goes to the back of it when it registers again
+            team.confirmed_at = None
+
+    def register(self, team: Team):
+        if team.confirmed_at is None:
+            team.confirmed_at = datetime.now(timezone.utc)
+        # the counter breaks ties, so every team has a unique position in both lists
+        order = next(self.registration_counter)
+        time_key = (team.confirmed_at, order)
+        mmr_key = (-team.avg_mmr, order)
+        self.registration_keys[team] = (time_key, mmr_key)
+        bisect.insort(self.registered_by_time, team, key=lambda t: self.registration_keys[t][0])
+        bisect.insort(self.registered_by_mmr, team, key=lambda t: self.registration_keys[t][1])
+
+    def unregister(self, team: Team):
+        if team not in self.registration_keys:
+            return
+        self.version += 1
+        time_key, mmr_key = self.registration_keys[team]
+        i = bisect.bisect_left(self.registered_by_time, time_key, key=lambda t: self.registration_keys[t][0])
+        del self.registered_by_time[i]
+        i = bisect.bisect_left(self.registered_by_mmr, mmr_key, key=lambda t: self.registration_keys[t][1])
+        del self.registered_by_mmr[i]
+        del self.registration_keys[team]
+
+    def index_players(self, team: Team, players: list[Player]):
+        for player in players:
+            self.team_index[player.member_id] = team
+
+    def unindex_players(self, team: Team, players: list[Player]):
+        for player in players:
+            if self.team_index.get(player.member_id, None) is team:
+                del self.team_index[player.member_id]
+
+    def check_player(self, member:discord.abc.Snowflake):
+        return self.team_index.get(member.id, None)
     
     def check_team_is_registered(self, team: Team):
         if len(team.players) < self.size:
@@ -123,40 +233,31 @@ class Mogi:
         return True
 
     def count_registered(self):
-        count = 0
-        for team in self.teams:
-            if self.check_team_is_registered(team):
-                count += 1
-        return count
+        return len(self.registration_keys)
 
+    # registered teams in the order they confirmed
     def confirmed_list(self):
-        confirmed: list[Team] = []
-        for team in self.teams:
-            if self.check_team_is_registered(team):
-                confirmed.append(team)
-        def team_sort(t: Team):
-            if t.confirmed_at:
-                return t.confirmed_at
-            return datetime.max
-        confirmed.sort(key=team_sort)
-        return confirmed
+        return list(self.registered_by_time)
+
+    # registered teams from highest to lowest average MMR
+    def mmr_list(self):
+        return list(self.registered_by_mmr)
 
     def remove_id(self, squad_id:int):
-        confirmed = self.confirmed_list()
-        if squad_id < 1 or squad_id > len(confirmed):
+        if squad_id < 1 or squad_id > len(self.registered_by_time):
             return None
-        squad = confirmed[squad_id-1]
-        self.teams.remove(squad)
+        squad = self.registered_by_time[squad_id-1]
+        self.remove_team(squad)
         return squad
 
     def is_room_thread(self, channel_id:int):
         for room in self.rooms:
-            if room.thread.id == channel_id:
+            if room.thread_id == channel_id:
                 return True
         return False
 
     def get_room_from_thread(self, channel_id:int):
         for room in self.rooms:
-            if room.thread.id == channel_id:
+            if room.thread_id == channel_id:
                 return room
         return None
\ No newline at end of file
@@ -2,4 +2,4 @@
 docker build --tag mk8dx-sqbot .
 docker stop mk8dx-sqbot
 docker rm mk8dx-sqbot
-docker run -d --name mk8dx-sqbot --restart unless-stopped mk8dx-sqbot
\ No newline at end of file
+docker run -d --name mk8dx-sqbot --restart unless-stopped -v mk8dx-sqbot-state:/app/state mk8dx-sqbot
\ No newline at end of file
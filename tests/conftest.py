@@ -0,0 +1,13 @@
+import pytest
+from models import LeaderboardConfig, WebsiteCredentials, TimeSettings
+
+@pytest.fixture
+def make_leaderboard():
+    """Makes leaderboard configs for tests. Keyword arguments replace the defaults below."""
+    def make(url: str = "http://127.0.0.1", game: str | None = None, **kwargs):
+        settings = dict(time_settings=TimeSettings(75, 70, 3), valid_room_sizes=[12], valid_formats=[2],
+                        join_channel=1, list_channel=2, pinged_member_ids=[], queue_messages=False,
+                        sec_between_queue_msgs=2)
+        settings.update(kwargs)
+        return LeaderboardConfig(website_credentials=WebsiteCredentials(url, "admin", "admin", game), **settings)
+    return make
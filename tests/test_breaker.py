@@ -0,0 +1,156 @@
+import asyncio
+import dataclasses
+import gc
+import time
+from aiohttp import web
+from models import LoungeAPISettings
+from util.Exceptions import LoungeUnavailableException
+from util.mmr import LoungeClient, CircuitBreaker, BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN
+
+SETTINGS = LoungeAPISettings(max_concurrency=1, retries=0, breaker_window=60, breaker_min_requests=4,
+                             breaker_error_rate=0.5, breaker_cooldown=30)
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(SETTINGS.breaker_min_requests):
+        breaker.record(False)
+    assert breaker.state == BREAKER_OPEN
+
+def end_cooldown(breaker: CircuitBreaker):
+    breaker.opened_at = time.monotonic() - SETTINGS.breaker_cooldown - 1
+
+def test_opens_after_too_many_failures():
+    breaker = CircuitBreaker("test|opens", SETTINGS)
+    breaker.record(True)
+    breaker.record(False)
+    breaker.record(True)
+    assert breaker.state == BREAKER_CLOSED
+    breaker.record(False)
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test|probe", SETTINGS)
+    open_breaker(breaker)
+    end_cooldown(breaker)
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True, probe=True)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow()
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test|reopen", SETTINGS)
+    open_breaker(breaker)
+    end_cooldown(breaker)
+    assert breaker.allow()
+    breaker.record(False, probe=True)
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+
+def test_only_the_probe_decides_half_open():
+    breaker = CircuitBreaker("test|in_flight", SETTINGS)
+    open_breaker(breaker)
+    end_cooldown(breaker)
+    assert breaker.allow()
+    # requests that started before the breaker opened finish while the probe is in flight
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == BREAKER_HALF_OPEN
+    breaker.record(True, probe=True)
+    assert breaker.state == BREAKER_CLOSED
+
+async def start_lounge(latency: float = 0.0):
+    async def handle_player(request: web.Request):
+        await asyncio.sleep(latency)
+        return web.json_response({"name": "Player", "mmr": 5000})
+    app = web.Application()
+    app.router.add_get("/api/player", handle_player)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1] # type: ignore
+
+def test_cancelled_probe_lets_the_breaker_recover(make_leaderboard):
+    async def run():
+        runner, port = await start_lounge()
+        lb = make_leaderboard(f"http://127.0.0.1:{port}")
+        client = LoungeClient(SETTINGS)
+        await client.start()
+        try:
+            breaker = client.get_breaker(lb)
+            open_breaker(breaker)
+            end_cooldown(breaker)
+            # every request slot is taken, so the probe is cancelled while it waits for one
+            await client.semaphore.acquire()
+            probe = asyncio.create_task(client.request_player_data(lb, 1))
+            await asyncio.sleep(0.05)
+            assert breaker.state == BREAKER_HALF_OPEN and breaker.probing
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            client.semaphore.release()
+            assert not breaker.probing
+            assert await client.request_player_data(lb, 1) == {"name": "Player", "mmr": 5000}
+            assert breaker.state == BREAKER_CLOSED
+        finally:
+            await client.close()
+            await runner.cleanup()
+    asyncio.run(run())
+
+def test_lookup_timed_out_waiting_for_a_slot_lets_the_breaker_recover(make_leaderboard):
+    async def run():
+        runner, port = await start_lounge()
+        lb = make_leaderboard(f"http://127.0.0.1:{port}")
+        client = LoungeClient(dataclasses.replace(SETTINGS, total_timeout=0.05))
+        await client.start()
+        try:
+            breaker = client.get_breaker(lb)
+            open_breaker(breaker)
+            end_cooldown(breaker)
+            await client.semaphore.acquire()
+            # the probe times out waiting for a slot, and there's no last known MMR to fall back on
+            try:
+                await client.request_player(lb, 1)
+                assert False, "the lookup should have timed out"
+            except LoungeUnavailableException:
+                pass
+            client.semaphore.release()
+            assert not breaker.probing
+            assert await client.request_player(lb, 1) == ("Player", 5000)
+            assert breaker.state == BREAKER_CLOSED
+        finally:
+            await client.close()
+            await runner.cleanup()
+    asyncio.run(run())
+
+def test_closing_with_lookups_in_flight(make_leaderboard):
+    async def run():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        runner, port = await start_lounge(latency=1)
+        lb = make_leaderboard(f"http://127.0.0.1:{port}")
+        client = LoungeClient(dataclasses.replace(SETTINGS, max_concurrency=4))
+        await client.start()
+        try:
+            breaker = client.get_breaker(lb)
+            open_breaker(breaker)
+            end_cooldown(breaker)
+            # the first lookup is the probe; the others are turned away by the half open breaker
+            lookups = [asyncio.create_task(client.lookup(lb, member_id)) for member_id in range(1, 4)]
+            await asyncio.sleep(0.1)
+            assert breaker.probing and len(client.requests) == 1
+            await client.close()
+            results = await asyncio.gather(*lookups, return_exceptions=True)
+            assert isinstance(results[0], asyncio.CancelledError)
+            assert all(isinstance(result, LoungeUnavailableException) for result in results[1:])
+            assert client.requests == set() and client.in_flight == {}
+            # the cancelled probe learned nothing about the site, so the next lookup checks it again
+            assert not breaker.probing and breaker.state == BREAKER_HALF_OPEN
+        finally:
+            await client.close()
+            await runner.cleanup()
+        gc.collect()
+        await asyncio.sleep(0)
+        assert errors == []
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+from models import BotConfig, ServerConfig, LeaderboardConfig, MemberCacheSettings, PrefetchSettings
+from util.Config import config_warnings, compile_config, filter_choices, MAX_CHOICES
+
+GUILD_ID = 1 << 22
+
+def make_config(leaderboards: dict[str, LeaderboardConfig], chunk_at_startup: bool = True):
+    return BotConfig("token", 1, {GUILD_ID: ServerConfig([10], [11], leaderboards)},
+                     members=MemberCacheSettings(chunk_at_startup=chunk_at_startup))
+
+def test_prefetch_roles_need_the_member_cache(make_leaderboard):
+    leaderboards = {"mk8dx": make_leaderboard(join_channel=100, list_channel=101, prefetch_role_ids=[5]),
+                    "mkw": make_leaderboard(join_channel=200, list_channel=201)}
+    assert config_warnings(make_config(leaderboards)) == []
+    warnings = config_warnings(make_config(leaderboards, chunk_at_startup=False))
+    assert warnings == [f"prefetch_role_ids of leaderboard mk8dx in server {GUILD_ID} is ignored, "
+                        "because members.chunk_at_startup is off"]
+
+def test_prefetch_has_to_finish_before_its_lookups_expire(make_leaderboard):
+    config = make_config({"mk8dx": make_leaderboard(join_channel=100, list_channel=101)})
+    # the defaults leave the first prefetched players cached until after the queue opens
+    assert config_warnings(config) == []
+    config.prefetch = PrefetchSettings(lead_time=5)
+    assert config_warnings(config) == ["prefetch.lead_time of 5 minutes plus the 125 seconds a prefetch of max_players "
+                                       "takes is longer than lounge_api.cache_ttl of 300 seconds, so prefetched players "
+                                       "expire around the time the queue opens"]
+    config.prefetch = PrefetchSettings(lead_time=0)
+    assert config_warnings(config) == []
+
+def test_leaderboard_lookups(make_leaderboard):
+    mk8dx = make_leaderboard(join_channel=100, list_channel=101, valid_room_sizes=[12, 24], valid_formats=[1, 2])
+    mkw = make_leaderboard(join_channel=200, list_channel=201, valid_room_sizes=[12], valid_formats=[2, 3, 4])
+    index = compile_config(make_config({"mk8dx": mk8dx, "MKW": mkw}))[GUILD_ID]
+    # with more than one leaderboard, commands have to name theirs
+    assert index.get_leaderboard(None) is None
+    assert index.get_leaderboard("") is None
+    assert index.get_leaderboard("mk8dx") is mk8dx
+    assert index.get_leaderboard("MKW") is mkw
+    assert index.get_leaderboard("mk7") is None
+    assert index.join_channels == {100: "mk8dx", 200: "MKW"}
+    assert index.role_ids == {10, 11}
+
+    single = compile_config(make_config({"mk8dx": mk8dx}))[GUILD_ID]
+    assert single.get_leaderboard(None) is mk8dx
+    assert single.get_leaderboard("") is None
+
+def test_autocomplete_choices(make_leaderboard):
+    leaderboards = {"mk8dx": make_leaderboard(join_channel=100, list_channel=101, valid_room_sizes=[12, 24], valid_formats=[1, 2]),
+                    "MKW": make_leaderboard(join_channel=200, list_channel=201, valid_room_sizes=[12], valid_formats=[2, 3, 4])}
+    index = compile_config(make_config(leaderboards))[GUILD_ID]
+    assert [c.value for c in filter_choices(index.leaderboard_choices, "mK")] == ["mk8dx", "MKW"]
+    assert [c.value for c in filter_choices(index.leaderboard_choices, "w")] == ["MKW"]
+    # each format and room size is offered once, in order
+    assert [(c.name, c.value) for c in filter_choices(index.format_choices, "")] == \
+        [("FFA", 1), ("2v2", 2), ("3v3", 3), ("4v4", 4)]
+    assert [c.value for c in filter_choices(index.format_choices, "ffa")] == [1]
+    assert [c.value for c in filter_choices(index.room_size_choices, "2")] == [12, 24]
+
+    many = {f"lb{i}": make_leaderboard(join_channel=1000 + 10 * i, list_channel=1001 + 10 * i) for i in range(40)}
+    index = compile_config(make_config(many))[GUILD_ID]
+    assert len(filter_choices(index.leaderboard_choices, "LB")) == MAX_CHOICES
+    assert [c.value for c in filter_choices(index.leaderboard_choices, "lb39")] == ["lb39"]
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from util.DeadlineScheduler import DeadlineScheduler
+
+def test_slow_callback_does_not_delay_other_deadlines():
+    async def run():
+        scheduler = DeadlineScheduler()
+        scheduler.start()
+        started = time.perf_counter()
+        finished: dict[str, float] = {}
+        async def slow():
+            await asyncio.sleep(0.5)
+            finished["slow"] = time.perf_counter() - started
+        async def fast():
+            finished["fast"] = time.perf_counter() - started
+        now = datetime.now(timezone.utc)
+        scheduler.schedule("slow", now, slow)
+        scheduler.schedule("fast", now + timedelta(milliseconds=50), fast)
+        await asyncio.sleep(0.2)
+        assert finished["fast"] < 0.2
+        assert "slow" not in finished
+        assert len(scheduler.running) == 1
+        await asyncio.sleep(0.4)
+        assert "slow" in finished
+        assert not scheduler.running
+        scheduler.close()
+    asyncio.run(run())
+
+def test_failing_callback_is_logged(capsys):
+    async def run():
+        scheduler = DeadlineScheduler()
+        scheduler.start()
+        ran: list[str] = []
+        async def fail():
+            raise RuntimeError("callback failed")
+        async def after():
+            ran.append("after")
+        now = datetime.now(timezone.utc)
+        scheduler.schedule("fail", now, fail)
+        scheduler.schedule("after", now + timedelta(milliseconds=20), after)
+        await asyncio.sleep(0.1)
+        assert ran == ["after"]
+        scheduler.close()
+    asyncio.run(run())
+    assert "callback failed" in capsys.readouterr().out
+
+def test_naive_and_aware_deadlines_are_ordered_together():
+    async def run():
+        scheduler = DeadlineScheduler()
+        scheduler.start()
+        ran: list[str] = []
+        def record(name: str):
+            async def callback():
+                ran.append(name)
+            return callback
+        # naive deadlines are in local time
+        scheduler.schedule("naive", datetime.now() + timedelta(milliseconds=60), record("naive"))
+        scheduler.schedule("aware", datetime.now(timezone.utc) + timedelta(milliseconds=20), record("aware"))
+        await asyncio.sleep(0.15)
+        assert ran == ["aware", "naive"]
+        scheduler.close()
+    asyncio.run(run())
+
+def test_rescheduling_and_cancelling():
+    async def run():
+        scheduler = DeadlineScheduler()
+        scheduler.start()
+        ran: list[str] = []
+        def record(name: str):
+            async def callback():
+                ran.append(name)
+            return callback
+        now = datetime.now(timezone.utc)
+        scheduler.schedule("mogi", now + timedelta(milliseconds=20), record("first"))
+        # scheduling a key again replaces its earlier deadline
+        scheduler.schedule("mogi", now + timedelta(milliseconds=40), record("second"))
+        scheduler.schedule("cancelled", now + timedelta(milliseconds=20), record("cancelled"))
+        scheduler.cancel("cancelled")
+        assert scheduler.is_scheduled("mogi") and not scheduler.is_scheduled("cancelled")
+        await asyncio.sleep(0.1)
+        assert ran == ["second"]
+        scheduler.close()
+    asyncio.run(run())
@@ -0,0 +1,208 @@
+import asyncio
+import discord
+from datetime import datetime, timezone
+from models import BotConfig, ServerConfig, LeaderboardConfig, LoungeAPISettings, Mogi
+from util import LoungeClient, compile_config
+from util import Journal as jr
+from cogs.SquadQueue import SquadQueue
+
+GUILD_ID = 1 << 22
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+def player(member_id: int, mmr: int):
+    return jr.PlayerState(member_id, f"Player {member_id}", mmr, False, 0)
+
+def mogi_state(channel_id: int, sq_id: int, leaderboard: str = "mk8dx"):
+    return jr.MogiState(sq_id, 2, 12, GUILD_ID, channel_id, leaderboard, True, True, False, False, None, None)
+
+def test_apply_record():
+    snapshot = jr.Snapshot(ongoing=[mogi_state(10, 1)])
+    records = [jr.TeamAdded(10, jr.TeamState([player(1, 5000), player(2, 6000)], NOW, None)),
+               jr.TeamAdded(10, jr.TeamState([player(3, 4000), player(4, 3000)], NOW, None)),
+               jr.PlayerConfirmed(10, 0, 1, NOW),
+               jr.PlayerSubbed(10, 1, 0, player(5, 4500)),
+               jr.RoomsMade(10, [jr.RoomState(1, 100, [0, 1])]),
+               jr.ScoreRecorded(10, 0, 0, 80),
+               jr.RoomSubmitted(10, 100, 7),
+               jr.TeamRemoved(10, 0),
+               jr.MogiStatus(10, False, False, True),
+               # records for channels without an ongoing mogi are ignored
+               jr.TeamAdded(11, jr.TeamState([player(6, 1000)], NOW, None))]
+    for record in records:
+        jr.apply_record(snapshot, record)
+    mogi = snapshot.ongoing[0]
+    assert [[p.member_id for p in t.players] for t in mogi.teams] == [[5, 4]]
+    assert mogi.rooms == [jr.RoomState(1, 100, [0], 7)]
+    assert (mogi.gathering, mogi.making_rooms_run) == (False, True)
+    jr.apply_record(snapshot, jr.MogiEnded(10))
+    assert snapshot.ongoing == []
+
+def test_scheduled_records():
+    snapshot = jr.Snapshot()
+    first, second = mogi_state(10, 1), mogi_state(10, 2)
+    first.start_time = second.start_time = NOW
+    jr.apply_record(snapshot, jr.EventScheduled(first))
+    jr.apply_record(snapshot, jr.EventsScheduled([second]))
+    jr.apply_record(snapshot, jr.DiscordEventCreated(GUILD_ID, 2, NOW, 99))
+    jr.apply_record(snapshot, jr.EventRemoved(GUILD_ID, 1, NOW))
+    assert [(m.sq_id, m.discord_event_id) for m in snapshot.scheduled] == [(2, 99)]
+
+def test_replay_snapshot_and_journal(tmp_path):
+    journal = jr.StateJournal(str(tmp_path))
+    journal.open()
+    journal.append(jr.MogiStarted(mogi_state(10, 1)))
+    journal.append(jr.TeamAdded(10, jr.TeamState([player(1, 5000)], NOW, None)))
+    journal.write_snapshot(jr.StateJournal(str(tmp_path)).recover())
+    # written after the snapshot, so these are replayed on top of it
+    journal.append(jr.TeamAdded(10, jr.TeamState([player(2, 6000)], NOW, None)))
+    journal.append(jr.PlayerConfirmed(10, 1, 0, NOW))
+    journal.close()
+    # a write that was cut off by a crash is dropped
+    with open(tmp_path / "journal.bin", "ab") as f:
+        f.write(b"\x00\x00\x01\x00abc")
+    recovered = jr.StateJournal(str(tmp_path)).recover()
+    assert recovered.seq == 4
+    mogi = recovered.ongoing[0]
+    assert [[p.member_id for p in t.players] for t in mogi.teams] == [[1], [2]]
+    assert mogi.teams[1].players[0].confirmed and mogi.teams[1].confirmed_at == NOW
+
+class FakeGuild:
+    id = GUILD_ID
+
+class FakeChannel(discord.TextChannel):
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.guild = FakeGuild() # type: ignore
+
+    def __hash__(self):
+        return self.id
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+class FakeBot:
+    shard_count = None
+
+    def __init__(self, config: BotConfig, channels: list[FakeChannel]):
+        self.config = config
+        self.guild_index = compile_config(config)
+        self.lounge_client = LoungeClient(config.lounge_api)
+        self.channels = {channel.id: channel for channel in channels}
+
+    async def wait_until_ready(self):
+        pass
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id, None)
+
+    def get_guild(self, guild_id: int):
+        return None
+
+def make_config(state_dir: str, lb: LeaderboardConfig):
+    return BotConfig("token", 1, {GUILD_ID: ServerConfig([], [], {"mk8dx": lb})}, LoungeAPISettings(), state_dir=state_dir)
+
+async def start_cog(config: BotConfig, channels: list[FakeChannel]):
+    cog = SquadQueue(FakeBot(config, channels)) # type: ignore
+    cog.list_task.cancel()
+    await cog._restore_task
+    return cog
+
+def test_restore_from_snapshot_and_journal(tmp_path, make_leaderboard):
+    async def run():
+        config = make_config(str(tmp_path), make_leaderboard(join_channel=10, list_channel=20))
+        journal = jr.StateJournal(config.state_dir)
+        journal.open()
+        gone = mogi_state(11, 2)
+        renamed = mogi_state(12, 3, leaderboard="old name")
+        journal.write_snapshot(jr.Snapshot(ongoing=[mogi_state(10, 1), gone, renamed], list_messages={21: [500, 501]}))
+        journal.append(jr.TeamAdded(10, jr.TeamState([player(1, 5000), player(2, 6000)], NOW, NOW)))
+        journal.append(jr.TeamAdded(11, jr.TeamState([player(3, 4000), player(4, 3000)], NOW, None)))
+        journal.append(jr.RoomsMade(10, [jr.RoomState(1, 100, [0])]))
+        journal.close()
+
+        # only the first mogi's channel is cached
+        channel = FakeChannel(10)
+        cog = await start_cog(config, [channel])
+        mogi = cog.get_shard(GUILD_ID).ongoing_events[channel]
+        assert mogi.sq_id == 1
+        assert [[p.member_id for p in t.players] for t in mogi.teams] == [[1, 2]]
+        assert cog.room_threads[100] == (mogi, mogi.rooms[0])
+        assert mogi.rooms[0].teams == [mogi.teams[0]]
+        # the other mogis couldn't be restored, so the new snapshot keeps them as they were
+        assert [m.sq_id for m in cog.unrestored.ongoing] == [2, 3]
+        await cog.cog_unload()
+
+        kept = jr.StateJournal(config.state_dir).recover()
+        assert sorted(m.sq_id for m in kept.ongoing) == [1, 2, 3]
+        assert [[p.member_id for p in t.players] for m in kept.ongoing if m.sq_id == 2 for t in m.teams] == [[3, 4]]
+        assert kept.list_messages == {21: [500, 501]}
+
+        # once its channel is back, the mogi is restored after the next restart
+        cog = await start_cog(config, [channel, FakeChannel(11)])
+        assert {m.sq_id for m in cog.ongoing_mogis()} == {1, 2}
+        assert [m.sq_id for m in cog.unrestored.ongoing] == [3]
+        await cog.cog_unload()
+    asyncio.run(run())
+
+def test_new_mogi_replaces_unrestored_one(tmp_path, make_leaderboard):
+    async def run():
+        config = make_config(str(tmp_path), make_leaderboard(join_channel=10, list_channel=20))
+        journal = jr.StateJournal(config.state_dir)
+        journal.open()
+        journal.write_snapshot(jr.Snapshot(ongoing=[mogi_state(10, 1)]))
+        journal.close()
+        cog = await start_cog(config, [])
+        assert [m.sq_id for m in cog.unrestored.ongoing] == [1]
+        # a mogi started later in the same channel is newer than the one that couldn't be restored
+        channel = FakeChannel(10)
+        cog.get_shard(GUILD_ID).ongoing_events[channel] = Mogi(5, 2, 12, channel, config.servers[GUILD_ID].leaderboards["mk8dx"])
+        await cog.cog_unload()
+        assert [m.sq_id for m in jr.StateJournal(config.state_dir).recover().ongoing] == [5]
+    asyncio.run(run())
+
+def test_spare_threads_survive_a_restart(tmp_path, make_leaderboard):
+    async def run():
+        config = make_config(str(tmp_path), make_leaderboard(join_channel=10, list_channel=20))
+        journal = jr.StateJournal(config.state_dir)
+        journal.open()
+        journal.write_snapshot(jr.Snapshot(ongoing=[mogi_state(10, 1)]))
+        journal.append(jr.RoomAdded(10, jr.RoomState(1, 100, [])))
+        journal.append(jr.RoomAdded(10, jr.RoomState(2, 101, [])))
+        journal.append(jr.RoomsReleased(10, [100, 101]))
+        journal.append(jr.MogiEnded(10))
+        journal.append(jr.MogiStarted(mogi_state(10, 2)))
+        # the next mogi in the channel renamed one of the spare threads for its first room
+        journal.append(jr.RoomAdded(10, jr.RoomState(1, 101, [])))
+        journal.close()
+        assert jr.StateJournal(config.state_dir).recover().spare_threads == [jr.SpareThread(GUILD_ID, 10, 100)]
+
+        channel = FakeChannel(10)
+        cog = await start_cog(config, [channel])
+        assert cog.thread_planner.count_spares(channel) == 1
+        assert cog.thread_planner.take_spare(channel) == 100
+        cog.thread_planner.release(GUILD_ID, 10, [102])
+        await cog.cog_unload()
+        assert jr.StateJournal(config.state_dir).recover().spare_threads == [jr.SpareThread(GUILD_ID, 10, 102)]
+    asyncio.run(run())
+
+def test_appends_in_one_iteration_share_an_fsync(tmp_path, monkeypatch):
+    synced: list[int] = []
+    real_fsync = jr.os.fsync
+    def fsync(fd: int):
+        synced.append(fd)
+        real_fsync(fd)
+    monkeypatch.setattr(jr.os, "fsync", fsync)
+    async def run():
+        journal = jr.StateJournal(str(tmp_path))
+        journal.open()
+        journal.append(jr.MogiStarted(mogi_state(10, 1)))
+        journal.append(jr.MogiStatus(10, False, False, True))
+        assert synced == []
+        # the fsync runs before anything awaited after the appends
+        await asyncio.sleep(0)
+        assert len(synced) == 1
+        journal.append(jr.MogiEnded(10))
+        journal.close()
+        assert len(synced) == 2
+        assert [entry.seq for entry in journal.read_entries()] == [1, 2, 3]
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import random
+from benchmarks.list_render import old_get_list_messages, build_mogi
+from cogs.SquadQueue import SquadQueue
+from models import Player, Team
+
+def make_cog():
+    cog = SquadQueue.__new__(SquadQueue)
+    cog.list_cache = {}
+    return cog
+
+def test_matches_the_old_renderer():
+    cog = make_cog()
+    # empty, partly full, exactly full and multi-page lists, for every format
+    for size in (1, 2, 3, 4, 6):
+        for num_teams in (0, 1, 12 // size - 1, 12 // size, 12 // size + 1, 23, 300):
+            mogi = build_mogi(num_teams, size, 12, random.Random(num_teams))
+            assert cog.render_list_messages(mogi) == old_get_list_messages(mogi), (size, num_teams)
+
+def test_late_teams_are_marked():
+    cog = make_cog()
+    mogi = build_mogi(13, 1, 12, random.Random(1))
+    messages = cog.render_list_messages(mogi)
+    # 13 players fill one room of 12, so the one who confirmed last is late
+    assert "".join(messages).count("`*`") == 1
+    assert messages == old_get_list_messages(mogi)
+
+def test_list_is_rendered_again_after_changes():
+    cog = make_cog()
+    rng = random.Random(2)
+    mogi = build_mogi(40, 2, 12, rng)
+    messages = cog.get_list_messages(mogi)
+    # nothing changed, so the same pages are returned without rendering them again
+    assert cog.get_list_messages(mogi) is messages
+
+    team = mogi.teams[5]
+    mogi.remove_team(team)
+    messages = cog.get_list_messages(mogi)
+    assert messages == old_get_list_messages(mogi)
+
+    team = Team([Player(1000, "Player 1000", 9000), Player(1001, "Player 1001", 100)])
+    mogi.add_team(team)
+    assert cog.get_list_messages(mogi) == old_get_list_messages(mogi)
+    for player in team.players:
+        mogi.confirm_player(team, player)
+    messages = cog.get_list_messages(mogi)
+    assert "Player 1000, Player 1001" in "".join(messages)
+    assert messages == old_get_list_messages(mogi)
@@ -0,0 +1,88 @@
+import asyncio
+import discord
+import heapq
+from util.MessageScheduler import MessageScheduler, ChannelQueue, PRIORITY_HIGH, PRIORITY_NORMAL, MAX_MESSAGE_LENGTH
+
+class FakeChannel:
+    def __init__(self, channel_id: int = 1, rate_limits: int = 0):
+        self.id = channel_id
+        self.rate_limits = rate_limits
+        self.sent: list[str] = []
+
+    async def send(self, msg: str):
+        if self.rate_limits > 0:
+            self.rate_limits -= 1
+            raise discord.RateLimited(0.01)
+        self.sent.append(msg)
+
+def make_queue(scheduler: MessageScheduler, *msgs: str, priority: int = PRIORITY_NORMAL):
+    queue = ChannelQueue(FakeChannel())
+    for msg in msgs:
+        heapq.heappush(queue.messages, (priority, next(scheduler.counter), msg))
+    return queue
+
+def test_pack_joins_messages_in_order():
+    scheduler = MessageScheduler()
+    queue = make_queue(scheduler, "a", "b")
+    heapq.heappush(queue.messages, (PRIORITY_HIGH, next(scheduler.counter), "room"))
+    assert scheduler.pack(queue) == ("room\na\nb", None)
+    assert queue.messages == []
+
+def test_pack_stops_at_the_length_limit():
+    scheduler = MessageScheduler()
+    # two of these fit in one message with the line break between them, but not three
+    queue = make_queue(scheduler, "x" * 999, "y" * 999, "z")
+    msg, overflow = scheduler.pack(queue)
+    assert msg == "x" * 999 + "\n" + "y" * 999
+    assert len(msg) <= MAX_MESSAGE_LENGTH and overflow is None
+    assert scheduler.pack(queue) == ("z", None)
+
+def test_pack_splits_long_messages():
+    scheduler = MessageScheduler()
+    lines = [f"line {i} " + "x" * 40 for i in range(100)]
+    long_msg = "\n".join(lines)
+    queue = make_queue(scheduler, "short", long_msg)
+    # the long message isn't joined onto the short one
+    assert scheduler.pack(queue) == ("short", None)
+    msg, overflow = scheduler.pack(queue)
+    assert len(msg) <= MAX_MESSAGE_LENGTH
+    assert msg.endswith("x") and not overflow.startswith("\n") # type: ignore
+    assert msg + "\n" + overflow == long_msg
+    # without a line break the message is cut at the limit
+    queue = make_queue(scheduler, "x" * 2500)
+    assert scheduler.pack(queue) == ("x" * 2000, "x" * 500)
+
+def test_requeued_messages_go_first():
+    scheduler = MessageScheduler()
+    queue = make_queue(scheduler, "normal")
+    heapq.heappush(queue.messages, (PRIORITY_HIGH, next(scheduler.counter), "high"))
+    scheduler.requeue(queue, "overflow")
+    assert scheduler.pack(queue) == ("overflow\nhigh\nnormal", None)
+
+def test_full_queue_drops_newest_lowest_priority():
+    async def run():
+        scheduler = MessageScheduler(max_queued_messages=3)
+        channel = FakeChannel()
+        scheduler.enqueue(channel, "join 1", 60)
+        scheduler.enqueue(channel, "room", 60, PRIORITY_HIGH)
+        scheduler.enqueue(channel, "join 2", 60)
+        scheduler.enqueue(channel, "room 2", 60, PRIORITY_HIGH)
+        queue = scheduler.queues[channel.id]
+        assert sorted(m[2] for m in queue.messages) == ["join 1", "room", "room 2"]
+        scheduler.close()
+    asyncio.run(run())
+
+def test_messages_are_sent_after_rate_limits():
+    async def run():
+        scheduler = MessageScheduler()
+        channel = FakeChannel(rate_limits=1)
+        other = FakeChannel(2)
+        scheduler.enqueue(channel, "a", 0)
+        scheduler.enqueue(channel, "b", 0)
+        scheduler.enqueue(other, "c", 0)
+        tasks = [queue.task for queue in scheduler.queues.values()]
+        await asyncio.gather(*tasks) # type: ignore
+        assert channel.sent == ["a\nb"]
+        assert other.sent == ["c"]
+        assert scheduler.queues == {}
+    asyncio.run(run())
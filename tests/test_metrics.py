@@ -0,0 +1,30 @@
+import pytest
+from util.Metrics import Metric, Counter, Gauge, Histogram
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("sqbot_test", "A metric without a type") # type: ignore
+
+def test_counter_render():
+    counter = Counter("sqbot_test_total", "Things counted", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc('b"c')
+    assert counter.render() == ["# HELP sqbot_test_total Things counted", "# TYPE sqbot_test_total counter",
+                                'sqbot_test_total{kind="a"} 3', 'sqbot_test_total{kind="b\\"c"} 1']
+
+def test_gauge_function():
+    gauge = Gauge("sqbot_test_depth", "Queue depth", ("shard",))
+    gauge.set(5, "0")
+    gauge.set_function(lambda: {("1",): 2})
+    assert gauge.render()[2:] == ['sqbot_test_depth{shard="1"} 2']
+    gauge.set_function(None)
+    assert gauge.render()[2:] == ['sqbot_test_depth{shard="0"} 5']
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("sqbot_test_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == ['sqbot_test_seconds_bucket{le="0.1"} 1', 'sqbot_test_seconds_bucket{le="1.0"} 3',
+                                      'sqbot_test_seconds_bucket{le="+Inf"} 4', 'sqbot_test_seconds_sum 3.05',
+                                      'sqbot_test_seconds_count 4']
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from aiohttp import web
+from models import LoungeAPISettings
+from util.mmr import MMRCache, LoungeClient
+
+def test_entries_expire():
+    cache = MMRCache(ttl=60, max_size=10, stale_ttl=600)
+    cache.set(1, "Player 1", 5000)
+    assert cache.get(1) == ("Player 1", 5000)
+    # moved back in time, as if it was stored two minutes ago
+    expires_at, name, mmr = cache.entries[1]
+    cache.entries[1] = (expires_at - 120, name, mmr)
+    assert cache.get(1) is None
+    # an expired entry is still used while the Lounge API is unavailable
+    assert cache.get_stale(1) == ("Player 1", 5000)
+    cache.entries[1] = (time.monotonic() - 1000, name, mmr)
+    assert cache.get_stale(1) is None
+
+def test_least_recently_used_is_evicted():
+    cache = MMRCache(ttl=60, max_size=2)
+    cache.set(1, "Player 1", 1000)
+    cache.set(2, "Player 2", 2000)
+    cache.get(1)
+    cache.set(3, "Player 3", 3000)
+    assert cache.get(2) is None
+    assert cache.get(1) == ("Player 1", 1000)
+    assert cache.get(3) == ("Player 3", 3000)
+
+def test_invalidate():
+    cache = MMRCache(ttl=60, max_size=10)
+    cache.set(1, "Player 1", 1000)
+    cache.set(2, "Player 2", 2000)
+    generation = cache.generation
+    cache.invalidate([1])
+    assert cache.get(1) is None and cache.get(2) is not None
+    cache.invalidate()
+    assert cache.entries == {}
+    assert cache.generation == generation + 2
+
+def test_lookups_share_requests_and_the_cache(make_leaderboard):
+    async def run():
+        requests: list[int] = []
+        async def handle_player(request: web.Request):
+            discord_id = int(request.query["discordId"])
+            requests.append(discord_id)
+            await asyncio.sleep(0.05)
+            if discord_id == 404:
+                return web.json_response({}, status=404)
+            return web.json_response({"name": f"Player {discord_id}", "mmr": discord_id * 10})
+        app = web.Application()
+        app.router.add_get("/api/player", handle_player)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1] # type: ignore
+        client = LoungeClient(LoungeAPISettings())
+        await client.start()
+        try:
+            lb = make_leaderboard(f"http://127.0.0.1:{port}")
+            # lookups for the same player at the same time make one request
+            results = await asyncio.gather(*[client.lookup(lb, 1) for _ in range(5)])
+            assert results == [("Player 1", 10)] * 5
+            assert requests == [1]
+            # and later lookups are served from the cache
+            assert await client.lookup(lb, 1) == ("Player 1", 10)
+            assert requests == [1]
+            # leaderboards on the same site and game share their cache, but not with other games
+            assert await client.lookup(make_leaderboard(f"http://127.0.0.1:{port}"), 1) == ("Player 1", 10)
+            assert await client.lookup(make_leaderboard(f"http://127.0.0.1:{port}", "mkworld"), 1) == ("Player 1", 10)
+            assert requests == [1, 1]
+            # invalidated players are requested again
+            client.invalidate(lb, [1])
+            await client.lookup(lb, 1)
+            assert requests == [1, 1, 1]
+            assert await client.lookup(lb, 404) is None
+        finally:
+            await client.close()
+            await runner.cleanup()
+    asyncio.run(run())
@@ -0,0 +1,144 @@
+import discord
+import random
+from models import Mogi, Team, Player
+
+class FakeChannel:
+    id = 1
+
+def make_mogi(size: int = 2, room_size: int = 12):
+    return Mogi(1, size, room_size, FakeChannel(), None) # type: ignore
+
+def make_team(*players: tuple[int, int], confirmed: bool = False):
+    team = Team([Player(member_id, f"Player {member_id}", mmr) for member_id, mmr in players])
+    for player in team.players:
+        player.confirmed = confirmed
+    return team
+
+def member(member_id: int):
+    return discord.Object(member_id)
+
+def test_team_index_follows_team_changes():
+    mogi = make_mogi()
+    team = make_team((1, 5000), (2, 6000))
+    mogi.add_team(team)
+    assert mogi.check_player(member(1)) is team
+    assert mogi.check_player(member(2)) is team
+    assert mogi.check_player(member(3)) is None
+
+    team.add_players([Player(3, "Player 3", 7000)])
+    assert mogi.check_player(member(3)) is team
+    team.remove_players([team.get_player(member(1))]) # type: ignore
+    assert mogi.check_player(member(1)) is None
+    team.sub_player(team.get_player(member(2)), Player(4, "Player 4", 4000)) # type: ignore
+    assert mogi.check_player(member(2)) is None
+    assert mogi.check_player(member(4)) is team
+    assert team.get_player(member(4)).lounge_name == "Player 4" # type: ignore
+
+    mogi.remove_team(team)
+    assert mogi.team_index == {}
+    assert team.mogi is None
+
+def test_team_index_keeps_a_players_new_team():
+    mogi = make_mogi()
+    old_team = make_team((1, 5000), (2, 6000))
+    new_team = make_team((1, 5000), (3, 6000))
+    mogi.add_team(old_team)
+    mogi.add_team(new_team)
+    # removing the old team doesn't unindex a player who is now in another team
+    mogi.remove_team(old_team)
+    assert mogi.check_player(member(1)) is new_team
+    assert mogi.check_player(member(2)) is None
+
+def reference_lists(mogi: Mogi):
+    # how the lists were built before they were kept sorted: a stable sort of the registered teams
+    registered = sorted((t for t in mogi.teams if mogi.check_team_is_registered(t)), key=lambda t: t.confirmed_at)
+    return registered, sorted(registered, key=lambda t: -t.avg_mmr)
+
+def test_registration_order():
+    mogi = make_mogi()
+    low = make_team((1, 1000), (2, 1000))
+    high = make_team((3, 9000), (4, 9000))
+    middle = make_team((5, 5000), (6, 5000))
+    for team in (low, high, middle):
+        mogi.add_team(team)
+    assert mogi.count_registered() == 0
+    for team in (middle, low, high):
+        for player in team.players:
+            mogi.confirm_player(team, player)
+    assert mogi.confirmed_list() == [middle, low, high]
+    assert mogi.mmr_list() == [high, middle, low]
+    assert mogi.count_registered() == 3
+
+def test_equal_mmr_is_broken_by_confirmation_order():
+    mogi = make_mogi()
+    teams = [make_team((i * 2 + 1, 5000), (i * 2 + 2, 5000)) for i in range(4)]
+    for team in teams:
+        mogi.add_team(team)
+    for team in reversed(teams):
+        for player in team.players:
+            mogi.confirm_player(team, player)
+    assert mogi.mmr_list() == list(reversed(teams))
+    # teams restored with the same confirmation time keep the order they registered in
+    restored = make_mogi()
+    confirmed_at = teams[0].confirmed_at
+    for team in teams:
+        copy = make_team(*[(p.member_id, p.mmr) for p in team.players], confirmed=True)
+        copy.confirmed_at = confirmed_at
+        restored.add_team(copy)
+    assert [str(t) for t in restored.confirmed_list()] == [str(t) for t in teams]
+    assert [str(t) for t in restored.mmr_list()] == [str(t) for t in teams]
+
+def test_team_leaves_and_rejoins_the_list():
+    mogi = make_mogi()
+    first = make_team((1, 3000), (2, 3000), confirmed=True)
+    second = make_team((3, 4000), (4, 4000), confirmed=True)
+    mogi.add_team(first)
+    mogi.add_team(second)
+    version = mogi.version
+    # a player leaving unregisters the team
+    first.remove_players([first.players[1]])
+    assert mogi.confirmed_list() == [second]
+    assert mogi.version > version
+    # and it goes to the back of the list once it's full and confirmed again
+    first.add_players([Player(5, "Player 5", 9000)])
+    mogi.confirm_player(first, first.players[1])
+    assert mogi.confirmed_list() == [second, first]
+    assert mogi.mmr_list() == [first, second]
+    assert mogi.remove_id(1) is second
+    assert mogi.confirmed_list() == [first]
+    assert mogi.remove_id(2) is None
+
+def test_lists_match_a_full_sort():
+    rng = random.Random(5)
+    mogi = make_mogi()
+    next_id = 1
+    for _ in range(500):
+        action = rng.random()
+        if action < 0.4 or not mogi.teams:
+            team = make_team((next_id, rng.choice([1000, 2000, 3000])), (next_id + 1, rng.choice([1000, 2000, 3000])))
+            next_id += 2
+            mogi.add_team(team)
+        elif action < 0.7:
+            team = rng.choice(mogi.teams)
+            for player in team.get_unconfirmed():
+                mogi.confirm_player(team, player)
+        elif action < 0.85:
+            mogi.remove_team(rng.choice(mogi.teams))
+        else:
+            team = rng.choice(mogi.teams)
+            team.sub_player(team.players[0], Player(next_id, f"Player {next_id}", rng.choice([1000, 2000, 3000])))
+            next_id += 1
+        by_time, by_mmr = reference_lists(mogi)
+        assert mogi.confirmed_list() == by_time
+        assert mogi.mmr_list() == by_mmr
+
+def test_team_positions_follow_team_list():
+    mogi = make_mogi()
+    teams = [make_team((2 * i + 1, 5000), (2 * i + 2, 6000)) for i in range(5)]
+    for team in teams:
+        mogi.add_team(team)
+    mogi.remove_team(teams[1])
+    mogi.remove_team(teams[4])
+    mogi.add_team(teams[1])
+    assert mogi.team_positions == {team: i for i, team in enumerate(mogi.teams)}
+    assert mogi.teams == [teams[0], teams[2], teams[3], teams[1]]
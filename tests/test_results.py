@@ -0,0 +1,42 @@
+from models import Player, Team, Room
+from util.Results import expected_total, room_error
+
+def make_room(scores: list[int], team_size: int = 2):
+    players = [Player(i + 1, f"Player {i + 1}", 5000) for i in range(len(scores))]
+    for player, score in zip(players, scores):
+        player.score = score
+    teams = [Team(players[i:i+team_size]) for i in range(0, len(players), team_size)]
+    return Room(teams, 1, 100)
+
+def split_total(total: int, num_players: int):
+    scores = [total // num_players] * num_players
+    scores[0] += total - sum(scores)
+    return scores
+
+def test_expected_total_for_the_default_room(make_leaderboard):
+    lb = make_leaderboard(valid_room_sizes=[12, 24])
+    assert expected_total(lb, 12) == 82 * 12
+    assert expected_total(lb, 24) is None
+
+def test_expected_total_keyed_by_room_size(make_leaderboard):
+    lb = make_leaderboard(valid_room_sizes=[12, 24], points_per_race={12: 82, 24: 144})
+    assert expected_total(lb, 12) == 82 * 12
+    assert expected_total(lb, 24) == 144 * 12
+    assert expected_total(lb, 8) is None
+
+def test_room_of_a_non_default_size_validates(make_leaderboard):
+    lb = make_leaderboard(valid_room_sizes=[12, 24], points_per_race={12: 82, 24: 144})
+    assert room_error(lb, make_room(split_total(144 * 12, 24))) is None
+    assert room_error(lb, make_room(split_total(144 * 12 - 1, 24))) == f"the scores add up to {144 * 12 - 1} instead of {144 * 12}"
+
+def test_room_size_without_points(make_leaderboard):
+    room = make_room(split_total(144 * 12, 24))
+    assert room_error(make_leaderboard(valid_room_sizes=[12, 24]), room) == "points_per_race isn't set for rooms of 24 players"
+
+def test_room_errors(make_leaderboard):
+    lb = make_leaderboard(valid_room_sizes=[12, 24])
+    assert room_error(lb, Room([], 1, 100)) == "nobody played in this room"
+    scores = split_total(82 * 12, 12)
+    assert room_error(lb, make_room(scores)) is None
+    scores[3] = 0
+    assert room_error(lb, make_room(scores)) == "no score for Player 4"
@@ -0,0 +1,101 @@
+import itertools
+import random
+from util.RoomAssignment import ROOM_ASSIGNMENT_ENGINES, assign_rooms
+
+LATE_PENALTY = 500
+
+def partitions(indexes: list[int], teams_per_room: int):
+    """Every way of splitting indexes into rooms of teams_per_room teams"""
+    if not indexes:
+        yield []
+        return
+    first, rest = indexes[0], indexes[1:]
+    for others in itertools.combinations(rest, teams_per_room - 1):
+        remaining = [i for i in rest if i not in others]
+        for rooms in partitions(remaining, teams_per_room):
+            yield [[first, *others]] + rooms
+
+def spreads(mmrs: list[float], rooms: list[list[int]]):
+    return [max(mmrs[i] for i in room) - min(mmrs[i] for i in room) for room in rooms]
+
+def left_out_in_time(rooms: list[list[int]], num_teams: int):
+    return num_teams - sum(1 for room in rooms for i in room if i < num_teams)
+
+def total_cost(mmrs: list[float], rooms: list[list[int]], num_teams: int):
+    return sum(spreads(mmrs, rooms)) + LATE_PENALTY * left_out_in_time(rooms, num_teams)
+
+def minimax_cost(mmrs: list[float], rooms: list[list[int]], num_teams: int):
+    return (max(spreads(mmrs, rooms)), left_out_in_time(rooms, num_teams))
+
+def brute_force(mmrs: list[float], teams_per_room: int, num_rooms: int, cost):
+    num_teams = teams_per_room * num_rooms
+    best = None
+    for chosen in itertools.combinations(range(len(mmrs)), num_teams):
+        for rooms in partitions(list(chosen), teams_per_room):
+            rooms_cost = cost(mmrs, rooms, num_teams)
+            if best is None or rooms_cost < best:
+                best = rooms_cost
+    return best
+
+def check_valid(mmrs: list[float], rooms: list[list[int]], teams_per_room: int, num_rooms: int):
+    assert len(rooms) == num_rooms
+    assert all(len(room) == teams_per_room for room in rooms)
+    teams = [i for room in rooms for i in room]
+    assert len(set(teams)) == len(teams)
+    assert all(0 <= i < len(mmrs) for i in teams)
+    # rooms are ordered from highest to lowest MMR, as are the teams inside them
+    for room in rooms:
+        assert [mmrs[i] for i in room] == sorted((mmrs[i] for i in room), reverse=True)
+    room_mmrs = [mmrs[room[0]] for room in rooms]
+    assert room_mmrs == sorted(room_mmrs, reverse=True)
+
+def random_cases(trials: int):
+    rng = random.Random(7)
+    for _ in range(trials):
+        teams_per_room = rng.randint(1, 3)
+        num_rooms = rng.randint(1, 6 // teams_per_room)
+        num_registered = num_rooms * teams_per_room + rng.randint(0, min(3, teams_per_room + 1))
+        # a narrow range makes ties likely, and a wide one makes leaving out on-time teams worth it
+        scale = rng.choice([5, 1000, 3000])
+        mmrs = [float(rng.randint(0, scale)) for _ in range(num_registered)]
+        yield mmrs, teams_per_room, num_rooms
+
+def test_engines_make_valid_rooms():
+    for mmrs, teams_per_room, num_rooms in random_cases(200):
+        for engine in ROOM_ASSIGNMENT_ENGINES:
+            check_valid(mmrs, assign_rooms(engine, mmrs, teams_per_room, num_rooms, LATE_PENALTY), teams_per_room, num_rooms)
+
+def test_contiguous_keeps_every_team_that_confirmed_in_time():
+    for mmrs, teams_per_room, num_rooms in random_cases(200):
+        rooms = assign_rooms("contiguous", mmrs, teams_per_room, num_rooms, LATE_PENALTY)
+        assert left_out_in_time(rooms, teams_per_room * num_rooms) == 0
+        # with nobody left out, splitting by MMR is the best any assignment can do
+        def in_time_cost(mmrs, rooms, num_teams):
+            return total_cost(mmrs, rooms, num_teams) if left_out_in_time(rooms, num_teams) == 0 else float('inf')
+        assert total_cost(mmrs, rooms, teams_per_room * num_rooms) == brute_force(mmrs, teams_per_room, num_rooms, in_time_cost)
+
+def test_penalized_matches_brute_force():
+    for mmrs, teams_per_room, num_rooms in random_cases(200):
+        num_teams = teams_per_room * num_rooms
+        rooms = assign_rooms("penalized", mmrs, teams_per_room, num_rooms, LATE_PENALTY)
+        assert total_cost(mmrs, rooms, num_teams) == brute_force(mmrs, teams_per_room, num_rooms, total_cost)
+
+def test_min_spread_matches_brute_force():
+    for mmrs, teams_per_room, num_rooms in random_cases(200):
+        num_teams = teams_per_room * num_rooms
+        rooms = assign_rooms("min_spread", mmrs, teams_per_room, num_rooms, LATE_PENALTY)
+        assert minimax_cost(mmrs, rooms, num_teams) == brute_force(mmrs, teams_per_room, num_rooms, minimax_cost)
+
+def test_penalized_skips_a_late_team_inside_a_room():
+    # the late team at 2995 is between the two on-time teams of the top room, but sits out
+    mmrs = [3000, 2990, 2000, 1990, 2995]
+    rooms = assign_rooms("penalized", mmrs, 2, 2, LATE_PENALTY)
+    assert rooms == [[0, 1], [2, 3]]
+
+def test_penalized_never_costs_more_than_contiguous():
+    rng = random.Random(3)
+    for _ in range(300):
+        mmrs = [rng.uniform(0, 15000) for _ in range(29)]
+        contiguous = assign_rooms("contiguous", mmrs, 4, 7, LATE_PENALTY)
+        penalized = assign_rooms("penalized", mmrs, 4, 7, LATE_PENALTY)
+        assert total_cost(mmrs, penalized, 28) <= total_cost(mmrs, contiguous, 28) + 1e-6
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from util.ScheduleImport import parse_schedule, ScheduleRow, EventBatch, ScheduledEventWorker, MAX_IMPORT_ROWS
+
+def test_csv_rows():
+    data = ("sq_id,room_size,format,time,timezone,leaderboard\n"
+            "1,12,2,2026-10-20 10:00,UTC,mk8dx\n"
+            " 2 , 12 , 4 ,2026-10-20 11:00, UTC ,\n").encode()
+    rows, errors = parse_schedule("schedule.csv", data)
+    assert errors == []
+    assert rows == [ScheduleRow(1, 12, 2, "2026-10-20 10:00", "UTC", "mk8dx"),
+                    ScheduleRow(2, 12, 4, "2026-10-20 11:00", "UTC", None)]
+
+def test_csv_with_byte_order_mark():
+    data = "\ufeffsq_id,room_size,format,time,timezone\n1,12,2,2026-10-20 10:00,UTC\n".encode("utf-8")
+    rows, errors = parse_schedule("schedule.CSV", data)
+    assert errors == []
+    assert rows[0].sq_id == 1
+
+def test_json_rows():
+    data = json.dumps([{"sq_id": 1, "room_size": 12, "format": 2, "time": "2026-10-20 10:00", "timezone": "UTC"},
+                       {"sq_id": 2, "room_size": 24, "format": 1, "time": "2026-10-20 11:00", "timezone": "EST",
+                        "leaderboard": "mk8dx"}]).encode()
+    rows, errors = parse_schedule("schedule.json", data)
+    assert errors == []
+    assert rows == [ScheduleRow(1, 12, 2, "2026-10-20 10:00", "UTC"),
+                    ScheduleRow(2, 24, 1, "2026-10-20 11:00", "EST", "mk8dx")]
+
+def test_bad_rows_are_reported_by_row_number():
+    data = json.dumps([{"sq_id": 1, "room_size": 12, "format": 2, "time": "2026-10-20 10:00", "timezone": "UTC"},
+                       {"sq_id": "x", "room_size": 12, "format": 2, "time": "2026-10-20 10:00", "timezone": "UTC"},
+                       {"sq_id": 3, "room_size": 12, "format": 2, "time": "2026-10-20 10:00", "timezone": "UTC", "extra": 1},
+                       {"sq_id": 4}]).encode()
+    rows, errors = parse_schedule("schedule.json", data)
+    assert [row.sq_id for row in rows] == [1]
+    assert len(errors) == 3
+    assert errors[0].startswith("Row 2:")
+    assert "extra" in errors[1] and errors[1].startswith("Row 3:")
+    assert errors[2].startswith("Row 4:")
+
+def test_unreadable_file():
+    rows, errors = parse_schedule("schedule.json", b"{not json")
+    assert rows == []
+    assert errors[0].startswith("Couldn't read the file")
+    rows, errors = parse_schedule("schedule.csv", b"\xff\xfe\x00bad")
+    assert rows == []
+    assert errors[0].startswith("Couldn't read the file")
+
+def test_too_many_rows():
+    data = ("sq_id,room_size,format,time,timezone\n" +
+            "".join(f"{i},12,2,2026-10-20 10:00,UTC\n" for i in range(MAX_IMPORT_ROWS + 1))).encode()
+    rows, errors = parse_schedule("schedule.csv", data)
+    assert rows == []
+    assert errors == [f"The file has {MAX_IMPORT_ROWS + 1} events; at most {MAX_IMPORT_ROWS} can be imported at once"]
+
+def test_worker_runs_batches_in_order_and_counts_outcomes():
+    async def run():
+        done: list[int] = []
+        def job(i: int, outcome: bool | None):
+            async def create():
+                done.append(i)
+                if outcome is None:
+                    raise RuntimeError("discord error")
+                return outcome
+            return create
+        first = EventBatch([job(1, True), job(2, False), job(3, None)])
+        second = EventBatch([job(4, True)])
+        worker = ScheduledEventWorker(interval=0)
+        worker.submit(first)
+        worker.submit(second)
+        assert worker.pending() == 4
+        assert worker.task is not None
+        await worker.task
+        assert done == [1, 2, 3, 4]
+        assert (first.created, first.skipped, first.failed) == (1, 1, 1)
+        assert first.done() and second.done()
+        assert worker.pending() == 0
+    asyncio.run(run())
@@ -1,9 +1,70 @@
-from models import BotConfig
-import json
+from models import BotConfig, ServerConfig, LeaderboardConfig
+from discord import app_commands
 import msgspec
 
+CONFIG_PATH = './config.json'
+
+# discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+
 def get_config(filename: str):
-    with open(filename, 'r') as cjson:
-        config_body = json.load(cjson)
-    config = msgspec.convert(config_body, BotConfig, strict=False)
+    with open(filename, 'rb') as cjson:
+        config = msgspec.json.decode(cjson.read(), type=BotConfig, strict=False)
     return config
+
+def format_name(size: int):
+    return f"{size}v{size}" if size > 1 else "FFA"
+
+class GuildIndex:
+    """Everything the commands and autocompletes look up in a guild's config, worked out once
+       when the config is loaded instead of on every command"""
+    def __init__(self, server: ServerConfig):
+        self.server = server
+        self.role_ids = frozenset(server.admin_roles + server.staff_roles)
+        self.leaderboards = server.leaderboards
+        # the leaderboard that's used when a command doesn't name one
+        self.default_leaderboard = next(iter(server.leaderboards.values())) if len(server.leaderboards) == 1 else None
+        # keys are join channel IDs, values are the name of the leaderboard that queues in that channel
+        self.join_channels: dict[int, str] = {lb.join_channel: name for name, lb in server.leaderboards.items()}
+        # the choices are kept with the lowercase text they're matched against
+        self.leaderboard_choices = [(name.lower(), app_commands.Choice(name=name, value=name))
+                                    for name in server.leaderboards]
+        formats = sorted({f for lb in server.leaderboards.values() for f in lb.valid_formats})
+        self.format_choices = [(format_name(f).lower(), app_commands.Choice(name=format_name(f), value=f)) for f in formats]
+        sizes = sorted({p for lb in server.leaderboards.values() for p in lb.valid_room_sizes})
+        self.room_size_choices = [(f"{p} players", app_commands.Choice(name=f"{p} players", value=p)) for p in sizes]
+
+    def get_leaderboard(self, lb: str | None) -> LeaderboardConfig | None:
+        if lb is None:
+            return self.default_leaderboard
+        if not lb:
+            return None
+        return self.leaderboards.get(lb, None)
+
+def filter_choices(choices: list[tuple[str, app_commands.Choice]], current: str):
+    current = current.lower()
+    return [choice for text, choice in choices if current in text][:MAX_CHOICES]
+
+def compile_config(config: BotConfig) -> dict[int, GuildIndex]:
+    """Returns the index of each guild's config, keyed by guild ID"""
+    return {guild_id: GuildIndex(server) for guild_id, server in config.servers.items()}
+
+def config_warnings(config: BotConfig):
+    """Returns a message for each setting that has no effect, or works against itself, with the rest of the config"""
+    warnings: list[str] = []
+    if not config.members.chunk_at_startup:
+        for guild_id, server in config.servers.items():
+            for name, lb in server.leaderboards.items():
+                # role members are only known when every member is loaded at startup
+                if lb.prefetch_role_ids:
+                    warnings.append(f"prefetch_role_ids of leaderboard {name} in server {guild_id} is ignored, "
+                                    "because members.chunk_at_startup is off")
+    prefetch = config.prefetch
+    if prefetch.enabled and prefetch.lead_time > 0:
+        # a prefetch's lookups have to outlive the prefetch itself and still be cached when the joins start
+        prefetch_seconds = prefetch.lead_time * 60 + prefetch.max_players / prefetch.requests_per_second
+        if prefetch_seconds >= config.lounge_api.cache_ttl:
+            warnings.append(f"prefetch.lead_time of {prefetch.lead_time} minutes plus the {prefetch.max_players / prefetch.requests_per_second:.0f} "
+                            f"seconds a prefetch of max_players takes is longer than lounge_api.cache_ttl of {config.lounge_api.cache_ttl} "
+                            "seconds, so prefetched players expire around the time the queue opens")
+    return warnings
@@ -0,0 +1,86 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Hashable
+from util import Metrics as metrics
+
+class DeadlineScheduler:
+    """Runs callbacks at their deadlines from a single task that sleeps until the earliest one.
+       Each callback is stored under a key; scheduling a key again replaces its deadline. Due
+       callbacks are started in deadline order, each in its own task. Naive deadlines are taken
+       to be in local time."""
+    def __init__(self):
+        # heap of (deadline, order, key); entries whose order doesn't match the key's current callback are stale
+        self.heap: list[tuple[datetime, int, Hashable]] = []
+        self.callbacks: dict[Hashable, tuple[int, Callable[[], Awaitable[None]]]] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        # callbacks that are running, kept so their tasks aren't garbage collected before they finish
+        self.running: set[asyncio.Task] = set()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        for task in self.running:
+            task.cancel()
+        self.running.clear()
+        self.heap.clear()
+        self.callbacks.clear()
+
+    def schedule(self, key: Hashable, when: datetime, callback: Callable[[], Awaitable[None]]):
+        order = next(self.counter)
+        self.callbacks[key] = (order, callback)
+        heapq.heappush(self.heap, (when.astimezone(timezone.utc), order, key))
+        # the runner only needs to wake up if this is the new earliest deadline
+        if self.heap[0][1] == order:
+            self.wakeup.set()
+
+    def cancel(self, key: Hashable):
+        # the heap entry is dropped once it reaches the top
+        self.callbacks.pop(key, None)
+
+    def is_scheduled(self, key: Hashable):
+        return key in self.callbacks
+
+    def is_current(self, entry: tuple[datetime, int, Hashable]):
+        current = self.callbacks.get(entry[2], None)
+        return current is not None and current[0] == entry[1]
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            while self.heap and not self.is_current(self.heap[0]):
+                heapq.heappop(self.heap)
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = (self.heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            deadline, _, key = heapq.heappop(self.heap)
+            _, callback = self.callbacks.pop(key)
+            kind = str(key[-1]) if isinstance(key, tuple) else str(key)
+            metrics.scheduler_lag_seconds.observe((datetime.now(timezone.utc) - deadline).total_seconds(), kind)
+            task = asyncio.create_task(self.run_callback(callback, kind))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run_callback(self, callback: Callable[[], Awaitable[None]], kind: str):
+        start = time.perf_counter()
+        # a failing callback is only logged, since the other mogis' deadlines don't depend on it
+        try:
+            await callback()
+        except Exception as e:
+            print(e)
+        metrics.scheduler_callback_seconds.observe(time.perf_counter() - start, kind)
@@ -0,0 +1,53 @@
+import bisect
+import itertools
+from models import Mogi
+
+class ScheduledEventStore:
+    """Scheduled mogis indexed by guild ID and SQ ID. Each guild's events are kept sorted by
+       SQ ID, so finding, removing and listing them in order don't need a scan or a sort."""
+    def __init__(self):
+        # keys are guild IDs, values are the sorted (sq_id, order) keys of the guild's events
+        self.guild_keys: dict[int, list[tuple[int, int]]] = {}
+        # keys are guild IDs, values map each event's key to the event
+        self.guild_events: dict[int, dict[tuple[int, int], Mogi]] = {}
+        # keys are events, values are the guild ID and key they were stored under
+        self.event_keys: dict[Mogi, tuple[int, tuple[int, int]]] = {}
+        # breaks ties between events with the same SQ ID, in the order they were scheduled
+        self.counter = itertools.count()
+
+    def add(self, guild_id: int, mogi: Mogi):
+        key = (mogi.sq_id, next(self.counter))
+        bisect.insort(self.guild_keys.setdefault(guild_id, []), key)
+        self.guild_events.setdefault(guild_id, {})[key] = mogi
+        self.event_keys[mogi] = (guild_id, key)
+
+    def find(self, guild_id: int, sq_id: int):
+        """Returns the first event scheduled in the guild with the given SQ ID"""
+        keys = self.guild_keys.get(guild_id, [])
+        i = bisect.bisect_left(keys, (sq_id, -1))
+        if i < len(keys) and keys[i][0] == sq_id:
+            return self.guild_events[guild_id][keys[i]]
+        return None
+
+    def remove(self, mogi: Mogi):
+        if mogi not in self.event_keys:
+            return False
+        guild_id, key = self.event_keys.pop(mogi)
+        keys = self.guild_keys[guild_id]
+        del keys[bisect.bisect_left(keys, key)]
+        del self.guild_events[guild_id][key]
+        return True
+
+    # the guild's events, in order of SQ ID
+    def get_guild(self, guild_id: int):
+        events = self.guild_events.get(guild_id, {})
+        return [events[key] for key in self.guild_keys.get(guild_id, [])]
+
+    def __contains__(self, mogi: Mogi):
+        return mogi in self.event_keys
+
+    def all(self):
+        return list(self.event_keys)
+
+    def __len__(self):
+        return len(self.event_keys)
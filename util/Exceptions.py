@@ -7,4 +7,12 @@ class LeaderboardNotFoundException(CommandError, AppCommandError):
 
 class GuildNotFoundException(CommandError, AppCommandError):
     def __init__(self):
-        pass
\ No newline at end of file
+        pass
+
+# the Lounge API is failing or timing out, and there's no last known MMR to fall back on
+class LoungeUnavailableException(CommandError, AppCommandError):
+    def __init__(self):
+        pass
+
+class ResultsSubmissionError(Exception):
+    pass
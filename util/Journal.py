@@ -0,0 +1,357 @@
+import asyncio
+import msgspec
+import os
+import struct
+from datetime import datetime
+from models import Mogi, Team, Player, Room
+
+# the queue state is stored as compact msgpack structs that only hold IDs, never discord objects
+
+class PlayerState(msgspec.Struct, array_like=True):
+    member_id: int
+    lounge_name: str
+    mmr: int
+    confirmed: bool
+    score: int
+
+class TeamState(msgspec.Struct, array_like=True):
+    players: list[PlayerState]
+    created_at: datetime
+    confirmed_at: datetime | None
+
+class RoomState(msgspec.Struct, array_like=True):
+    room_num: int
+    thread_id: int
+    team_indexes: list[int] # indexes into the mogi's teams
+    table_id: int | None = None
+
+class MogiState(msgspec.Struct):
+    sq_id: int
+    size: int
+    room_size: int
+    guild_id: int
+    channel_id: int
+    leaderboard: str
+    started: bool
+    gathering: bool
+    making_rooms_run: bool
+    is_automated: bool
+    start_time: datetime | None
+    discord_event_id: int | None
+    teams: list[TeamState] = []
+    rooms: list[RoomState] = []
+
+class SpareThread(msgspec.Struct, array_like=True):
+    guild_id: int
+    channel_id: int
+    thread_id: int
+
+class Snapshot(msgspec.Struct):
+    seq: int = 0 # sequence number of the last journal entry included in this snapshot
+    scheduled: list[MogiState] = []
+    ongoing: list[MogiState] = []
+    # keys are list channel IDs, values are the IDs of the list messages posted there
+    list_messages: dict[int, list[int]] = {}
+    # room threads released by earlier mogis, which later rooms in the same channel can reuse
+    spare_threads: list[SpareThread] = []
+
+# journal records; every mutation of the queue state is one of these
+
+class MogiStarted(msgspec.Struct, tag=True):
+    mogi: MogiState
+
+class MogiEnded(msgspec.Struct, tag=True):
+    channel_id: int
+
+class MogiStatus(msgspec.Struct, tag=True):
+    channel_id: int
+    gathering: bool
+    is_automated: bool
+    making_rooms_run: bool
+
+class EventScheduled(msgspec.Struct, tag=True):
+    mogi: MogiState
+
+# events imported together are written as one record
+class EventsScheduled(msgspec.Struct, tag=True):
+    mogis: list[MogiState]
+
+# the discord event of an imported event is created after it was scheduled
+class DiscordEventCreated(msgspec.Struct, tag=True):
+    guild_id: int
+    sq_id: int
+    start_time: datetime | None
+    discord_event_id: int
+
+class EventRemoved(msgspec.Struct, tag=True):
+    guild_id: int
+    sq_id: int
+    start_time: datetime | None
+
+class TeamAdded(msgspec.Struct, tag=True):
+    channel_id: int
+    team: TeamState
+
+class TeamRemoved(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+
+class PlayerConfirmed(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+    player_index: int
+    confirmed_at: datetime | None
+
+class PlayersAdded(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+    players: list[PlayerState]
+
+class PlayersRemoved(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+    player_indexes: list[int]
+
+class PlayerSubbed(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+    player_index: int
+    player: PlayerState
+
+class ScoreRecorded(msgspec.Struct, tag=True):
+    channel_id: int
+    team_index: int
+    player_index: int
+    score: int
+
+class RoomAdded(msgspec.Struct, tag=True):
+    channel_id: int
+    room: RoomState
+
+class RoomsReleased(msgspec.Struct, tag=True):
+    channel_id: int
+    thread_ids: list[int]
+
+class RoomSubmitted(msgspec.Struct, tag=True):
+    channel_id: int
+    thread_id: int
+    table_id: int
+
+class RoomsMade(msgspec.Struct, tag=True):
+    channel_id: int
+    rooms: list[RoomState]
+
+Record = (MogiStarted | MogiEnded | MogiStatus | EventScheduled | EventsScheduled | DiscordEventCreated | EventRemoved | TeamAdded | TeamRemoved
+          | PlayerConfirmed | PlayersAdded | PlayersRemoved | PlayerSubbed | ScoreRecorded
+          | RoomAdded | RoomsReleased | RoomsMade | RoomSubmitted)
+
+class JournalEntry(msgspec.Struct, array_like=True):
+    seq: int
+    record: Record
+
+def player_state(player: Player):
+    return PlayerState(player.member_id, player.lounge_name, player.mmr, player.confirmed, player.score)
+
+def team_state(team: Team):
+    return TeamState([player_state(p) for p in team.players], team.created_at, team.confirmed_at)
+
+def room_state(room: Room, positions: dict[Team, int]):
+    return RoomState(room.room_num, room.thread_id, [positions[t] for t in room.teams if t in positions], room.table_id)
+
+def mogi_state(mogi: Mogi, leaderboard_name: str):
+    positions = mogi.team_positions
+    return MogiState(mogi.sq_id, mogi.size, mogi.room_size, mogi.mogi_channel.guild.id, mogi.mogi_channel.id,
+                     leaderboard_name, mogi.started, mogi.gathering, mogi.making_rooms_run, mogi.is_automated,
+                     mogi.start_time, mogi.discord_event_id,
+                     [team_state(t) for t in mogi.teams], [room_state(room, positions) for room in mogi.rooms])
+
+def restore_player(state: PlayerState):
+    player = Player(state.member_id, state.lounge_name, state.mmr)
+    player.confirmed = state.confirmed
+    player.score = state.score
+    return player
+
+def restore_team(state: TeamState):
+    team = Team([restore_player(p) for p in state.players])
+    team.created_at = state.created_at
+    team.confirmed_at = state.confirmed_at
+    return team
+
+# applies a journal record to the snapshot, so the journal can be replayed without any discord objects
+def apply_record(snapshot: Snapshot, record: Record):
+    ongoing = {m.channel_id: m for m in snapshot.ongoing}
+    if isinstance(record, MogiStarted):
+        snapshot.ongoing = [m for m in snapshot.ongoing if m.channel_id != record.mogi.channel_id]
+        snapshot.ongoing.append(record.mogi)
+        return
+    if isinstance(record, MogiEnded):
+        snapshot.ongoing = [m for m in snapshot.ongoing if m.channel_id != record.channel_id]
+        return
+    if isinstance(record, EventScheduled):
+        snapshot.scheduled.append(record.mogi)
+        return
+    if isinstance(record, EventsScheduled):
+        snapshot.scheduled.extend(record.mogis)
+        return
+    if isinstance(record, DiscordEventCreated):
+        for m in snapshot.scheduled:
+            if m.guild_id == record.guild_id and m.sq_id == record.sq_id and m.start_time == record.start_time:
+                m.discord_event_id = record.discord_event_id
+                return
+        return
+    if isinstance(record, EventRemoved):
+        for i, m in enumerate(snapshot.scheduled):
+            if m.guild_id == record.guild_id and m.sq_id == record.sq_id and m.start_time == record.start_time:
+                del snapshot.scheduled[i]
+                return
+        return
+    if isinstance(record, RoomAdded):
+        # a spare thread that was renamed for the room isn't spare anymore
+        snapshot.spare_threads = [t for t in snapshot.spare_threads if t.thread_id != record.room.thread_id]
+    mogi = ongoing.get(record.channel_id, None)
+    if mogi is None:
+        return
+    if isinstance(record, MogiStatus):
+        mogi.gathering = record.gathering
+        mogi.is_automated = record.is_automated
+        mogi.making_rooms_run = record.making_rooms_run
+    elif isinstance(record, TeamAdded):
+        mogi.teams.append(record.team)
+    elif isinstance(record, TeamRemoved):
+        del mogi.teams[record.team_index]
+        for room in mogi.rooms:
+            room.team_indexes = [i - (i > record.team_index) for i in room.team_indexes if i != record.team_index]
+    elif isinstance(record, PlayerConfirmed):
+        team = mogi.teams[record.team_index]
+        team.players[record.player_index].confirmed = True
+        team.confirmed_at = record.confirmed_at
+    elif isinstance(record, PlayersAdded):
+        team = mogi.teams[record.team_index]
+        team.players.extend(record.players)
+        team.confirmed_at = None
+    elif isinstance(record, PlayersRemoved):
+        team = mogi.teams[record.team_index]
+        team.players = [p for i, p in enumerate(team.players) if i not in record.player_indexes]
+        team.confirmed_at = None
+    elif isinstance(record, PlayerSubbed):
+        team = mogi.teams[record.team_index]
+        team.players[record.player_index] = record.player
+        team.confirmed_at = None
+    elif isinstance(record, ScoreRecorded):
+        mogi.teams[record.team_index].players[record.player_index].score = record.score
+    elif isinstance(record, RoomAdded):
+        mogi.rooms.append(record.room)
+    elif isinstance(record, RoomsReleased):
+        mogi.rooms = [room for room in mogi.rooms if room.thread_id not in record.thread_ids]
+        snapshot.spare_threads.extend(SpareThread(mogi.guild_id, mogi.channel_id, thread_id) for thread_id in record.thread_ids)
+    elif isinstance(record, RoomsMade):
+        mogi.rooms = record.rooms
+    elif isinstance(record, RoomSubmitted):
+        for room in mogi.rooms:
+            if room.thread_id == record.thread_id:
+                room.table_id = record.table_id
+
+LENGTH = struct.Struct('>I')
+
+class StateJournal:
+    """Append-only journal of queue mutations, paired with periodic snapshots of the whole
+       queue state. After a restart the latest snapshot is loaded and the journal entries
+       written after it are replayed on top of it."""
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        self.journal_path = os.path.join(state_dir, 'journal.bin')
+        self.snapshot_path = os.path.join(state_dir, 'snapshot.bin')
+        self.encoder = msgspec.msgpack.Encoder()
+        self.entry_decoder = msgspec.msgpack.Decoder(JournalEntry)
+        self.snapshot_decoder = msgspec.msgpack.Decoder(Snapshot)
+        self.seq = 0
+        # number of entries written since the last snapshot
+        self.pending = 0
+        self.file = None
+        # records aren't written while the state is being restored
+        self.paused = False
+        # whether an fsync of the records appended so far is waiting to run
+        self.sync_scheduled = False
+
+    def open(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.file = open(self.journal_path, 'ab')
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def append(self, record: Record):
+        if self.file is None or self.paused:
+            return
+        self.seq += 1
+        payload = self.encoder.encode(JournalEntry(self.seq, record))
+        self.file.write(LENGTH.pack(len(payload)) + payload)
+        self.file.flush()
+        self.pending += 1
+        # the records appended in one event loop iteration share an fsync, which runs before the
+        # command that made them gets to await its reply
+        if not self.sync_scheduled:
+            self.sync_scheduled = True
+            try:
+                asyncio.get_running_loop().call_soon(self.sync)
+            except RuntimeError:
+                self.sync()
+
+    def sync(self):
+        self.sync_scheduled = False
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def read_entries(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, 'rb') as f:
+            data = f.read()
+        entries: list[JournalEntry] = []
+        pos = 0
+        while pos + LENGTH.size <= len(data):
+            (length,) = LENGTH.unpack_from(data, pos)
+            pos += LENGTH.size
+            if pos + length > len(data):
+                # the last write was cut off by the crash
+                break
+            try:
+                entries.append(self.entry_decoder.decode(data[pos:pos+length]))
+            except msgspec.DecodeError as e:
+                print(e)
+                break
+            pos += length
+        return entries
+
+    def recover(self):
+        """Returns the latest snapshot with every journal entry written after it applied"""
+        snapshot = Snapshot()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = self.snapshot_decoder.decode(f.read())
+        for entry in self.read_entries():
+            # entries that were already compacted into the snapshot are skipped
+            if entry.seq <= snapshot.seq:
+                continue
+            apply_record(snapshot, entry.record)
+            snapshot.seq = entry.seq
+        self.seq = snapshot.seq
+        return snapshot
+
+    def write_snapshot(self, snapshot: Snapshot):
+        """Atomically replaces the snapshot and starts a new, empty journal"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        snapshot.seq = self.seq
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.encoder.encode(snapshot))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # entries up to snapshot.seq are in the snapshot now, so the journal can be truncated
+        self.close()
+        self.file = open(self.journal_path, 'wb')
+        self.pending = 0
@@ -1,58 +1,45 @@
 from util.Exceptions import GuildNotFoundException, LeaderboardNotFoundException
+from util.Config import GuildIndex, filter_choices
 from models import ServerConfig, LeaderboardConfig, SquadQueueBot
 from discord.ext import commands
 import discord
 from discord import app_commands
 
-def get_server_config(ctx: commands.Context[SquadQueueBot]) -> ServerConfig:
+def get_guild_index(ctx: commands.Context[SquadQueueBot]) -> GuildIndex:
     assert ctx.guild is not None
-    server_info: ServerConfig | None = ctx.bot.config.servers.get(ctx.guild.id, None)
-    if not server_info:
+    index: GuildIndex | None = ctx.bot.guild_index.get(ctx.guild.id, None)
+    if not index:
         raise GuildNotFoundException
-    return server_info
+    return index
+
+def get_server_config(ctx: commands.Context[SquadQueueBot]) -> ServerConfig:
+    return get_guild_index(ctx).server
 
 def get_leaderboard_slash(ctx: commands.Context, lb: str | None) -> LeaderboardConfig:
-    server_info = get_server_config(ctx)
     # if we don't provide a leaderboard argument and there's only 1 leaderboard in the server
     # we should just return that leaderboard
-    if lb is None and len(server_info.leaderboards) == 1:
-        leaderboard = next(iter(server_info.leaderboards.values()))
-    elif lb:
-        leaderboard = server_info.leaderboards.get(lb, None)
-    else:
-        raise LeaderboardNotFoundException
+    leaderboard = get_guild_index(ctx).get_leaderboard(lb)
     if not leaderboard:
         raise LeaderboardNotFoundException
     return leaderboard
 
 async def leaderboard_autocomplete(interaction: discord.Interaction[SquadQueueBot], current: str) -> list[app_commands.Choice[str]]:
     assert interaction.guild_id is not None
-    server_info: ServerConfig | None = interaction.client.config.servers.get(interaction.guild_id, None)
-    if not server_info:
+    index: GuildIndex | None = interaction.client.guild_index.get(interaction.guild_id, None)
+    if not index:
         return []
-    choices = [app_commands.Choice(name=lb, value=lb) for lb in server_info.leaderboards]
-    return choices
+    return filter_choices(index.leaderboard_choices, current)
 
 async def format_autocomplete(interaction: discord.Interaction[SquadQueueBot], current: str) -> list[app_commands.Choice[int]]:
     assert interaction.guild_id is not None
-    server_info: ServerConfig | None = interaction.client.config.servers.get(interaction.guild_id, None)
-    if not server_info:
+    index: GuildIndex | None = interaction.client.guild_index.get(interaction.guild_id, None)
+    if not index:
         return []
-    valid_formats = []
-    for lb in server_info.leaderboards.values():
-        valid_formats.extend(lb.valid_formats)
-    valid_formats = set(valid_formats)
-    choices = [app_commands.Choice(name=f"{f}v{f}" if f > 1 else "FFA", value=f) for f in valid_formats]
-    return choices
+    return filter_choices(index.format_choices, current)
 
 async def room_size_autocomplete(interaction: discord.Interaction[SquadQueueBot], current: str) -> list[app_commands.Choice[int]]:
     assert interaction.guild_id is not None
-    server_info: ServerConfig | None = interaction.client.config.servers.get(interaction.guild_id, None)
-    if not server_info:
+    index: GuildIndex | None = interaction.client.guild_index.get(interaction.guild_id, None)
+    if not index:
         return []
-    valid_sizes = []
-    for lb in server_info.leaderboards.values():
-        valid_sizes.extend(lb.valid_room_sizes)
-    valid_sizes = set(valid_sizes)
-    choices = [app_commands.Choice(name=f"{p} players", value=p) for p in valid_sizes]
-    return choices
\ No newline at end of file
+    return filter_choices(index.room_size_choices, current)
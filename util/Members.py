@@ -0,0 +1,89 @@
+import asyncio
+import discord
+from collections import OrderedDict
+from models import MemberCacheSettings
+from util import Metrics as metrics
+
+# discord returns at most 100 members for each member request
+QUERY_BATCH_SIZE = 100
+
+class MemberResolver:
+    """Looks up guild members when they're needed, for when the bot doesn't load every member
+       at startup. Members are kept in a bounded LRU cache, and lookups in the same guild that
+       are made at the same time go to discord as one request."""
+    def __init__(self, settings: MemberCacheSettings):
+        self.settings = settings
+        # keys are (guild ID, member ID), values are the member
+        self.members: OrderedDict[tuple[int, int], discord.Member] = OrderedDict()
+        # keys are guild IDs, values are the member IDs waiting to be requested and the future the request's results are set on
+        self.pending: dict[int, tuple[set[int], asyncio.Future[dict[int, discord.Member]]]] = {}
+
+    def get(self, guild: discord.Guild, member_id: int):
+        # discord.py's own cache has every member when guilds are chunked
+        member = guild.get_member(member_id)
+        if member is not None:
+            return member
+        member = self.members.get((guild.id, member_id), None)
+        if member is not None:
+            self.members.move_to_end((guild.id, member_id))
+        return member
+
+    def add(self, member: discord.Member):
+        key = (member.guild.id, member.id)
+        self.members[key] = member
+        self.members.move_to_end(key)
+        while len(self.members) > self.settings.max_size:
+            self.members.popitem(last=False)
+
+    async def resolve(self, guild: discord.Guild, member_ids: list[int]):
+        """Returns the member for each ID, or None for IDs that aren't in the guild"""
+        found: dict[int, discord.Member | None] = {member_id: self.get(guild, member_id) for member_id in member_ids}
+        missing = [member_id for member_id, member in found.items() if member is None]
+        metrics.member_lookups.inc("hit", amount=len(found) - len(missing))
+        if missing:
+            metrics.member_lookups.inc("miss", amount=len(missing))
+            requested = await self.request(guild, missing)
+            for member_id in missing:
+                found[member_id] = requested.get(member_id, None)
+        return [found[member_id] for member_id in member_ids]
+
+    async def resolve_one(self, guild: discord.Guild, member_id: int):
+        return (await self.resolve(guild, [member_id]))[0]
+
+    async def request(self, guild: discord.Guild, member_ids: list[int]):
+        pending = self.pending.get(guild.id, None)
+        if pending is None:
+            pending = (set(), asyncio.get_running_loop().create_future())
+            self.pending[guild.id] = pending
+            asyncio.create_task(self.flush(guild))
+        pending[0].update(member_ids)
+        # shielded so that a cancelled command doesn't cancel the lookup for everyone else in the batch
+        return await asyncio.shield(pending[1])
+
+    async def flush(self, guild: discord.Guild):
+        # lets the other lookups made at the same time join this request
+        await asyncio.sleep(0)
+        member_ids, future = self.pending.pop(guild.id)
+        results: dict[int, discord.Member] = {}
+        try:
+            id_list = list(member_ids)
+            for i in range(0, len(id_list), QUERY_BATCH_SIZE):
+                batch = id_list[i:i+QUERY_BATCH_SIZE]
+                try:
+                    members = await guild.query_members(user_ids=batch, limit=QUERY_BATCH_SIZE, cache=False)
+                except discord.ClientException:
+                    # the gateway can't be asked for members without the members intent, so they're fetched one at a time
+                    members = [m for m in await asyncio.gather(*[self.fetch_member(guild, member_id) for member_id in batch])
+                               if m is not None]
+                for member in members:
+                    self.add(member)
+                    results[member.id] = member
+        except Exception as e:
+            print(e)
+        future.set_result(results)
+
+    async def fetch_member(self, guild: discord.Guild, member_id: int):
+        try:
+            return await guild.fetch_member(member_id)
+        except discord.NotFound:
+            return None
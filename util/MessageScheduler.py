@@ -0,0 +1,118 @@
+import asyncio
+import discord
+import heapq
+import itertools
+
+PRIORITY_HIGH = 0 # room announcements and other messages that shouldn't wait behind join messages
+PRIORITY_NORMAL = 1
+
+MAX_MESSAGE_LENGTH = 2000
+
+class ChannelQueue:
+    def __init__(self, channel: discord.abc.Messageable):
+        self.channel = channel
+        # heap of (priority, order, message), so messages with the same priority are sent in the order they were queued
+        self.messages: list[tuple[int, int, str]] = []
+        self.task: asyncio.Task | None = None
+        self.interval = 2.0
+
+class MessageScheduler:
+    """Sends queued messages for each channel from its own task, packing as many
+       queued messages as fit into a single Discord message"""
+    def __init__(self, max_queued_messages: int = 200):
+        self.max_queued_messages = max_queued_messages
+        self.queues: dict[int, ChannelQueue] = {}
+        self.counter = itertools.count()
+
+    def enqueue(self, channel: discord.abc.Messageable, msg: str, interval: float, priority: int = PRIORITY_NORMAL):
+        channel_id: int = getattr(channel, 'id')
+        queue = self.queues.get(channel_id, None)
+        if queue is None:
+            queue = ChannelQueue(channel)
+            self.queues[channel_id] = queue
+        queue.interval = max(interval, 0.5)
+        heapq.heappush(queue.messages, (priority, next(self.counter), msg))
+        if len(queue.messages) > self.max_queued_messages:
+            self.drop_message(queue)
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self.run_channel(channel_id, queue))
+
+    # drops the newest message with the lowest priority once a channel's queue is full
+    def drop_message(self, queue: ChannelQueue):
+        worst = max(range(len(queue.messages)), key=lambda i: queue.messages[i][:2])
+        dropped = queue.messages[worst]
+        queue.messages[worst] = queue.messages[-1]
+        queue.messages.pop()
+        heapq.heapify(queue.messages)
+        print(f"Message queue for channel {getattr(queue.channel, 'id')} is full; dropped message: {dropped[2][:100]}")
+
+    def depth(self):
+        return sum(len(queue.messages) for queue in self.queues.values())
+
+    # pops queued messages in priority order until the next one would go over the length limit
+    def pack(self, queue: ChannelQueue):
+        parts: list[str] = []
+        length = 0
+        while queue.messages:
+            msg = queue.messages[0][2]
+            if len(msg) > MAX_MESSAGE_LENGTH:
+                if parts:
+                    break
+                heapq.heappop(queue.messages)
+                # split at the last line break that fits, or at the limit if there isn't one
+                split = msg.rfind("\n", 0, MAX_MESSAGE_LENGTH)
+                if split <= 0:
+                    split = MAX_MESSAGE_LENGTH
+                return msg[:split], msg[split:].lstrip("\n")
+            if length + len(msg) + 1 > MAX_MESSAGE_LENGTH:
+                break
+            heapq.heappop(queue.messages)
+            parts.append(msg)
+            length += len(msg) + 1
+        return "\n".join(parts), None
+
+    # puts a message back at the front of the queue, ahead of everything else that's waiting
+    def requeue(self, queue: ChannelQueue, msg: str):
+        heapq.heappush(queue.messages, (PRIORITY_HIGH, -next(self.counter), msg))
+
+    def retry_after(self, error: discord.HTTPException | discord.RateLimited):
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        if error.status != 429 or error.response is None:
+            return None
+        resp_headers = error.response.headers
+        retry = resp_headers.get('X-RateLimit-Reset-After', None) or resp_headers.get('Retry-After', None)
+        try:
+            return float(retry) if retry is not None else 1.0
+        except ValueError:
+            return 1.0
+
+    async def run_channel(self, channel_id: int, queue: ChannelQueue):
+        while queue.messages:
+            # waiting before each send lets messages queued in the meantime go out together
+            await asyncio.sleep(queue.interval)
+            msg, overflow = self.pack(queue)
+            if overflow:
+                self.requeue(queue, overflow)
+            if not msg:
+                continue
+            try:
+                await queue.channel.send(msg)
+            except (discord.RateLimited, discord.HTTPException) as e:
+                retry = self.retry_after(e)
+                if retry is None:
+                    print(e)
+                    continue
+                # wait out the rate limit and then try the same batch again
+                self.requeue(queue, msg)
+                await asyncio.sleep(retry)
+            except Exception as e:
+                print(e)
+        if self.queues.get(channel_id, None) is queue:
+            del self.queues[channel_id]
+
+    def close(self):
+        for queue in self.queues.values():
+            if queue.task is not None:
+                queue.task.cancel()
+        self.queues.clear()
@@ -0,0 +1,278 @@
+import bisect
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable
+from aiohttp import web
+from discord.ext import commands
+from models import MetricsSettings
+
+# default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label(value: str):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = ""):
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric(ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """Returns the lines of the metric in the Prometheus text format"""
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        # keys are label values, in the order of label_names
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Gauge(Metric):
+    """A value that goes up and down. Gauges that describe existing state can be given a
+       function instead, which is only called when the metrics are scraped."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+        self.function: Callable[[], dict[tuple[str, ...], float]] | None = None
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def set_function(self, function: Callable[[], dict[tuple[str, ...], float]] | None):
+        self.function = function
+
+    def render(self):
+        lines = self.header()
+        values = self.values
+        if self.function is not None:
+            try:
+                values = self.function()
+            except Exception as e:
+                print(e)
+                values = {}
+        for labels, value in values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # keys are label values; values are the count in each bucket (not cumulative, with a
+        # last bucket for +Inf), the sum and the total count
+        self.series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels, None)
+        if series is None:
+            series = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            self.series[labels] = series
+        counts, totals = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, totals) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = format_labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {totals[0]}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {int(totals[1])}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# every metric the bot exports; recording one is a dict lookup and an addition, so they're cheap enough for hot paths
+registry = MetricsRegistry()
+command_seconds = registry.histogram("sqbot_command_seconds", "Time from a command being invoked to it finishing", ("command",))
+command_wait_seconds = registry.histogram("sqbot_command_wait_seconds", "Time a command spent on checks and argument parsing before running", ("command",))
+command_errors = registry.counter("sqbot_command_errors_total", "Commands that raised an error", ("command",))
+lounge_api_seconds = registry.histogram("sqbot_lounge_api_seconds", "Latency of Lounge API requests", ("endpoint",))
+lounge_api_errors = registry.counter("sqbot_lounge_api_errors_total", "Lounge API requests that didn't return a player or create a table", ("endpoint", "reason"))
+lounge_breaker_state = registry.gauge("sqbot_lounge_breaker_state", "State of each Lounge site's circuit breaker: 0 closed, 1 half open, 2 open", ("leaderboard",))
+lounge_breaker_transitions = registry.counter("sqbot_lounge_breaker_transitions_total", "Times each Lounge site's circuit breaker changed state", ("leaderboard", "state"))
+lounge_stale_lookups = registry.counter("sqbot_lounge_stale_lookups_total", "MMR lookups answered with the player's last known MMR because the Lounge API was unavailable")
+lounge_cache_lookups = registry.counter("sqbot_lounge_cache_lookups_total", "MMR lookups, by whether they were served from the cache", ("result",))
+mmr_prefetches = registry.counter("sqbot_mmr_prefetches_total", "Players whose MMR was prefetched before they joined a queue, by result", ("result",))
+discord_requests = registry.counter("sqbot_discord_requests_total", "Discord API requests, by route", ("method", "route"))
+discord_rate_limits = registry.counter("sqbot_discord_rate_limits_total", "429 responses from Discord", ("scope",))
+message_queue_depth = registry.gauge("sqbot_message_queue_depth", "Messages waiting in each shard's message scheduler", ("shard",))
+mogi_registered_teams = registry.gauge("sqbot_mogi_registered_teams", "Registered teams in each ongoing mogi", ("guild", "channel", "sq_id"))
+mogi_teams = registry.gauge("sqbot_mogi_teams", "Teams in each ongoing mogi, including unfilled squads", ("guild", "channel", "sq_id"))
+mogi_rooms = registry.gauge("sqbot_mogi_rooms", "Rooms created for each ongoing mogi", ("guild", "channel", "sq_id"))
+scheduled_events = registry.gauge("sqbot_scheduled_events", "Mogis scheduled but not started yet on each shard", ("shard",))
+scheduler_callback_seconds = registry.histogram("sqbot_scheduler_callback_seconds", "Time taken by each deadline callback", ("kind",))
+scheduler_lag_seconds = registry.histogram("sqbot_scheduler_lag_seconds", "How late each deadline callback started", ("kind",))
+list_task_seconds = registry.histogram("sqbot_list_task_seconds", "Time taken by each run of the list task")
+list_messages = registry.counter("sqbot_list_messages_total", "List channel message operations", ("action",))
+shard_commands = registry.counter("sqbot_shard_commands_total", "Commands invoked in the guilds of each shard", ("shard",))
+shard_events = registry.counter("sqbot_shard_events_total", "Gateway connects, disconnects, resumes and readies of each shard", ("shard", "event"))
+shard_up = registry.gauge("sqbot_shard_up", "Whether each shard is connected to the gateway", ("shard",))
+shard_latency_seconds = registry.gauge("sqbot_shard_latency_seconds", "Gateway heartbeat latency of each shard", ("shard",))
+member_lookups = registry.counter("sqbot_member_lookups_total", "Member lookups, by whether the member was already cached", ("result",))
+startup_seconds = registry.gauge("sqbot_startup_seconds", "Time from the bot starting to it first being ready")
+resident_memory_bytes = registry.gauge("sqbot_resident_memory_bytes", "Resident memory of the bot process")
+shard_guilds = registry.gauge("sqbot_shard_guilds", "Guilds handled by each shard", ("shard",))
+
+def resident_memory():
+    """Returns the bot's resident memory in bytes, or None where it can't be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+resident_memory_bytes.set_function(lambda: {(): resident_memory() or 0})
+
+class RateLimitLogHandler(logging.Handler):
+    """discord.py retries 429s itself and only logs them, so they're counted from its log"""
+    def emit(self, record: logging.LogRecord):
+        msg = record.msg if isinstance(record.msg, str) else ""
+        if msg.startswith("We are being rate limited"):
+            discord_rate_limits.inc("route")
+        elif msg.startswith("Global rate limit"):
+            discord_rate_limits.inc("global")
+
+class MetricsServer:
+    """Serves the registry in the Prometheus text format at /metrics, and the state of each
+       shard at /health, on the bot's event loop"""
+    def __init__(self, settings: MetricsSettings):
+        self.settings = settings
+        self.runner: web.AppRunner | None = None
+        self.bot: commands.AutoShardedBot | None = None
+        # keys are contexts of commands that are being invoked, values are when the invoke started
+        self.command_starts: dict[commands.Context, float] = {}
+
+    async def handle_metrics(self, request: web.Request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    def shard_health(self):
+        if self.bot is None:
+            return {}
+        guild_counts: dict[int, int] = {}
+        for guild in self.bot.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+        health = {}
+        for shard_id, shard in self.bot.shards.items():
+            latency = shard.latency
+            health[shard_id] = {"up": not shard.is_closed(),
+                                "latency": latency if latency == latency and latency != float("inf") else None,
+                                "ws_ratelimited": shard.is_ws_ratelimited(),
+                                "guilds": guild_counts.get(shard_id, 0)}
+        return health
+
+    async def handle_health(self, request: web.Request):
+        shards = self.shard_health()
+        healthy = self.bot is not None and self.bot.is_ready() and all(s["up"] for s in shards.values())
+        body = {"ready": self.bot is not None and self.bot.is_ready(), "shards": shards}
+        return web.Response(text=json.dumps(body), content_type="application/json", status=200 if healthy else 503)
+
+    async def start(self):
+        if not self.settings.enabled or self.runner is not None:
+            return
+        app = web.Application()
+        app.add_routes([web.get("/metrics", self.handle_metrics), web.get("/health", self.handle_health)])
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.settings.host, self.settings.port).start()
+        print(f"Serving metrics at http://{self.settings.host}:{self.settings.port}/metrics", flush=True)
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def instrument(self, bot: commands.AutoShardedBot):
+        """Counts every discord API request the bot makes and the 429s it gets, and
+           reports the state of the bot's shards"""
+        self.bot = bot
+        shard_up.set_function(lambda: {(str(s),): int(h["up"]) for s, h in self.shard_health().items()})
+        shard_latency_seconds.set_function(lambda: {(str(s),): h["latency"] for s, h in self.shard_health().items()
+                                                    if h["latency"] is not None})
+        shard_guilds.set_function(lambda: {(str(s),): h["guilds"] for s, h in self.shard_health().items()})
+        request = bot.http.request
+        async def counted_request(route, **kwargs):
+            discord_requests.inc(route.method, route.path)
+            return await request(route, **kwargs)
+        bot.http.request = counted_request # type: ignore
+        logging.getLogger("discord.http").addHandler(RateLimitLogHandler(logging.WARNING))
+        bot.before_invoke(self.before_command)
+
+    def command_started(self, ctx: commands.Context, shard_id: int):
+        self.command_starts[ctx] = time.perf_counter()
+        shard_commands.inc(str(shard_id))
+
+    def shard_event(self, shard_id: int, event: str):
+        shard_events.inc(str(shard_id), event)
+
+    async def before_command(self, ctx: commands.Context):
+        start = self.command_starts.get(ctx, None)
+        if start is not None and ctx.command is not None:
+            command_wait_seconds.observe(time.perf_counter() - start, ctx.command.qualified_name)
+
+    def command_finished(self, ctx: commands.Context):
+        start = self.command_starts.pop(ctx, None)
+        if start is None or ctx.command is None:
+            return
+        command_seconds.observe(time.perf_counter() - start, ctx.command.qualified_name)
+        if ctx.command_failed:
+            command_errors.inc(ctx.command.qualified_name)
@@ -0,0 +1,89 @@
+import asyncio
+import discord
+import time
+from collections import OrderedDict
+from models import LeaderboardConfig, PrefetchSettings
+from util.mmr import LoungeClient, leaderboard_key
+from util.Exceptions import LoungeUnavailableException
+from util import Metrics as metrics
+
+class MMRPrefetcher:
+    """Looks up the MMR of the players likely to join a queue in the background, filling the
+       lounge client's MMR cache. Lookups are made a few at a time at a limited rate, and only
+       while the lounge client has a free request slot."""
+    def __init__(self, client: LoungeClient, settings: PrefetchSettings):
+        self.client = client
+        self.settings = settings
+        # keys are leaderboard keys, values are the IDs of that leaderboard's recent participants, most recent last
+        self.recent: dict[str, OrderedDict[int, None]] = {}
+        # keys are leaderboard keys, values are the prefetch running for that leaderboard
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    def remember(self, lb: LeaderboardConfig, member_ids: list[int]):
+        recent = self.recent.setdefault(leaderboard_key(lb), OrderedDict())
+        for member_id in member_ids:
+            recent[member_id] = None
+            recent.move_to_end(member_id)
+        while len(recent) > self.settings.recent_players:
+            recent.popitem(last=False)
+
+    def candidates(self, lb: LeaderboardConfig, guild: discord.Guild):
+        """The IDs of the players most likely to join: recent participants, most recent first,
+           then members with the leaderboard's prefetch roles"""
+        member_ids = dict.fromkeys(reversed(self.recent.get(leaderboard_key(lb), OrderedDict())))
+        for role_id in lb.prefetch_role_ids:
+            role = guild.get_role(role_id)
+            # only the members discord.py has cached are known without a request, so this finds
+            # nobody when members aren't loaded at startup; config_warnings reports that
+            if role is not None:
+                member_ids.update(dict.fromkeys(m.id for m in role.members))
+        return list(member_ids)[:self.settings.max_players]
+
+    def start(self, lb: LeaderboardConfig, member_ids: list[int]):
+        key = leaderboard_key(lb)
+        if not self.settings.enabled or not member_ids:
+            return
+        # a prefetch that's still running for the leaderboard is replaced by the newer one
+        if key in self.tasks:
+            self.tasks[key].cancel()
+        task = asyncio.create_task(self.prefetch(lb, member_ids))
+        self.tasks[key] = task
+        def finished(t: asyncio.Task):
+            if self.tasks.get(key) is t:
+                del self.tasks[key]
+        task.add_done_callback(finished)
+
+    async def close(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        self.tasks.clear()
+        # waited for, so the lounge client is only closed once no prefetch is making lookups
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def prefetch(self, lb: LeaderboardConfig, member_ids: list[int]):
+        cache = self.client.get_cache(lb)
+        missing = [member_id for member_id in member_ids if cache.get(member_id) is None]
+        metrics.mmr_prefetches.inc("cached", amount=len(member_ids) - len(missing))
+        batch_size = max(self.settings.batch_size, 1)
+        interval = batch_size / self.settings.requests_per_second
+        for i in range(0, len(missing), batch_size):
+            # commands' lookups come first; the prefetch waits while every request slot is taken
+            while self.client.semaphore.locked():
+                await asyncio.sleep(interval)
+            batch_start = time.monotonic()
+            results = await asyncio.gather(*[self.client.lookup(lb, member_id) for member_id in missing[i:i+batch_size]],
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, LoungeUnavailableException):
+                    # the circuit breaker is open, so the rest would fail too
+                    metrics.mmr_prefetches.inc("unavailable", amount=len(missing) - i)
+                    return
+                if isinstance(result, Exception):
+                    print(result)
+                    metrics.mmr_prefetches.inc("failed")
+                else:
+                    metrics.mmr_prefetches.inc("fetched" if result is not None else "not_found")
+            # the interval counts from the start of the batch, so a prefetch of max_players takes
+            # about max_players / requests_per_second however long the lookups take
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - batch_start)))
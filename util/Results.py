@@ -0,0 +1,68 @@
+import msgspec
+from models import Mogi, Room, LeaderboardConfig
+
+# the body of a Lounge website table submission
+
+class TableScore(msgspec.Struct, rename="camel"):
+    player_name: str
+    discord_id: int
+    score: int
+
+class TableTeam(msgspec.Struct, rename="camel"):
+    rank: int
+    scores: list[TableScore]
+
+class Table(msgspec.Struct, rename="camel"):
+    size: int
+    tier: str
+    squad_queue: bool
+    sq_id: int
+    room_num: int
+    teams: list[TableTeam]
+
+# the number of players points_per_race is for when it's a single number
+DEFAULT_ROOM_PLAYERS = 12
+
+def expected_total(lb: LeaderboardConfig, num_players: int):
+    """Returns the number of points handed out over the whole mogi in a room of num_players
+       players, or None if the leaderboard's points_per_race doesn't cover that many players"""
+    if isinstance(lb.points_per_race, dict):
+        points_per_race = lb.points_per_race.get(num_players, None)
+    else:
+        points_per_race = lb.points_per_race if num_players == DEFAULT_ROOM_PLAYERS else None
+    if points_per_race is None:
+        return None
+    return lb.races_per_mogi * points_per_race
+
+def room_error(lb: LeaderboardConfig, room: Room):
+    """Returns why the room's scores can't be submitted, or None if they can"""
+    players = [p for team in room.teams for p in team.players]
+    if not players:
+        return "nobody played in this room"
+    missing = [p.lounge_name for p in players if p.score == 0]
+    if missing:
+        return f"no score for {', '.join(missing)}"
+    expected = expected_total(lb, len(players))
+    if expected is None:
+        return f"points_per_race isn't set for rooms of {len(players)} players"
+    total = sum(p.score for p in players)
+    if total != expected:
+        return f"the scores add up to {total} instead of {expected}"
+    return None
+
+def build_table(mogi: Mogi, room: Room):
+    totals = [sum(p.score for p in team.players) for team in room.teams]
+    order = sorted(range(len(room.teams)), key=lambda i: totals[i], reverse=True)
+    teams: list[TableTeam] = []
+    for position, i in enumerate(order):
+        # teams that tie share the higher rank
+        if position > 0 and totals[i] == totals[order[position-1]]:
+            rank = teams[-1].rank
+        else:
+            rank = position + 1
+        teams.append(TableTeam(rank, [TableScore(p.lounge_name, p.member_id, p.score) for p in room.teams[i].players]))
+    return Table(mogi.size, "SQ", True, mogi.sq_id, room.room_num, teams)
+
+def table_str(table: Table):
+    """The table as the lines of a results message, one team per line"""
+    return "\n".join(f"{team.rank}. " + ", ".join(f"{s.player_name} {s.score}" for s in team.scores) for team in table.teams)
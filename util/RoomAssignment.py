@@ -0,0 +1,118 @@
+"""Room assignment engines. Each engine takes the average MMR of every registered team,
+listed in the order the teams confirmed, and returns the rooms as lists of indexes into
+that list. Rooms are ordered from highest to lowest MMR, as are the teams inside each room.
+Teams that aren't in any room are the late teams.
+
+The optimized engines are plain Python and take about 50-190ms with 5000 teams, so
+add_teams_to_rooms runs them in a thread."""
+from typing import Callable
+
+def sort_by_mmr(mmrs: list[float], indexes: list[int]):
+    # ties are broken by confirmation order, so the result doesn't depend on the input order
+    return sorted(indexes, key=lambda i: (-mmrs[i], i))
+
+def contiguous_rooms(mmrs: list[float], teams_per_room: int, num_rooms: int, late_penalty: float = 0):
+    """The first teams to confirm make it in, and are split into rooms by MMR"""
+    num_teams = num_rooms * teams_per_room
+    ordered = sort_by_mmr(mmrs, list(range(num_teams)))
+    return [ordered[i:i+teams_per_room] for i in range(0, num_teams, teams_per_room)]
+
+def arrange(values: list[float], on_time: list[bool], teams_per_room: int, num_skips: int, late_penalty: float,
+            room_cost: Callable[[float, float, float], float], skip_cost: Callable[[float, float], float]):
+    """Finds the cheapest way to split the teams at sorted positions 0 to len(values)-1 into rooms,
+       leaving out num_skips of them. A room is its first and last team by MMR plus teams_per_room-2
+       of the teams between them, so teams that sit out can fall inside a room's MMR range.
+       room_cost(rest, spread, penalty) and skip_cost(rest, penalty) give the cost of a room or a
+       skipped team followed by the cheapest arrangement of the rest. Returns the cost, and for
+       each position and number of skips so far, the position of the last team of the room that
+       starts there, or -1 if the team sits out."""
+    num_registered = len(values)
+    inf = float('inf')
+    # late_before[i] is the number of late teams at sorted positions before i
+    late_before = [0] * (num_registered + 1)
+    for i in range(num_registered):
+        late_before[i+1] = late_before[i] + (not on_time[i])
+    # best[i][s] is the cost of arranging the teams from position i onwards when s teams have already
+    # sat out and every room before i is full; it's filled from the last position backwards
+    best = [[inf] * (num_skips + 1) for _ in range(num_registered + 1)]
+    room_end = [[-1] * (num_skips + 1) for _ in range(num_registered + 1)]
+    best[num_registered][num_skips] = 0.0
+    for i in range(num_registered - 1, -1, -1):
+        for s in range(min(i, num_skips) + 1):
+            candidate = inf
+            if s < num_skips:
+                candidate = skip_cost(best[i+1][s+1], late_penalty if on_time[i] else 0.0)
+            first_end = i + teams_per_room - 1
+            last_end = i if teams_per_room == 1 else min(first_end + num_skips - s, num_registered - 1)
+            for e in range(first_end, last_end + 1):
+                skipped = e - first_end
+                rest = best[e+1][s+skipped]
+                if rest == inf:
+                    continue
+                # the late teams inside the room sit out first, since leaving them out is free
+                late_inside = late_before[e] - late_before[i+1]
+                penalty = late_penalty * max(0, skipped - late_inside)
+                room_candidate = room_cost(rest, values[i] - values[e], penalty)
+                if room_candidate < candidate:
+                    candidate = room_candidate
+                    room_end[i][s] = e
+            best[i][s] = candidate
+    return best[0][0], room_end
+
+def optimized_rooms(mmrs: list[float], teams_per_room: int, num_rooms: int, late_penalty: float, minimax: bool):
+    """Chooses which teams sit out, and splits the rest into rooms of consecutive teams by MMR,
+       so a team that sits out can still be inside a room's MMR range. With minimax the largest MMR spread of any room is minimized first and the total skip
+       penalty second; otherwise the sum of every room's spread plus the skip penalties is minimized."""
+    num_registered = len(mmrs)
+    num_teams = num_rooms * teams_per_room
+    num_skips = num_registered - num_teams
+    order = sort_by_mmr(mmrs, list(range(num_registered)))
+    values = [mmrs[i] for i in order]
+    on_time = [i < num_teams for i in order]
+    if minimax:
+        # the smallest possible largest spread is found first, then the cheapest arrangement
+        # that keeps every room within it; a single pass can't do both, since a suffix with a
+        # smaller spread but more penalty can lose once an earlier room's spread is larger
+        max_spread, _ = arrange(values, on_time, teams_per_room, num_skips, late_penalty,
+                                lambda rest, spread, penalty: max(rest, spread), lambda rest, penalty: rest)
+        _, room_end = arrange(values, on_time, teams_per_room, num_skips, late_penalty,
+                              lambda rest, spread, penalty: rest + penalty if spread <= max_spread else float('inf'),
+                              lambda rest, penalty: rest + penalty)
+    else:
+        _, room_end = arrange(values, on_time, teams_per_room, num_skips, late_penalty,
+                              lambda rest, spread, penalty: rest + spread + penalty, lambda rest, penalty: rest + penalty)
+
+    rooms: list[list[int]] = []
+    i, s = 0, 0
+    while i < num_registered:
+        e = room_end[i][s]
+        if e == -1:
+            i += 1
+            s += 1
+            continue
+        # the teams between the first and last that make it in: on time before late, then by confirmation order
+        inside = sorted(range(i + 1, e), key=lambda p: (not on_time[p], order[p]))[:teams_per_room - 2]
+        members = [i] + inside + ([e] if e != i else [])
+        rooms.append(sort_by_mmr(mmrs, [order[p] for p in members]))
+        s += (e - i + 1) - len(members)
+        i = e + 1
+    return rooms
+
+def min_spread_rooms(mmrs: list[float], teams_per_room: int, num_rooms: int, late_penalty: float = 0):
+    """Minimizes the largest MMR spread of any room, preferring to leave out late teams"""
+    return optimized_rooms(mmrs, teams_per_room, num_rooms, max(late_penalty, 1), True)
+
+def penalized_rooms(mmrs: list[float], teams_per_room: int, num_rooms: int, late_penalty: float = 0):
+    """Minimizes the total MMR spread of every room, where leaving out a team that confirmed
+       in time costs late_penalty MMR"""
+    return optimized_rooms(mmrs, teams_per_room, num_rooms, late_penalty, False)
+
+ROOM_ASSIGNMENT_ENGINES: dict[str, Callable[[list[float], int, int, float], list[list[int]]]] = {
+    "contiguous": contiguous_rooms,
+    "min_spread": min_spread_rooms,
+    "penalized": penalized_rooms
+}
+
+def assign_rooms(engine: str, mmrs: list[float], teams_per_room: int, num_rooms: int, late_penalty: float = 0):
+    assignment = ROOM_ASSIGNMENT_ENGINES.get(engine, contiguous_rooms)
+    return assignment(mmrs, teams_per_room, num_rooms, late_penalty)
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import io
+import msgspec
+from typing import Awaitable, Callable
+
+# seconds between the discord scheduled events the worker creates, which keeps a big
+# import well under discord's rate limits
+EVENT_CREATION_INTERVAL = 2.0
+MAX_IMPORT_ROWS = 100
+MAX_IMPORT_BYTES = 256 * 1024
+
+class ScheduleRow(msgspec.Struct, forbid_unknown_fields=True):
+    sq_id: int
+    room_size: int
+    format: int
+    time: str
+    timezone: str
+    leaderboard: str | None = None
+
+def parse_schedule(filename: str, data: bytes) -> tuple[list[ScheduleRow], list[str]]:
+    """Parses a .json file holding a list of rows, or a .csv file with a header line, and
+       returns the rows and an error message for each row that couldn't be read"""
+    try:
+        if filename.lower().endswith('.json'):
+            raw_rows = msgspec.json.decode(data, type=list[dict])
+        else:
+            reader = csv.DictReader(io.StringIO(data.decode('utf-8-sig')))
+            # blank cells are left out, so optional columns like leaderboard can be empty
+            raw_rows = [{k.strip(): v.strip() for k, v in row.items() if k is not None and v and v.strip()}
+                        for row in reader]
+    except (msgspec.DecodeError, msgspec.ValidationError, UnicodeDecodeError, csv.Error) as e:
+        return [], [f"Couldn't read the file: {e}"]
+    if len(raw_rows) > MAX_IMPORT_ROWS:
+        return [], [f"The file has {len(raw_rows)} events; at most {MAX_IMPORT_ROWS} can be imported at once"]
+    rows: list[ScheduleRow] = []
+    errors: list[str] = []
+    for i, raw_row in enumerate(raw_rows, start=1):
+        try:
+            # not strict, so the numbers in a csv file are converted from strings
+            rows.append(msgspec.convert(raw_row, ScheduleRow, strict=False))
+        except msgspec.ValidationError as e:
+            errors.append(f"Row {i}: {e}")
+    return rows, errors
+
+class EventBatch:
+    """Discord scheduled events to be created for one import. Each job creates one event
+       and returns False if it was skipped."""
+    def __init__(self, jobs: list[Callable[[], Awaitable[bool]]],
+                 on_progress: Callable[['EventBatch'], Awaitable[None]] | None = None):
+        self.jobs = jobs
+        self.on_progress = on_progress
+        self.created = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @property
+    def finished(self):
+        return self.created + self.skipped + self.failed
+
+    def done(self):
+        return self.finished == len(self.jobs)
+
+class ScheduledEventWorker:
+    """Creates discord scheduled events from a single background task, one at a time with
+       interval seconds between them. Batches are worked through in the order they were submitted."""
+    def __init__(self, interval: float = EVENT_CREATION_INTERVAL):
+        self.interval = interval
+        self.batches: list[EventBatch] = []
+        self.task: asyncio.Task | None = None
+
+    def submit(self, batch: EventBatch):
+        self.batches.append(batch)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def pending(self):
+        return sum(len(batch.jobs) - batch.finished for batch in self.batches)
+
+    # roughly how long until every submitted event is created
+    def eta(self):
+        return self.pending() * self.interval
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.batches.clear()
+
+    async def run(self):
+        while self.batches:
+            batch = self.batches[0]
+            for job in batch.jobs[batch.finished:]:
+                try:
+                    created = await job()
+                except Exception as e:
+                    print(e)
+                    created = None
+                    batch.failed += 1
+                else:
+                    if created:
+                        batch.created += 1
+                    else:
+                        batch.skipped += 1
+                if batch.on_progress is not None:
+                    try:
+                        await batch.on_progress(batch)
+                    except Exception as e:
+                        print(e)
+                # skipped events didn't make a request, so there's nothing to wait for
+                if created is not False:
+                    await asyncio.sleep(self.interval)
+            self.batches.pop(0)
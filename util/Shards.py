@@ -0,0 +1,30 @@
+import asyncio
+import discord
+from models import Mogi
+from .EventStore import ScheduledEventStore
+from .MessageScheduler import MessageScheduler
+
+def shard_for_guild(guild_id: int, shard_count: int | None):
+    # the same formula discord uses to pick the shard that receives a guild's events
+    return (guild_id >> 22) % (shard_count or 1)
+
+class ShardState:
+    """The queue state of the guilds handled by one gateway shard"""
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        # scheduled mogis, indexed by guild ID and SQ ID
+        self.scheduled_events = ScheduledEventStore()
+        # keys are discord.TextChannel objects, values are instances of Mogi
+        self.ongoing_events: dict[discord.TextChannel, Mogi] = {}
+        # sends the messages of leaderboards that have queue_messages enabled
+        self.message_scheduler = MessageScheduler()
+        # keys are list channels, values are the posted list messages and the content each was last
+        # successfully set to (None if the last edit failed and should be retried)
+        self.list_messages: dict[discord.TextChannel, list[tuple[discord.Message, str | None]]] = {}
+        # keys are mogi channels, values are the lock held while a queue command changes that channel's mogi
+        self.mogi_locks: dict[discord.TextChannel, asyncio.Lock] = {}
+        # keys are mogi channels, values are the lock held while room threads are created for that channel's mogi
+        self.room_locks: dict[discord.TextChannel, asyncio.Lock] = {}
+
+    def close(self):
+        self.message_scheduler.close()
@@ -0,0 +1,111 @@
+import discord
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from models import Mogi
+
+# discord allows each guild to create about 50 threads every 5 minutes
+THREAD_LIMIT = 50
+THREAD_WINDOW = 300
+# rooms that are only forecast (not yet filled) are spread out over the rest of the
+# joining period in steps of this many seconds
+PACING_INTERVAL = 60
+
+class GuildThreadBudget:
+    def __init__(self):
+        # times (from time.monotonic) of the threads created in the current window
+        self.created: deque[float] = deque()
+        # room threads that were created but never used, which can be renamed for another room,
+        # as (parent channel ID, thread ID)
+        self.spare_threads: list[tuple[int, int]] = []
+
+    def used(self, now: float):
+        while self.created and self.created[0] <= now - THREAD_WINDOW:
+            self.created.popleft()
+        return len(self.created)
+
+class ThreadPlanner:
+    """Tracks the room threads created in each guild over discord's sliding window, and
+       decides how many rooms each gathering mogi should create ahead of time so that no
+       mogi runs out of thread creations when its rooms are made."""
+    def __init__(self):
+        # keys are guild IDs
+        self.guilds: dict[int, GuildThreadBudget] = {}
+
+    def get_budget(self, guild_id: int):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = GuildThreadBudget()
+        return self.guilds[guild_id]
+
+    def record_creation(self, guild_id: int):
+        self.get_budget(guild_id).created.append(time.monotonic())
+
+    def remaining(self, guild_id: int):
+        return THREAD_LIMIT - self.get_budget(guild_id).used(time.monotonic())
+
+    def teams_per_room(self, mogi: Mogi):
+        return int(mogi.room_size/mogi.size)
+
+    # number of rooms the teams that are already registered can fill, minus the rooms that already exist
+    def rooms_needed_now(self, mogi: Mogi):
+        return max(0, mogi.count_registered() // self.teams_per_room(mogi) - len(mogi.rooms))
+
+    def seconds_until_close(self, mogi: Mogi):
+        if not mogi.is_automated or mogi.start_time is None:
+            return None
+        ts = mogi.leaderboard.time_settings
+        # a naive start time is in local time
+        close_time = mogi.start_time.astimezone(timezone.utc) - timedelta(minutes=ts.queue_open_time) + timedelta(minutes=ts.joining_time)
+        return (close_time - datetime.now(timezone.utc)).total_seconds()
+
+    # number of rooms the mogi is expected to have when it closes, assuming teams keep
+    # registering at the same rate they have since the queue opened
+    def forecast_rooms(self, mogi: Mogi):
+        registered = mogi.count_registered()
+        time_left = self.seconds_until_close(mogi)
+        if time_left is None or time_left <= 0 or mogi.start_time is None:
+            return registered // self.teams_per_room(mogi)
+        ts = mogi.leaderboard.time_settings
+        open_time = mogi.start_time.astimezone(timezone.utc) - timedelta(minutes=ts.queue_open_time)
+        elapsed = max((datetime.now(timezone.utc) - open_time).total_seconds(), 1)
+        projected_teams = registered + registered / elapsed * time_left
+        return int(projected_teams // self.teams_per_room(mogi))
+
+    def rooms_to_create(self, mogi: Mogi, guild_mogis: list[Mogi]):
+        """Returns how many room threads the mogi should create right now. Rooms that
+           registered teams can already fill come first; forecast rooms are paced over the
+           rest of the joining period, and never use the budget that other mogis in the
+           guild need for rooms their registered teams can already fill."""
+        needed_now = self.rooms_needed_now(mogi)
+        ahead = max(0, self.forecast_rooms(mogi) - len(mogi.rooms) - needed_now)
+        if ahead > 0:
+            time_left = self.seconds_until_close(mogi) or 0
+            steps_left = max(1, int(time_left // PACING_INTERVAL))
+            ahead = math.ceil(ahead / steps_left)
+        # spare threads can be renamed without using the creation budget
+        remaining = self.remaining(mogi.mogi_channel.guild.id) + self.count_spares(mogi.mogi_channel)
+        create_now = max(0, min(needed_now, remaining))
+        reserved = sum(self.rooms_needed_now(m) for m in guild_mogis if m is not mogi and m.gathering)
+        spare_budget = remaining - create_now - reserved
+        return create_now + max(0, min(ahead, spare_budget))
+
+    def release(self, guild_id: int, channel_id: int, thread_ids: list[int]):
+        self.get_budget(guild_id).spare_threads.extend((channel_id, thread_id) for thread_id in thread_ids)
+
+    def count_spares(self, channel: discord.TextChannel):
+        return sum(1 for channel_id, _ in self.get_budget(channel.guild.id).spare_threads if channel_id == channel.id)
+
+    def take_spare(self, channel: discord.TextChannel):
+        """Returns the ID of an unused room thread from an earlier mogi in the same channel, if there is one"""
+        spare_threads = self.get_budget(channel.guild.id).spare_threads
+        for i, (channel_id, thread_id) in enumerate(spare_threads):
+            if channel_id == channel.id:
+                del spare_threads[i]
+                return thread_id
+        return None
+
+    # (guild ID, channel ID, thread ID) of every spare thread, for the snapshot
+    def all_spares(self):
+        return [(guild_id, channel_id, thread_id) for guild_id, budget in self.guilds.items()
+                for channel_id, thread_id in budget.spare_threads]
@@ -1,4 +1,16 @@
 from .Config import *
 from .Exceptions import *
 from .Leaderboards import *
-from .mmr import *
\ No newline at end of file
+from .Results import *
+from .mmr import *
+from .Prefetch import MMRPrefetcher
+from .MessageScheduler import *
+from .ThreadPlanner import *
+from .RoomAssignment import *
+from .Journal import *
+from .DeadlineScheduler import *
+from .EventStore import *
+from .Shards import *
+from .ScheduleImport import *
+from .Metrics import MetricsServer
+from .Members import MemberResolver
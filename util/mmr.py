@@ -1,28 +1,344 @@
 import aiohttp
+import asyncio
 import discord
-from models import Player, LeaderboardConfig
+import random
+import time
+from collections import OrderedDict, deque
+from models import Player, LeaderboardConfig, LoungeAPISettings
+from util import Metrics as metrics
+from util.Exceptions import ResultsSubmissionError, LoungeUnavailableException
+from util.Results import Table
+import msgspec
 
 headers = {'Content-type': 'application/json'}
 
-async def lounge_api_mmr(lb: LeaderboardConfig, members: list[discord.Member]):
-    base_url = lb.website_credentials.url + '/api/player?'
-    if lb.website_credentials.game:
-        base_url += f"game={lb.website_credentials.game}&"
-    players: list[Player | None] = []
-    async with aiohttp.ClientSession() as session:
-        for member in members:
-            request_text = f"discordId={member.id}"
-            request_url = base_url + request_text
-            async with session.get(request_url,headers=headers) as resp:
-                if resp.status != 200:
-                    players.append(None)
-                    continue
-                player_data = await resp.json()
-                if 'mmr' not in player_data.keys():
-                    players.append(None)
-                    continue
-                players.append(Player(member, player_data['name'], player_data['mmr']))
+def leaderboard_key(lb: LeaderboardConfig):
+    # leaderboards that point at the same site and game share their MMR data
+    return f"{lb.website_credentials.url}|{lb.website_credentials.game}"
+
+class MMRCache:
+    """Caches the lounge name and MMR of players for a single leaderboard.
+       Entries expire after ttl seconds, and the least recently used entry is
+       evicted once the cache holds max_size players. Expired entries are kept
+       for up to stale_ttl seconds, for when the Lounge API is unavailable."""
+    def __init__(self, ttl: int, max_size: int, stale_ttl: int = 0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+        self.entries: OrderedDict[int, tuple[float, str, int]] = OrderedDict()
+        # bumped on every invalidation so requests that started before it don't store stale data
+        self.generation = 0
+
+    def get(self, discord_id: int):
+        entry = self.entries.get(discord_id, None)
+        if entry is None:
+            return None
+        expires_at, name, mmr = entry
+        if expires_at < time.monotonic():
+            return None
+        self.entries.move_to_end(discord_id)
+        return name, mmr
+
+    def get_stale(self, discord_id: int):
+        """Returns the player's last known name and MMR, even if it expired"""
+        entry = self.entries.get(discord_id, None)
+        if entry is None:
+            return None
+        expires_at, name, mmr = entry
+        if expires_at - self.ttl + max(self.stale_ttl, self.ttl) < time.monotonic():
+            del self.entries[discord_id]
+            return None
+        return name, mmr
+
+    def set(self, discord_id: int, name: str, mmr: int):
+        self.entries[discord_id] = (time.monotonic() + self.ttl, name, mmr)
+        self.entries.move_to_end(discord_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, discord_ids: list[int] | None = None):
+        self.generation += 1
+        if discord_ids is None:
+            self.entries.clear()
+            return
+        for discord_id in discord_ids:
+            self.entries.pop(discord_id, None)
+
+BREAKER_CLOSED = 0
+BREAKER_HALF_OPEN = 1
+BREAKER_OPEN = 2
+BREAKER_STATE_NAMES = {BREAKER_CLOSED: "closed", BREAKER_HALF_OPEN: "half_open", BREAKER_OPEN: "open"}
+
+class CircuitBreaker:
+    """Stops player lookups to a Lounge site once too many of its recent requests failed, so
+       commands fail fast instead of each one waiting out the timeouts. After the cooldown a
+       single request is let through, and the breaker closes again if it succeeds."""
+    def __init__(self, key: str, settings: LoungeAPISettings):
+        self.key = key
+        self.settings = settings
+        self.state = BREAKER_CLOSED
+        # (time, succeeded) of the requests in the window, oldest first
+        self.outcomes: deque[tuple[float, bool]] = deque()
+        self.failures = 0
+        self.opened_at = 0.0
+        # whether the request that checks if the site is back is in flight
+        self.probing = False
+        metrics.lounge_breaker_state.set(self.state, key)
+
+    def set_state(self, state: int):
+        self.state = state
+        metrics.lounge_breaker_state.set(state, self.key)
+        metrics.lounge_breaker_transitions.inc(self.key, BREAKER_STATE_NAMES[state])
+        if state == BREAKER_OPEN:
+            self.opened_at = time.monotonic()
+            print(f"Lounge API circuit breaker for {self.key} opened", flush=True)
+        elif state == BREAKER_CLOSED:
+            self.outcomes.clear()
+            self.failures = 0
+
+    def allow(self):
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN:
+            if time.monotonic() - self.opened_at < self.settings.breaker_cooldown:
+                return False
+            self.set_state(BREAKER_HALF_OPEN)
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def release_probe(self):
+        # the probe was cancelled before it made its request, so the next request checks the site instead
+        self.probing = False
+
+    def record(self, succeeded: bool, probe: bool = False):
+        """Records the outcome of a request. probe is whether it was the request let through
+           while half open, which is the only one that decides whether the breaker closes again."""
+        if probe:
+            self.probing = False
+            self.set_state(BREAKER_CLOSED if succeeded else BREAKER_OPEN)
+            return
+        # requests that were already in flight when the breaker opened don't count
+        if self.state != BREAKER_CLOSED:
+            return
+        now = time.monotonic()
+        self.outcomes.append((now, succeeded))
+        self.failures += not succeeded
+        while self.outcomes and self.outcomes[0][0] <= now - self.settings.breaker_window:
+            self.failures -= not self.outcomes.popleft()[1]
+        if (len(self.outcomes) >= self.settings.breaker_min_requests
+                and self.failures >= self.settings.breaker_error_rate * len(self.outcomes)):
+            self.set_state(BREAKER_OPEN)
+
+class LoungeClient:
+    """Long-lived Lounge API client owned by the bot. Keeps a pool of keep-alive
+       connections open and caps the number of requests in flight at once."""
+    def __init__(self, settings: LoungeAPISettings):
+        self.settings = settings
+        self.session: aiohttp.ClientSession | None = None
+        self.semaphore = asyncio.Semaphore(settings.max_concurrency)
+        # keys are leaderboard keys, values are the MMR cache for that leaderboard
+        self.caches: dict[str, MMRCache] = {}
+        # lookups currently waiting on the Lounge API, so concurrent lookups for a player share one request
+        self.in_flight: dict[tuple[str, int], asyncio.Future[tuple[str, int] | None]] = {}
+        # every lookup request that hasn't finished, including ones invalidate took out of in_flight
+        self.requests: set[asyncio.Future] = set()
+        # keys are leaderboard keys, values are the circuit breaker for that leaderboard's site
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.request_timeout = aiohttp.ClientTimeout(total=settings.request_timeout)
+        # set while close() cancels the lookups, whose requests then say nothing about the site
+        self.closing = False
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self.settings.pool_size,
+                                         keepalive_timeout=self.settings.keepalive_timeout)
+        self.session = aiohttp.ClientSession(connector=connector, headers=headers)
+
+    async def close(self):
+        """Cancels the lookups that are still running and waits for them to stop before
+           closing the connection pool, so none of them makes a request on a closed session"""
+        requests = list(self.requests)
+        self.closing = True
+        for future in requests:
+            future.cancel()
+        try:
+            await asyncio.gather(*requests, return_exceptions=True)
+        finally:
+            self.closing = False
+        self.in_flight.clear()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_cache(self, lb: LeaderboardConfig):
+        key = leaderboard_key(lb)
+        if key not in self.caches:
+            self.caches[key] = MMRCache(self.settings.cache_ttl, self.settings.cache_max_size, self.settings.stale_ttl)
+        return self.caches[key]
+
+    def get_breaker(self, lb: LeaderboardConfig):
+        key = leaderboard_key(lb)
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(key, self.settings)
+        return self.breakers[key]
+
+    def invalidate(self, lb: LeaderboardConfig, discord_ids: list[int] | None = None):
+        """Removes the given players (or every player if none are given) from the
+           leaderboard's MMR cache so their next lookup goes to the Lounge API"""
+        self.get_cache(lb).invalidate(discord_ids)
+        key = leaderboard_key(lb)
+        id_set = set(discord_ids) if discord_ids is not None else None
+        for flight_key in list(self.in_flight.keys()):
+            if flight_key[0] == key and (id_set is None or flight_key[1] in id_set):
+                del self.in_flight[flight_key]
+
+    def player_url(self, lb: LeaderboardConfig, discord_id: int):
+        url = lb.website_credentials.url + '/api/player?'
+        if lb.website_credentials.game:
+            url += f"game={lb.website_credentials.game}&"
+        return url + f"discordId={discord_id}"
+
+    def table_url(self, lb: LeaderboardConfig):
+        url = lb.website_credentials.url + '/api/table/create'
+        if lb.website_credentials.game:
+            url += f"?game={lb.website_credentials.game}"
+        return url
+
+    async def submit_table(self, lb: LeaderboardConfig, table: Table):
+        """Creates the table on the Lounge website with the leaderboard's staff credentials and
+           returns its ID. Server errors and dropped connections are retried with backoff; the
+           website's other errors mean the table itself is wrong, so they aren't."""
+        if self.session is None:
+            await self.start()
+        assert self.session is not None
+        auth = aiohttp.BasicAuth(lb.website_credentials.username, lb.website_credentials.password)
+        body = msgspec.json.encode(table)
+        error = ""
+        for attempt in range(self.settings.submit_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.settings.submit_retry_delay * 2 ** (attempt - 1))
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    async with self.session.post(self.table_url(lb), data=body, auth=auth, timeout=self.request_timeout) as resp:
+                        if resp.status in (200, 201):
+                            table_data = await resp.json()
+                            return int(table_data['id'])
+                        metrics.lounge_api_errors.inc("table", str(resp.status))
+                        error = f"{resp.status} {await resp.text()}"
+                        if resp.status < 500:
+                            raise ResultsSubmissionError(error)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    metrics.lounge_api_errors.inc("table", "exception")
+                    error = str(e) or type(e).__name__
+                finally:
+                    metrics.lounge_api_seconds.observe(time.perf_counter() - start, "table")
+        raise ResultsSubmissionError(f"gave up after {self.settings.submit_retries + 1} attempts: {error}")
+
+    async def request_player(self, lb: LeaderboardConfig, discord_id: int):
+        """Returns the player's lounge name and MMR, or None if they aren't on the leaderboard.
+           If the Lounge API can't be reached in time, the player's last known MMR is used
+           instead, and LoungeUnavailableException is raised if there isn't one."""
+        if self.session is None:
+            await self.start()
+        cache = self.get_cache(lb)
+        generation = cache.generation
+        try:
+            player_data = await asyncio.wait_for(self.request_player_data(lb, discord_id), self.settings.total_timeout)
+        except (LoungeUnavailableException, asyncio.TimeoutError) as e:
+            stale = cache.get_stale(discord_id)
+            if stale is None:
+                raise LoungeUnavailableException from e
+            metrics.lounge_stale_lookups.inc()
+            return stale
+        if player_data is None:
+            return None
+        if cache.generation == generation:
+            cache.set(discord_id, player_data['name'], player_data['mmr'])
+        return player_data['name'], player_data['mmr']
+
+    async def request_player_data(self, lb: LeaderboardConfig, discord_id: int) -> dict | None:
+        assert self.session is not None
+        breaker = self.get_breaker(lb)
+        for attempt in range(self.settings.retries + 1):
+            if attempt > 0:
+                # jittered, so the lookups that failed together don't all retry at the same moment
+                await asyncio.sleep(self.settings.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            if not breaker.allow():
+                metrics.lounge_api_errors.inc("player", "breaker_open")
+                raise LoungeUnavailableException
+            probe = breaker.state == BREAKER_HALF_OPEN
+            succeeded = False
+            requested = False
+            # the probe is released even if the lookup is cancelled while it waits for a request slot,
+            # otherwise the breaker would stay half open and refuse every lookup
+            try:
+                async with self.semaphore:
+                    requested = True
+                    start = time.perf_counter()
+                    try:
+                        async with self.session.get(self.player_url(lb, discord_id), timeout=self.request_timeout) as resp:
+                            if resp.status >= 500 or resp.status == 429:
+                                metrics.lounge_api_errors.inc("player", str(resp.status))
+                                continue
+                            if resp.status != 200:
+                                succeeded = True
+                                metrics.lounge_api_errors.inc("player", "not_found" if resp.status == 404 else str(resp.status))
+                                return None
+                            player_data = await resp.json()
+                            succeeded = True
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        metrics.lounge_api_errors.inc("player", "exception")
+                        continue
+                    finally:
+                        metrics.lounge_api_seconds.observe(time.perf_counter() - start, "player")
+            finally:
+                # a lookup that's cancelled or times out in the middle of a request counts as a failure,
+                # unless it was cancelled because the client is closing
+                if requested and not self.closing:
+                    breaker.record(succeeded, probe)
+                elif probe:
+                    breaker.release_probe()
+            if 'mmr' not in player_data.keys():
+                metrics.lounge_api_errors.inc("player", "no_mmr")
+                return None
+            return player_data
+        raise LoungeUnavailableException
+
+    async def lookup(self, lb: LeaderboardConfig, discord_id: int):
+        cached = self.get_cache(lb).get(discord_id)
+        if cached is not None:
+            metrics.lounge_cache_lookups.inc("hit")
+            return cached
+        metrics.lounge_cache_lookups.inc("miss")
+        key = (leaderboard_key(lb), discord_id)
+        future = self.in_flight.get(key, None)
+        if future is None:
+            future = asyncio.ensure_future(self.request_player(lb, discord_id))
+            self.in_flight[key] = future
+            self.requests.add(future)
+            def finished(f: asyncio.Future):
+                self.requests.discard(f)
+                if self.in_flight.get(key) is f:
+                    del self.in_flight[key]
+            future.add_done_callback(finished)
+        # shielded so that a cancelled command doesn't cancel the request for everyone else waiting on it
+        return await asyncio.shield(future)
+
+    async def fetch_player(self, lb: LeaderboardConfig, member: discord.Member):
+        player_data = await self.lookup(lb, member.id)
+        if player_data is None:
+            return None
+        name, mmr = player_data
+        return Player(member.id, name, mmr)
+
+async def lounge_api_mmr(client: LoungeClient, lb: LeaderboardConfig, members: list[discord.Member]):
+    # every member is requested at once; gather returns the results in the same order as members
+    players: list[Player | None] = await asyncio.gather(*[client.fetch_player(lb, member) for member in members])
     return players
 
-async def get_mmr(lb: LeaderboardConfig, members: list[discord.Member]):
-    return await lounge_api_mmr(lb, members)
\ No newline at end of file
+async def get_mmr(client: LoungeClient, lb: LeaderboardConfig, members: list[discord.Member]):
+    return await lounge_api_mmr(client, lb, members)